@@ -0,0 +1,181 @@
+"""Archivo histórico en Parquet, particionado por mes.
+
+    python archivo.py archivar [--meses 2]
+    python archivo.py resumen
+
+Las órdenes finalizadas, sus instalaciones y las cotizaciones de meses pasados
+salen de las hojas y quedan en archivo/<tabla>/mes=AAAA-MM/*.parquet. Las hojas
+guardan solo el trabajo vigente; `consultar` junta ambos niveles.
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import date
+import pandas as pd
+import espejo
+import hojas
+try: import pyarrow.parquet as pq
+except ImportError: pq = None
+
+# --- CONFIGURACIÓN ---
+RUTA_ARCHIVO = os.environ.get("COTIZADOR_ARCHIVO", "archivo")
+MESES_CALIENTES = 2   # el mes en curso y el anterior se quedan en las hojas
+# Columnas que identifican cada fila: se revisan en la hoja justo antes de borrarla
+CLAVES = {
+    hojas.AGENDA: ["ID"],
+    hojas.INSTALACIONES: ["ID_Servicio", "Unidad"],
+    hojas.COTIZACIONES: ["Folio"],
+}
+
+def disponible():
+    return pq is not None
+
+def _carpeta(hoja, ruta=None):
+    return os.path.join(ruta or RUTA_ARCHIVO, espejo.TABLAS[hoja])
+
+def _fechas(df, hoja):
+    columna, formato = espejo.FECHAS[hoja]
+    if columna not in df.columns: return pd.Series(pd.NaT, index=df.index)
+    return pd.to_datetime(df[columna].astype(str).str[:10], format=formato, errors="coerce")
+
+def corte(hoy=None, meses=MESES_CALIENTES):
+    """Primer día del mes más antiguo que se queda en las hojas."""
+    hoy = hoy or date.today()
+    indice = hoy.year * 12 + hoy.month - 1 - (meses - 1)
+    return date(indice // 12, indice % 12 + 1, 1)
+
+# --- PARTICIONES ---
+def meses(hoja, ruta=None):
+    """Meses archivados de la hoja ("AAAA-MM"), en orden."""
+    carpeta = _carpeta(hoja, ruta)
+    if not os.path.isdir(carpeta): return []
+    return sorted(n.split("=", 1)[1] for n in os.listdir(carpeta) if n.startswith("mes="))
+
+def _escribir(hoja, df, fechas, ruta=None):
+    """Una parte nueva por mes (nunca se reescribe lo ya archivado); devuelve las rutas."""
+    escritos = []
+    datos = df.astype("string")
+    datos["_fecha"] = fechas.dt.strftime("%Y-%m-%d")
+    for mes, grupo in datos.groupby(fechas.dt.strftime("%Y-%m")):
+        carpeta = os.path.join(_carpeta(hoja, ruta), f"mes={mes}")
+        os.makedirs(carpeta, exist_ok=True)
+        destino = os.path.join(carpeta, f"parte-{time.time_ns()}.parquet")
+        grupo.to_parquet(destino + ".tmp", index=False, engine="pyarrow")
+        os.replace(destino + ".tmp", destino)
+        escritos.append(destino)
+    return escritos
+
+def leer(hoja, desde=None, hasta=None, columnas=None, ruta=None):
+    """Filas archivadas entre `desde` y `hasta` (fechas); solo abre los meses del rango."""
+    if not disponible(): return pd.DataFrame(columns=columnas)
+    inicio = desde.strftime("%Y-%m") if desde else None
+    fin = hasta.strftime("%Y-%m") if hasta else None
+    partes = []
+    for mes in meses(hoja, ruta):
+        if (inicio and mes < inicio) or (fin and mes > fin): continue
+        carpeta = os.path.join(_carpeta(hoja, ruta), f"mes={mes}")
+        for nombre in sorted(n for n in os.listdir(carpeta) if n.endswith(".parquet")):
+            partes.append(pd.read_parquet(os.path.join(carpeta, nombre), columns=columnas))
+    if not partes: return pd.DataFrame(columns=columnas)
+    df = pd.concat(partes, ignore_index=True)
+    if "_fecha" in df.columns and (desde or hasta):
+        if desde: df = df[df["_fecha"] >= desde.strftime("%Y-%m-%d")]
+        if hasta: df = df[df["_fecha"] <= hasta.strftime("%Y-%m-%d")]
+    return df.reset_index(drop=True)
+
+# --- CONSULTA EN AMBOS NIVELES ---
+def consultar(hoja, desde=None, hasta=None, ruta=None, ruta_db=None):
+    """Archivo + espejo local de la hoja, como un solo DataFrame (sin columnas internas)."""
+    condiciones, parametros = [], []
+    if desde:
+        condiciones.append("_fecha >= ?")
+        parametros.append(desde.strftime("%Y-%m-%d"))
+    if hasta:
+        condiciones.append("_fecha <= ?")
+        parametros.append(hasta.strftime("%Y-%m-%d"))
+    caliente = espejo.consultar(hoja, " AND ".join(condiciones), parametros, ruta=ruta_db)
+    frio = leer(hoja, desde, hasta, ruta=ruta).drop(columns=["_fecha"], errors="ignore")
+    if frio.empty: return caliente.reset_index(drop=True)
+    return pd.concat([frio, caliente.astype("string")], ignore_index=True)
+
+def ultimo_folio(ruta=None):
+    """Folio más alto entre las cotizaciones archivadas (0 si no hay)."""
+    folios = leer(hojas.COTIZACIONES, columnas=["Folio"], ruta=ruta)
+    if folios.empty: return 0
+    return int(pd.to_numeric(folios["Folio"], errors="coerce").fillna(0).max())
+
+# --- ARCHIVADO ---
+def seleccionar(hoja, df, limite, finalizadas):
+    """Posiciones en la hoja (índice de `df`) de las filas que ya pueden salir."""
+    viejas = _fechas(df, hoja) < pd.Timestamp(limite)
+    if hoja == hojas.AGENDA:
+        viejas &= df["Estatus"].eq("FINALIZADO") if "Estatus" in df.columns else False
+    elif hoja == hojas.INSTALACIONES:
+        # Las unidades de órdenes aún abiertas se quedan con su orden
+        viejas &= df["ID_Servicio"].astype(str).isin(finalizadas) if "ID_Servicio" in df.columns else False
+    return [int(i) for i in df.index[viejas.to_numpy()]]
+
+def archivar(conn, hoy=None, meses_calientes=MESES_CALIENTES, ruta=None, ruta_db=None):
+    """Mueve al archivo lo terminado antes del corte; devuelve {hoja: filas archivadas}."""
+    if not disponible(): raise RuntimeError("Falta pyarrow para escribir el archivo Parquet.")
+    limite = corte(hoy, meses_calientes)
+    # Se borra por posición: las posiciones tienen que salir de la hoja de este momento, no de una caché
+    directa = hojas.sin_cache(conn)
+    leidas = {h: espejo.limpiar(directa.read(worksheet=h, ttl=0)) for h in (hojas.AGENDA, hojas.INSTALACIONES, hojas.COTIZACIONES)}
+    agenda = leidas[hojas.AGENDA]
+    finalizadas = set(agenda.loc[agenda.get("Estatus", pd.Series(dtype=str)).eq("FINALIZADO"), "ID"].astype(str)) if "ID" in agenda.columns else set()
+
+    movidas = {}
+    for hoja, df in leidas.items():
+        posiciones = seleccionar(hoja, df, limite, finalizadas)
+        movidas[hoja] = len(posiciones)
+        if not posiciones: continue
+        frias = df.loc[posiciones]
+        escritos = _escribir(hoja, frias, _fechas(frias, hoja), ruta)
+        claves = [c for c in CLAVES[hoja] if c in frias.columns]
+        esperadas = {p: {c: frias.at[p, c] for c in claves} for p in posiciones} if claves else None
+        try: hojas.borrar_filas(conn, posiciones, worksheet=hoja, esperadas=esperadas)
+        except Exception as e:
+            # En el archivo queda exactamente lo que salió de la hoja (los tramos ya borrados)
+            for destino in escritos:
+                os.remove(destino)
+                try: os.rmdir(os.path.dirname(destino))  # el mes queda vacío
+                except OSError: pass
+            borradas = getattr(e, "borradas", [])
+            if borradas: _escribir(hoja, frias.loc[borradas], _fechas(frias.loc[borradas], hoja), ruta)
+            try: espejo.sincronizar(conn, hoja, completo=True, ruta=ruta_db)
+            except Exception: pass
+            raise
+        # Las posiciones cambiaron: el espejo se compara completo de nuevo
+        espejo.sincronizar(conn, hoja, completo=True, ruta=ruta_db)
+    return movidas
+
+def resumen(ruta=None):
+    filas = []
+    for hoja in (hojas.COTIZACIONES, hojas.AGENDA, hojas.INSTALACIONES):
+        for mes in meses(hoja, ruta):
+            carpeta = os.path.join(_carpeta(hoja, ruta), f"mes={mes}")
+            archivos = [os.path.join(carpeta, n) for n in os.listdir(carpeta) if n.endswith(".parquet")]
+            filas.append({
+                "tabla": espejo.TABLAS[hoja], "mes": mes,
+                "filas": sum(pq.ParquetFile(a).metadata.num_rows for a in archivos) if disponible() else None,
+                "bytes": sum(os.path.getsize(a) for a in archivos),
+            })
+    return pd.DataFrame(filas, columns=["tabla", "mes", "filas", "bytes"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivo histórico en Parquet.")
+    parser.add_argument("accion", choices=["archivar", "resumen"])
+    parser.add_argument("--meses", type=int, default=MESES_CALIENTES, help="meses que se quedan en las hojas")
+    args = parser.parse_args(argv)
+
+    if args.accion == "resumen":
+        print(resumen().to_string(index=False))
+        return 0
+    movidas = archivar(hojas.conexion_gsheets(), meses_calientes=args.meses)
+    for hoja, n in movidas.items(): print(f"{espejo.TABLAS[hoja]}: {n} filas archivadas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+import os
+import sqlite3
+
+# --- BASE LOCAL (SQLite) ---
+# Archivo compartido por todas las sesiones del servidor
+RUTA_DB = os.environ.get("COTIZADOR_DB", "datos_locales.db")
+
+def conectar(ruta=None):
+    """Abre la base local en modo autocommit; las transacciones se abren a mano."""
+    con = sqlite3.connect(ruta or RUTA_DB, timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+def ruta_de(con):
+    return con.execute("PRAGMA database_list").fetchone()[2]
@@ -0,0 +1,278 @@
+"""Prueba de carga: técnicos y vendedores concurrentes contra una hoja simulada.
+
+    python benchmarks/carga.py --tecnicos 8 --vendedores 4 --duracion 30
+    python benchmarks/carga.py --modo legado --tecnicos 8 --vendedores 4
+
+La hoja es una hojas.ConexionLocal con latencia, cuota (60 llamadas por minuto,
+como una cuenta de servicio de Sheets) y fallas inyectadas. Cada sesión es un
+hilo, como en el servidor de Streamlit, y recorre el mismo camino que las vistas:
+
+  actual  lecturas por la caché compartida y el espejo, cotizaciones con
+          espejo.agregar, unidades y cierres por la cola de envíos (envios)
+  legado  cada vista lee la hoja completa y cada escritura la reescribe completa
+
+Al final compara lo que cada sesión dio por guardado contra lo que quedó en la
+hoja: ahí aparecen las actualizaciones perdidas.
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import argparse
+import threading
+from collections import defaultdict
+
+_TEMPORAL = tempfile.mkdtemp(prefix="carga-cotizador-")
+os.environ["COTIZADOR_DB"] = os.path.join(_TEMPORAL, "datos_locales.db")
+os.environ["COTIZADOR_ARCHIVO"] = os.path.join(_TEMPORAL, "archivo")
+os.environ["COTIZADOR_BUZON"] = os.path.join(_TEMPORAL, "buzon_salida")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+import catalogo
+import cotizacion
+import envios
+import espejo
+import folios
+import hojas
+import precios
+from suite import hoja_agenda, hoja_instalaciones, hoja_cotizaciones
+
+# --- REGISTRO DE RESULTADOS ---
+class Bitacora:
+    """Latencias, errores y lo que cada sesión dio por guardado."""
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(lambda: defaultdict(int))
+        self.unidades = set()     # (orden, unidad)
+        self.cierres = {}         # orden -> cobro
+        self.folios = set()
+
+    def medir(self, operacion, funcion, *args):
+        inicio = time.perf_counter()
+        try: resultado = funcion(*args)
+        except Exception as e:
+            codigo = getattr(getattr(e, "response", None), "status_code", None)
+            with self._candado: self.errores[operacion][str(codigo or type(e).__name__)] += 1
+            return None, False
+        with self._candado: self.latencias[operacion].append(time.perf_counter() - inicio)
+        return resultado, True
+
+    def guardado(self, tipo, valor, extra=None):
+        with self._candado:
+            if tipo == "unidad": self.unidades.add(valor)
+            elif tipo == "cierre": self.cierres[valor] = extra
+            else: self.folios.add(valor)
+
+# --- CAMINOS DE LAS VISTAS ---
+def _reescribir(conn, hoja, modificar):
+    """Patrón anterior: leer toda la hoja, cambiarla en memoria y subirla completa."""
+    df = conn.read(worksheet=hoja, ttl=0)
+    conn.update(worksheet=hoja, data=modificar(df))
+
+def registrar_cotizacion(conn, modo, fila):
+    if modo == "actual": return espejo.agregar(conn, hojas.COTIZACIONES, [fila])
+    return _reescribir(conn, hojas.COTIZACIONES, lambda df: pd.concat([df, pd.DataFrame([fila])], ignore_index=True))
+
+def ver_agenda(conn, modo):
+    if modo == "actual":
+        espejo.sincronizar(conn, hojas.AGENDA)
+        return espejo.ordenes(estatus="PENDIENTE")
+    df = conn.read(worksheet=hojas.AGENDA, ttl=0)
+    return df[df["Estatus"] == "PENDIENTE"]
+
+def registrar_unidad(conn, modo, fila):
+    if modo == "actual": return envios.encolar_unidad(fila["ID_Servicio"], fila, "2026-10-18")
+    return _reescribir(conn, hojas.INSTALACIONES, lambda df: pd.concat([df, pd.DataFrame([fila])], ignore_index=True))
+
+def cerrar_orden(conn, modo, id_orden, cierre, posicion):
+    if modo == "actual":
+        return envios.encolar_cierre(id_orden, cierre, esperado={"Estatus": "PENDIENTE"}, posicion=posicion)
+    def modificar(df):
+        i = df.index[df["ID"] == id_orden][0]
+        for columna, valor in cierre.items(): df.at[i, columna] = valor
+        return df
+    return _reescribir(conn, hojas.AGENDA, modificar)
+
+# --- SESIONES ---
+def vendedor(n, conn, modo, bitacora, fin, pausa, semilla):
+    rng = random.Random(semilla)
+    extras = list(catalogo.adicionales())
+    while time.monotonic() < fin:
+        carrito, cotizado = precios.armar_carrito(rng.randint(1, 40), "Anual", rng.random() < 0.5,
+                                                  extras=[(rng.choice(extras), rng.randint(1, 5), None)])
+        folio, _ = bitacora.medir("folio", folios.asignar)
+        cliente = f"Vendedor {n} Cliente {rng.randint(0, 999)}"
+        bitacora.medir("pdf_cotizacion", cotizacion.generar_pdf, cliente, folio, carrito, False)
+        fila = {"Fecha": "18/10/2026", "Folio": folio, "Cliente": cliente, "Total": cotizado.total, "Telefono": ""}
+        _, ok = bitacora.medir("registrar_cotizacion", registrar_cotizacion, conn, modo, fila)
+        if ok: bitacora.guardado("folio", folio)
+        time.sleep(rng.expovariate(1 / pausa))
+
+def tecnico(n, conn, modo, bitacora, fin, pausa, ordenes, unidades_por_orden, semilla):
+    rng = random.Random(semilla)
+    for id_orden, posicion in ordenes:
+        if time.monotonic() >= fin: break
+        for u in range(unidades_por_orden):
+            if time.monotonic() >= fin: break
+            bitacora.medir("ver_agenda", ver_agenda, conn, modo)
+            fila = {"ID_Servicio": id_orden, "Fecha": "18/10/2026", "Cliente": f"Cliente {id_orden}",
+                    "Unidad": f"T{n}-{id_orden}-U{u}", "Evidencia": "ENVIADO"}
+            _, ok = bitacora.medir("registrar_unidad", registrar_unidad, conn, modo, fila)
+            if ok: bitacora.guardado("unidad", (id_orden, fila["Unidad"]))
+            time.sleep(rng.expovariate(1 / pausa))
+        else:
+            cobro = float(rng.randint(5, 50) * 100)
+            cierre = {"Estatus": "FINALIZADO", "Cobro_Final": cobro, "Tipo_Pago": "Efectivo", "Pago_Tecnico": 300.0}
+            _, ok = bitacora.medir("cerrar_orden", cerrar_orden, conn, modo, id_orden, cierre, posicion)
+            if ok: bitacora.guardado("cierre", id_orden, cobro)
+            time.sleep(rng.expovariate(1 / pausa))
+
+# --- EJECUCIÓN ---
+def preparar(args):
+    agenda = hoja_agenda(args.agenda, semilla=1)
+    agenda["Estatus"] = "FINALIZADO"
+    nuevas = pd.DataFrame({
+        **{c: "" for c in hojas.ENCABEZADOS[hojas.AGENDA]},
+        "ID": [f"CARGA{i:05d}" for i in range(args.tecnicos * args.ordenes)],
+        "Cliente": "Cliente de carga", "Estatus": "PENDIENTE", "Cobro_Final": 0, "Pago_Tecnico": 0,
+    })
+    agenda = pd.concat([agenda, nuevas], ignore_index=True)
+    pendientes = [(i, int(p)) for p, i in zip(agenda.index, agenda["ID"]) if i.startswith("CARGA")]
+    local = hojas.ConexionLocal({
+        hojas.COTIZACIONES: hoja_cotizaciones(args.historial, semilla=2),
+        hojas.AGENDA: agenda,
+        hojas.INSTALACIONES: hoja_instalaciones(args.historial, semilla=3),
+    }, latencia=(args.latencia_min, args.latencia_max), por_fila=args.por_fila,
+       cuota=args.cuota or None, ventana=args.ventana, fallas=args.fallas, semilla=args.semilla)
+    reparto = [pendientes[i::args.tecnicos] for i in range(args.tecnicos)]
+    return local, reparto
+
+def drenar_cola(limite_s):
+    """Espera a que el sincronizador suba todo (solo modo actual); devuelve los segundos."""
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite_s:
+        if not envios.conteo().get("pendiente"): break
+        envios.despertar()
+        time.sleep(0.2)
+    return time.monotonic() - inicio
+
+def verificar(local, bitacora):
+    """Lo confirmado a cada sesión contra lo que quedó en la hoja."""
+    # La revisión no pasa por la API simulada
+    local.latencia, local.por_fila, local.cuota, local.fallas = 0.0, 0.0, None, 0.0
+    inst = local.read(worksheet=hojas.INSTALACIONES)
+    presentes = list(zip(inst["ID_Servicio"].astype(str), inst["Unidad"].astype(str)))
+    agenda = local.read(worksheet=hojas.AGENDA).set_index("ID")
+    cot = local.read(worksheet=hojas.COTIZACIONES)
+    folios_hoja = pd.to_numeric(cot["Folio"], errors="coerce").dropna().astype(int).tolist()
+
+    cierres_perdidos = sum(
+        1 for id_orden, cobro in bitacora.cierres.items()
+        if agenda.at[id_orden, "Estatus"] != "FINALIZADO" or float(agenda.at[id_orden, "Cobro_Final"] or 0) != cobro
+    )
+    return {
+        "unidades_confirmadas": len(bitacora.unidades),
+        "unidades_perdidas": len(bitacora.unidades - set(presentes)),
+        "unidades_duplicadas": len(presentes) - len(set(presentes)),
+        "cierres_confirmados": len(bitacora.cierres),
+        "cierres_perdidos": cierres_perdidos,
+        "cotizaciones_confirmadas": len(bitacora.folios),
+        "cotizaciones_perdidas": len(bitacora.folios - set(folios_hoja)),
+        "folios_duplicados": len(folios_hoja) - len(set(folios_hoja)),
+    }
+
+def percentiles(tiempos):
+    t = np.asarray(tiempos) * 1000
+    return {"n": len(t), "p50_ms": float(np.percentile(t, 50)), "p95_ms": float(np.percentile(t, 95)),
+            "p99_ms": float(np.percentile(t, 99)), "max_ms": float(t.max())}
+
+def ejecutar(args):
+    local, reparto = preparar(args)
+    conn = hojas.ConexionCacheada(local, ttl=20) if args.modo == "actual" else local
+    folios.inicializar(lambda: folios.ultimo_folio_hoja(local))
+    cotizacion.plantilla()
+    if args.modo == "actual":
+        espejo.sincronizar(conn, hojas.AGENDA, completo=True)
+        espejo.sincronizar(conn, hojas.INSTALACIONES, completo=True)
+        envios.ESPERA_BASE, envios.ESPERA_MAX = 0.5, 5
+        envios.iniciar(conn)
+    base_llamadas = (local.lecturas, local.escrituras)
+
+    bitacora = Bitacora()
+    inicio = time.monotonic()
+    fin = inicio + args.duracion
+    hilos = [threading.Thread(target=vendedor, args=(n, conn, args.modo, bitacora, fin, args.pausa, args.semilla + n))
+             for n in range(args.vendedores)]
+    hilos += [threading.Thread(target=tecnico, args=(n, conn, args.modo, bitacora, fin, args.pausa, reparto[n],
+                                                     args.unidades, args.semilla + 1000 + n))
+              for n in range(args.tecnicos)]
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    transcurrido = time.monotonic() - inicio
+    drenado = drenar_cola(args.drenar) if args.modo == "actual" else 0.0
+
+    operaciones = {op: {**percentiles(t), "por_segundo": len(t) / transcurrido} for op, t in sorted(bitacora.latencias.items())}
+    return {
+        "modo": args.modo, "tecnicos": args.tecnicos, "vendedores": args.vendedores,
+        "duracion_s": transcurrido, "drenado_s": drenado,
+        "operaciones": operaciones,
+        "errores": {op: dict(e) for op, e in bitacora.errores.items()},
+        "api": {"lecturas": local.lecturas - base_llamadas[0], "escrituras": local.escrituras - base_llamadas[1],
+                "rechazadas_por_cuota": local.rechazadas, "fallas_inyectadas": local.fallidas},
+        "cola": envios.conteo() if args.modo == "actual" else {},
+        "integridad": verificar(local, bitacora),
+    }
+
+def imprimir(r):
+    print(f"\nModo {r['modo']}: {r['tecnicos']} técnicos, {r['vendedores']} vendedores, {r['duracion_s']:.1f}s"
+          + (f" (+{r['drenado_s']:.1f}s vaciando la cola)" if r["drenado_s"] else ""))
+    print(f"{'operación':<22} {'n':>6} {'por s':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}  errores")
+    for op, m in r["operaciones"].items():
+        errores = ", ".join(f"{k}: {v}" for k, v in r["errores"].get(op, {}).items())
+        print(f"{op:<22} {m['n']:>6} {m['por_segundo']:>7.2f} {m['p50_ms']:>7.1f}ms {m['p95_ms']:>7.1f}ms "
+              f"{m['p99_ms']:>7.1f}ms {m['max_ms']:>7.1f}ms  {errores}")
+    for op, e in r["errores"].items():
+        if op not in r["operaciones"]: print(f"{op:<22} {'0':>6}  errores: " + ", ".join(f"{k}: {v}" for k, v in e.items()))
+    api = r["api"]
+    print(f"API: {api['lecturas']} lecturas, {api['escrituras']} escrituras, {api['rechazadas_por_cuota']} rechazadas por cuota, "
+          f"{api['fallas_inyectadas']} fallas inyectadas")
+    if r["cola"]: print(f"Cola de envíos: {r['cola']}")
+    print("Integridad: " + ", ".join(f"{k}={v}" for k, v in r["integridad"].items()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modo", choices=["actual", "legado"], default="actual")
+    parser.add_argument("--tecnicos", type=int, default=6)
+    parser.add_argument("--vendedores", type=int, default=3)
+    parser.add_argument("--duracion", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--pausa", type=float, default=1.0, help="tiempo medio entre acciones de una sesión (s)")
+    parser.add_argument("--ordenes", type=int, default=20, help="órdenes pendientes por técnico")
+    parser.add_argument("--unidades", type=int, default=3, help="unidades por orden")
+    parser.add_argument("--agenda", type=int, default=2000, help="órdenes ya finalizadas en la agenda")
+    parser.add_argument("--historial", type=int, default=5000, help="filas previas de cotizaciones e instalaciones")
+    parser.add_argument("--latencia-min", type=float, default=0.15)
+    parser.add_argument("--latencia-max", type=float, default=0.40)
+    parser.add_argument("--por-fila", type=float, default=2e-5, help="segundos por fila transferida")
+    parser.add_argument("--cuota", type=int, default=60, help="llamadas por ventana (0 = sin límite)")
+    parser.add_argument("--ventana", type=float, default=60)
+    parser.add_argument("--fallas", type=float, default=0.01, help="probabilidad de 503 por llamada")
+    parser.add_argument("--drenar", type=float, default=120, help="segundos máximos para vaciar la cola al final")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default=None, help="archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(args)
+    imprimir(resultado)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados en {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Cierre del día: versión original (máscara por cliente + iterrows) contra la agrupada.
+
+    python benchmarks/cierre_dia.py [--filas 100 1000 10000] [--repeticiones 3]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import reportes
+
+def datos_sinteticos(filas, semilla=0):
+    """`filas` instalaciones repartidas en ~filas/10 clientes (mínimo 5) y su agenda."""
+    rng = np.random.default_rng(semilla)
+    n_clientes = max(5, filas // 10)
+    n_ordenes = max(1, filas // 4)
+    orden = rng.integers(0, n_ordenes, filas)
+    instalaciones = pd.DataFrame({
+        "ID_Servicio": [f"ORD-{o}" for o in orden],
+        "Fecha": "18/10/2026",
+        "Cliente": [f"Transportes {o % n_clientes} SA de CV" for o in orden],
+        "Unidad": [f"Camión {i} / Placas NL-{i:05d}" for i in range(filas)],
+    })
+    agenda = pd.DataFrame({
+        "ID": [f"ORD-{o}" for o in range(n_ordenes)],
+        "Estatus": "FINALIZADO",
+        "Cobro_Final": rng.choice(["1500", "2200.50", "", "abc"], n_ordenes),
+        "Tipo_Pago": rng.choice(["Efectivo", "Transferencia"], n_ordenes),
+        "Pago_Tecnico": rng.choice(["300", "450", None], n_ordenes),
+    })
+    return instalaciones, agenda
+
+def cierre_original(fecha_hoy, df_instalaciones, df_agenda_hoy):
+    """Implementación previa, solo como referencia de comparación."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 18)
+    pdf.cell(0, 10, f'REPORTE DIARIO - {fecha_hoy}', 0, 1, 'C')
+    pdf.ln(5)
+    total_unidades_dia = 0
+    for cliente in df_instalaciones['Cliente'].unique():
+        pdf.set_font('Arial', 'B', 14)
+        pdf.set_fill_color(230, 230, 230)
+        cli_str = str(cliente).encode('latin-1', 'ignore').decode('latin-1')
+        pdf.cell(0, 10, f"Cliente: {cli_str}", 1, 1, 'L', 1)
+        unidades = df_instalaciones[df_instalaciones['Cliente'] == cliente]
+        pdf.set_font('Arial', '', 11)
+        for _, row in unidades.iterrows():
+            uni_str = str(row['Unidad']).encode('latin-1', 'ignore').decode('latin-1')
+            pdf.cell(10, 8, "-", 0, 0)
+            pdf.cell(0, 8, f"{uni_str}", 0, 1)
+            total_unidades_dia += 1
+        pdf.ln(3)
+    pdf.ln(10)
+    efectivo_mano = total_comision_tecnico = 0.0
+    if not df_agenda_hoy.empty:
+        df_agenda_hoy['Cobro_Final'] = pd.to_numeric(df_agenda_hoy['Cobro_Final'], errors='coerce').fillna(0)
+        df_agenda_hoy['Pago_Tecnico'] = pd.to_numeric(df_agenda_hoy['Pago_Tecnico'], errors='coerce').fillna(0)
+        total_comision_tecnico = df_agenda_hoy['Pago_Tecnico'].sum()
+        efectivo_mano = df_agenda_hoy[df_agenda_hoy['Tipo_Pago'] == 'Efectivo']['Cobro_Final'].sum()
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, f"{total_unidades_dia} {efectivo_mano:,.2f} {total_comision_tecnico:,.2f}", 0, 1, 'C')
+    return pdf.output(dest='S').encode('latin-1')
+
+def agrupar_original(df_instalaciones):
+    return [(c, [r['Unidad'] for _, r in df_instalaciones[df_instalaciones['Cliente'] == c].iterrows()])
+            for c in df_instalaciones['Cliente'].unique()]
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'filas':>7} {'clientes':>8} | {'agrupar antes':>13} {'después':>9} | {'PDF antes':>10} {'después':>9}")
+    for filas in args.filas:
+        inst, agenda = datos_sinteticos(filas)
+        # Mismo resultado: grupos, orden y totales
+        esperado = [(c, list(u)) for c, u in agrupar_original(inst)]
+        assert reportes.agrupar_instalaciones(inst) == esperado
+        copia = agenda.copy()
+        reportes.totales_dia(agenda)
+        assert agenda.equals(copia), "totales_dia modificó la agenda recibida"
+
+        t_agr_a = cronometrar(lambda: agrupar_original(inst), args.repeticiones)
+        t_agr_d = cronometrar(lambda: reportes.agrupar_instalaciones(inst), args.repeticiones)
+        t_pdf_a = cronometrar(lambda: cierre_original("18/10/2026", inst, agenda.copy()), args.repeticiones)
+        t_pdf_d = cronometrar(lambda: reportes.generar_pdf_cierre_dia("18/10/2026", inst, agenda), args.repeticiones)
+        print(f"{filas:>7} {inst['Cliente'].nunique():>8} | {t_agr_a * 1000:>11.1f}ms {t_agr_d * 1000:>7.1f}ms "
+              f"| {t_pdf_a * 1000:>8.1f}ms {t_pdf_d * 1000:>7.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Latencia de rerun: lo que tarda cada app en volver a correr tras un clic.
+
+    python benchmarks/reruns.py [--reruns 30] [--ordenes 2000] [--salida reruns.json]
+
+Streamlit vuelve a ejecutar el script completo con cada interacción. Aquí se
+corren app.py y operaciones.py con streamlit.testing (sin navegador ni
+servidor), se cambia un widget antes de cada rerun y se mide el rerun. La
+primera corrida (arranque en frío) se informa aparte.
+
+Corre sin red: la base local va a una carpeta temporal con una agenda e
+instalaciones sintéticas; operaciones.py recibe secretos de prueba, así que
+trabaja en modo sin conexión con la copia local (como en campo sin señal).
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import argparse
+import statistics
+
+_TEMPORAL = tempfile.mkdtemp(prefix="reruns-cotizador-")
+os.environ["COTIZADOR_DB"] = os.path.join(_TEMPORAL, "datos_locales.db")
+os.environ["COTIZADOR_ARCHIVO"] = os.path.join(_TEMPORAL, "archivo")
+os.environ["COTIZADOR_BUZON"] = os.path.join(_TEMPORAL, "buzon_salida")
+os.environ["COTIZADOR_METRICAS"] = os.path.join(_TEMPORAL, "metricas")
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from streamlit import config
+from streamlit.testing.v1 import AppTest
+import espejo
+import hojas
+from suite import hoja_agenda, hoja_instalaciones
+
+SECRETOS = {
+    "connections": {"gsheets": {"spreadsheet": "https://docs.google.com/spreadsheets/d/sin-red/edit"}},
+    "correo": {"usuario": "bench@example.com", "destinatario": "bench@example.com", "password": "x", "servidor": "localhost"},
+}
+
+def preparar(ordenes, instalaciones):
+    """Llena la base local como si ya se hubiera sincronizado con las hojas."""
+    conn = hojas.ConexionLocal({
+        hojas.AGENDA: hoja_agenda(ordenes),
+        hojas.INSTALACIONES: hoja_instalaciones(instalaciones),
+    })
+    espejo.sincronizar(conn, hojas.AGENDA)
+    espejo.sincronizar(conn, hojas.INSTALACIONES)
+
+def _widget(lista, etiqueta):
+    return next(w for w in lista if w.label == etiqueta)
+
+# --- ESCENARIOS ---
+# Cada uno devuelve la app ya corrida una vez y una función que cambia un widget
+def cotizador():
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+    def clic(i):
+        _widget(at.number_input, "Cantidad de GPS").set_value(i % 7)
+    return at, clic
+
+def tecnico():
+    at = AppTest.from_file(os.path.join(RAIZ, "operaciones.py"), default_timeout=120)
+    for clave, valor in SECRETOS.items(): at.secrets[clave] = valor
+    def clic(i):
+        orden = _widget(at.selectbox, "Orden:")
+        orden.set_value(orden.options[i % len(orden.options)])
+    return at, clic
+
+def admin():
+    at = AppTest.from_file(os.path.join(RAIZ, "operaciones.py"), default_timeout=120)
+    for clave, valor in SECRETOS.items(): at.secrets[clave] = valor
+    def clic(i):
+        if i == 0: _widget(at.radio, "Perfil:").set_value("Admin")
+        else: _widget(at.text_input, "Cliente").set_value(f"Cliente {i}")
+    return at, clic
+
+ESCENARIOS = {"cotizador": cotizador, "tecnico": tecnico, "admin": admin}
+
+def medir(nombre, reruns):
+    at, clic = ESCENARIOS[nombre]()
+    inicio = time.perf_counter()
+    at.run()
+    frio = time.perf_counter() - inicio
+    if at.exception: raise RuntimeError(f"{nombre}: {at.exception[0].message}")
+    # Lo que la app deja cargando en segundo plano (plantilla del PDF) no cuenta en los reruns
+    for hilo in threading.enumerate():
+        if hilo.name == "plantilla-pdf": hilo.join()
+    tiempos = []
+    for i in range(reruns):
+        clic(i)
+        inicio = time.perf_counter()
+        at.run()
+        tiempos.append(time.perf_counter() - inicio)
+        if at.exception: raise RuntimeError(f"{nombre}: {at.exception[0].message}")
+    tiempos = tiempos[1:] if nombre == "admin" else tiempos  # el primero solo cambia de perfil
+    ordenados = sorted(tiempos)
+    return {
+        "escenario": nombre, "reruns": len(tiempos), "frio_ms": 1000 * frio,
+        "mediana_ms": 1000 * statistics.median(tiempos),
+        "p95_ms": 1000 * ordenados[min(len(ordenados) - 1, int(0.95 * len(ordenados)))],
+        "min_ms": 1000 * ordenados[0],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--ordenes", type=int, default=2000, help="filas de la agenda (~10%% pendientes)")
+    parser.add_argument("--instalaciones", type=int, default=20000)
+    parser.add_argument("--solo", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--salida", default=None, help="archivo JSON de resultados")
+    args = parser.parse_args(argv)
+
+    os.chdir(RAIZ)
+    # streamlit.testing vuelve a compilar el script con "magic" en cada corrida (el
+    # servidor guarda el bytecode); sin magic esa parte fija pesa menos en la medición
+    config.set_option("runner.magicEnabled", False)
+    preparar(args.ordenes, args.instalaciones)
+    resultados = []
+    print(f"{'escenario':<12} {'frío':>10} {'mediana':>10} {'p95':>10} {'mín':>10}")
+    for nombre in args.solo:
+        r = medir(nombre, args.reruns)
+        resultados.append(r)
+        print(f"{nombre:<12} {r['frio_ms']:>8.1f}ms {r['mediana_ms']:>8.1f}ms {r['p95_ms']:>8.1f}ms {r['min_ms']:>8.1f}ms")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"momento": time.strftime("%Y-%m-%d %H:%M:%S"), "parametros": vars(args), "resultados": resultados}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
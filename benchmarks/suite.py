@@ -0,0 +1,266 @@
+"""Suite de rendimiento: PDFs, folios y filtros del historial con datos sintéticos.
+
+    python benchmarks/suite.py [--rapido] [--salida resultados.json]
+    python benchmarks/suite.py --comparar base.json [--tolerancia 0.25]
+
+Corre sin red: las hojas son una hojas.ConexionLocal y la base local, el
+archivo y el buzón van a una carpeta temporal. Los datos salen de semillas
+fijas, así dos corridas miden exactamente lo mismo. Con --comparar termina con
+código 1 si algún caso es más lento que la base por encima de la tolerancia.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import tempfile
+import platform
+import argparse
+import statistics
+from datetime import date, datetime, timedelta
+
+# Todo lo que escriben los módulos va a una carpeta desechable (antes de importarlos)
+_TEMPORAL = tempfile.mkdtemp(prefix="bench-cotizador-")
+os.environ["COTIZADOR_DB"] = os.path.join(_TEMPORAL, "datos_locales.db")
+os.environ["COTIZADOR_ARCHIVO"] = os.path.join(_TEMPORAL, "archivo")
+os.environ["COTIZADOR_BUZON"] = os.path.join(_TEMPORAL, "buzon_salida")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+import fpdf
+import PIL
+from PIL import Image
+import catalogo
+import cotizacion
+import espejo
+import folios
+import hojas
+import imagenes
+import precios
+import reportes
+from cierre_dia import datos_sinteticos
+
+ESCALAS = {
+    "completo": {
+        "carrito": [1, 10, 50, 200],
+        "unidades": [1, 50, 500],
+        "resolucion": [(640, 480), (1920, 1080), (4000, 3000)],
+        "historial": [100, 1000, 10000],
+        "cotizaciones": [1000, 10000, 100000],
+        "instalaciones": [1000, 10000, 100000],
+    },
+    "rapido": {
+        "carrito": [1, 50],
+        "unidades": [1, 100],
+        "resolucion": [(640, 480), (1920, 1080)],
+        "historial": [100, 1000],
+        "cotizaciones": [1000, 10000],
+        "instalaciones": [1000, 10000],
+    },
+}
+
+# --- DATOS SINTÉTICOS ---
+def carrito(lineas, semilla=0):
+    """Carrito de `lineas` partidas: GPS + plan y el resto adicionales del catálogo o conceptos libres."""
+    rng = random.Random(semilla)
+    extras = list(catalogo.adicionales())[:max(0, lineas - 2)]
+    conceptos = [precios.partida(rng.randint(1, 20), f"Concepto especial {i} - instalación oculta", float(rng.randint(100, 5000)))
+                 for i in range(max(0, lineas - 2 - len(extras)))]
+    armado, _ = precios.armar_carrito(
+        cant_gps=rng.randint(1, 50), tipo_plan="Anual", desc_flotilla=True,
+        extras=[(k, rng.randint(1, 10), None) for k in extras], conceptos=conceptos,
+    )
+    return armado[:lineas]
+
+def unidades(n, semilla=0):
+    rng = random.Random(semilla)
+    return pd.DataFrame({
+        "Unidad": [f"Camión {i} / Placas NL-{rng.randint(0, 99999):05d}" for i in range(n)],
+        "Fecha": "18/10/2026",
+    })
+
+def foto(ancho, alto, semilla=0):
+    """JPEG con ruido (no se comprime de más, como una foto real)."""
+    rng = np.random.default_rng(semilla)
+    pixeles = rng.integers(0, 256, (alto // 8, ancho // 8, 3), dtype=np.uint8)
+    imagen = Image.fromarray(pixeles).resize((ancho, alto), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    imagen.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def hoja_cotizaciones(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    inicio = date(2024, 1, 1)
+    return pd.DataFrame({
+        "Fecha": [(inicio + timedelta(days=int(d))).strftime("%d/%m/%Y") for d in rng.integers(0, 1000, n)],
+        "Folio": np.arange(folios.FOLIO_INICIAL, folios.FOLIO_INICIAL + n),
+        "Cliente": [f"Cliente {c}" for c in rng.integers(0, max(1, n // 20), n)],
+        "Total": rng.integers(1000, 90000, n),
+        "Telefono": "8110754372",
+    })
+
+def hoja_instalaciones(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    inicio = date(2024, 1, 1)
+    ordenes = rng.integers(0, max(1, n // 4), n)
+    return pd.DataFrame({
+        "ID_Servicio": [f"ORD{o:06d}" for o in ordenes],
+        "Fecha": [(inicio + timedelta(days=int(o % 1000))).strftime("%d/%m/%Y") for o in ordenes],
+        "Cliente": [f"Transportes {o % max(5, n // 40)} SA de CV" for o in ordenes],
+        "Unidad": [f"Unidad {i}" for i in range(n)],
+        "Evidencia": "ENVIADO",
+    })
+
+def hoja_agenda(n_ordenes, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame({
+        "ID": [f"ORD{o:06d}" for o in range(n_ordenes)],
+        "Fecha_Prog": "2026-10-18", "Hora_Prog": "09:00:00",
+        "Cliente": [f"Transportes {o} SA de CV" for o in range(n_ordenes)],
+        "Telefono": "", "Ubicacion": "", "Vehiculos_Desc": "", "Notas": "",
+        "Estatus": rng.choice(["PENDIENTE", "FINALIZADO"], n_ordenes, p=[0.1, 0.9]),
+        "Cobro_Final": 0, "Tipo_Pago": "", "Pago_Tecnico": 0,
+    })
+
+# --- MEDICIÓN ---
+def cronometrar(funcion, repeticiones, minimo_s=0.2):
+    """Mediana y mínimo en ms; repite más si cada corrida es muy corta."""
+    resultado = funcion()  # calentamiento (cachés de fuentes, imports perezosos)
+    tiempos = []
+    inicio_total = time.perf_counter()
+    while len(tiempos) < repeticiones or (time.perf_counter() - inicio_total < minimo_s and len(tiempos) < 1000):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, {"mediana_ms": 1000 * statistics.median(tiempos), "min_ms": 1000 * min(tiempos), "repeticiones": len(tiempos)}
+
+class Suite:
+    def __init__(self, repeticiones):
+        self.repeticiones = repeticiones
+        self.resultados = []
+
+    def medir(self, caso, parametro, valor, funcion, tamano=None):
+        resultado, tiempos = cronometrar(funcion, self.repeticiones)
+        fila = {"caso": caso, "parametro": parametro, "valor": valor, **tiempos}
+        if tamano is not None: fila["bytes"] = tamano(resultado)
+        self.resultados.append(fila)
+        print(f"{caso:<24} {parametro}={str(valor):<12} {tiempos['mediana_ms']:>10.2f} ms"
+              + (f" {fila['bytes'] / 1024:>9.1f} KB" if "bytes" in fila else ""))
+        return resultado
+
+# --- CASOS ---
+def casos_pdf(suite, escala):
+    for lineas in escala["carrito"]:
+        items = carrito(lineas)
+        suite.medir("pdf_cotizacion", "lineas", len(items), lambda: cotizacion.generar_pdf("Transportes Norte SA de CV", 5001, items, True), len)
+    for n in escala["unidades"]:
+        df = unidades(n)
+        suite.medir("pdf_resumen_final", "unidades", n,
+                    lambda: reportes.generar_pdf_resumen_final("Transportes Norte", "18/10/2026 17:00", df, "Efectivo", 2500.0, 450.0), len)
+    datos = {"Orden": "ORD000001", "Fecha": "18/10/2026 12:00", "Cliente": "Transportes Norte", "Unidad": "Camión 7"}
+    for ancho, alto in escala["resolucion"]:
+        crudas = [foto(ancho, alto, semilla=i) for i in range(5)]
+        procesadas = suite.medir("procesar_foto", "resolucion", f"{ancho}x{alto}",
+                                 lambda: [imagenes.procesar_imagen(io.BytesIO(c)) for c in crudas])
+        fotos = dict(zip(["CHIP", "GPS", "EXTERIOR", "PLACAS", "TABLERO"], procesadas))
+        suite.medir("pdf_evidencia", "resolucion", f"{ancho}x{alto}", lambda: reportes.generar_pdf_evidencia(datos, fotos), len)
+        # Con un tope a la mitad del PDF sin ajustar, para medir lo que cuestan los escalones
+        tope = len(reportes.generar_pdf_evidencia(datos, fotos)) // 2
+        suite.medir("pdf_evidencia_ajustado", "resolucion", f"{ancho}x{alto}",
+                    lambda: reportes.generar_pdf_evidencia_ajustado(datos, fotos, tope), lambda e: e.tamano)
+    for filas in escala["historial"]:
+        inst, agenda = datos_sinteticos(filas)
+        suite.medir("pdf_cierre_dia", "instalaciones", filas, lambda: reportes.generar_pdf_cierre_dia("18/10/2026", inst, agenda), len)
+
+def casos_folios(suite, escala):
+    for n in escala["cotizaciones"]:
+        conn = hojas.ConexionLocal({hojas.COTIZACIONES: hoja_cotizaciones(n)})
+        suite.medir("folio_escaneo_hoja", "cotizaciones", n, lambda: folios.ultimo_folio_hoja(conn))
+    # Con la secuencia ya sembrada el folio sugerido no depende del historial
+    folios.inicializar(lambda: folios.FOLIO_INICIAL)
+    suite.medir("folio_secuencia", "cotizaciones", 0, folios.consultar_siguiente)
+
+def casos_filtros(suite, escala):
+    for n in escala["instalaciones"]:
+        ruta = os.path.join(_TEMPORAL, f"filtros-{n}.db")
+        inst = hoja_instalaciones(n)
+        conn = hojas.ConexionLocal({hojas.INSTALACIONES: inst, hojas.AGENDA: hoja_agenda(max(1, n // 4))})
+        suite.medir("espejo_sincronizar", "instalaciones", n,
+                    lambda: espejo.sincronizar(conn, hojas.INSTALACIONES, completo=True, ruta=ruta))
+        espejo.sincronizar(conn, hojas.AGENDA, completo=True, ruta=ruta)
+
+        cliente = inst["Cliente"].iloc[n // 2]
+        orden = inst["ID_Servicio"].iloc[n // 3]
+        filtros = {
+            "sin_filtro": espejo.filtro_instalaciones(),
+            "rango_fechas": espejo.filtro_instalaciones(date(2024, 6, 1), date(2024, 6, 30)),
+            "cliente": espejo.filtro_instalaciones(cliente=cliente[:14]),
+            "orden": espejo.filtro_instalaciones(id_servicio=orden),
+        }
+        for nombre, (donde, parametros) in filtros.items():
+            suite.medir(f"historial_{nombre}", "instalaciones", n, lambda: (
+                espejo.contar(hojas.INSTALACIONES, donde, parametros, ruta=ruta),
+                espejo.pagina(hojas.INSTALACIONES, donde, parametros, 50, ruta=ruta)))
+        suite.medir("ordenes_pendientes", "instalaciones", n, lambda: espejo.ordenes(estatus="PENDIENTE", ruta=ruta))
+        suite.medir("instalaciones_de_orden", "instalaciones", n, lambda: espejo.instalaciones_de_orden(orden, ruta=ruta))
+
+# --- RESULTADOS ---
+def entorno():
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "versiones": {"pandas": pd.__version__, "numpy": np.__version__, "fpdf": fpdf.FPDF_VERSION, "pillow": PIL.__version__},
+    }
+
+def comparar(actual, base, tolerancia):
+    """Casos más lentos que la base por encima de la tolerancia: [(caso, parametro, valor, razón)]."""
+    indice = {(r["caso"], r["parametro"], str(r["valor"])): r for r in base["resultados"]}
+    regresiones = []
+    print(f"\n{'caso':<24} {'valor':<14} {'base':>10} {'actual':>10} {'razón':>7}")
+    for r in actual["resultados"]:
+        anterior = indice.get((r["caso"], r["parametro"], str(r["valor"])))
+        if anterior is None: continue
+        razon = r["mediana_ms"] / anterior["mediana_ms"] if anterior["mediana_ms"] else 1.0
+        marca = " ⚠️" if razon > 1 + tolerancia else ""
+        print(f"{r['caso']:<24} {str(r['valor']):<14} {anterior['mediana_ms']:>8.2f}ms {r['mediana_ms']:>8.2f}ms {razon:>6.2f}x{marca}")
+        if marca: regresiones.append((r["caso"], r["parametro"], r["valor"], razon))
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rapido", action="store_true", help="escalas chicas (para CI o una revisión rápida)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida", default=None, help="archivo JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="fracción de más tiempo aceptada")
+    parser.add_argument("--solo", nargs="+", choices=["pdf", "folios", "filtros"], default=["pdf", "folios", "filtros"])
+    args = parser.parse_args(argv)
+
+    escala_nombre = "rapido" if args.rapido else "completo"
+    escala = ESCALAS[escala_nombre]
+    suite = Suite(args.repeticiones)
+    if "pdf" in args.solo: casos_pdf(suite, escala)
+    if "folios" in args.solo: casos_folios(suite, escala)
+    if "filtros" in args.solo: casos_filtros(suite, escala)
+
+    resultado = {**entorno(), "escala": escala_nombre, "resultados": suite.resultados}
+    salida = args.salida or f"benchmarks/resultados-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(resultado, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} casos más lentos que la base (+{args.tolerancia:.0%}).")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+# --- CATÁLOGO MAESTRO ---
+# AQUI SE AGREGÓ EL PRODUCTO 11 (RENOVACIÓN)
+CATALOGO = {
+    1: {"nombre": "GPS RASTREADOR 4G PRO\n   + Instalación Oculta y Profesional\n   + Bloqueo de Motor a Distancia\n   + Batería de Respaldo Interna\n   + Conectividad Híbrida 4G-2G", "precio": 2200, "alias": "GPS"},
+    2: {"nombre": "PLAN MENSUAL DE SERVICIO\n   + Plataforma Web y App (Android/iOS)\n   + Ubicación en Tiempo Real (30s)\n   + Historial de Rutas (3 Meses)\n   + Alertas de Seguridad", "precio": 300, "alias": "SvcMes"},
+    3: {"nombre": "PLAN ANUAL (¡PROMOCIÓN: PAGA 6 Y RECIBE 12!)\n   + 12 Meses de Servicio Premium\n   + Plataforma Web y App (Android/iOS)\n   + Ubicación en Tiempo Real (30s)\n   + Historial de Rutas (3 Meses)", "precio": 1800, "alias": "Anual"},
+    4: {"nombre": "DASHCAM DUAL JC400\n   + Cámara Frontal + Interior\n   + Transmisión en Vivo", "precio": 9000, "alias": "DashDual"},
+    5: {"nombre": "Renta Mensual Dashcam", "precio": 600, "alias": "SvcDash"},
+    6: {"nombre": "DASHCAM FULL HUB 5 CANALES\n   + Soporta 5 cámaras + IA\n   + Grabación Disco Duro", "precio": 9600, "alias": "DashFull"},
+    7: {"nombre": "Cámara Extra (Lateral/Trasera)", "precio": 1800, "alias": "CamExtra"},
+    8: {"nombre": "Renta Mensual Dashcam Full", "precio": 600, "alias": "MensDash"},
+    9: {"nombre": "Sensor de Combustible (Varilla)\n   + Detección de Ordeña\n   + Litros Exactos", "precio": 7000, "alias": "Sensor"},
+    10: {"nombre": "GPS Magnético (Portátil)\n   + Cero Instalación\n   + Inc. 1 año servicio", "precio": 5500, "alias": "GPSMag"},
+    11: {"nombre": "RENOVACIÓN ANUALIDAD\n   + Servicios de Datos y Plataforma\n   + Cobertura 12 Meses", "precio": 1800, "alias": "Renovacion"}
+}
+
+# Productos que arma el configurador de GPS; el resto son adicionales
+ID_GPS, ID_MENSUAL, ID_ANUAL = 1, 2, 3
+TASA_IVA = 0.16
+LEYENDA_FLOTILLA = "\n   >> PRECIO ESPECIAL FLOTILLAS (Desc. Aplicado)"
+DESC_VIATICOS = "SERVICIO A DOMICILIO / VIÁTICOS"
+
+# --- DESCUENTOS ---
+# Precio con el interruptor "Descuento Flotilla" activo
+PRECIOS_FLOTILLA = {ID_GPS: 1700}
+# Escalas por volumen: id -> [(cantidad mínima, precio unitario), ...]. Se aplica
+# la escala más baja que alcance la cantidad de la partida (nunca sube el precio).
+ESCALAS = {}
+
+def por_alias(alias):
+    """Id del producto con ese alias (sin distinguir mayúsculas), o None."""
+    alias = str(alias).strip().lower()
+    return next((k for k, v in CATALOGO.items() if v["alias"].lower() == alias), None)
+
+def adicionales():
+    return {k: v for k, v in CATALOGO.items() if k not in (ID_GPS, ID_MENSUAL, ID_ANUAL)}
@@ -0,0 +1,337 @@
+import os
+import re
+import json
+import threading
+import time
+import uuid
+import smtplib
+import email
+from contextlib import contextmanager
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+import metricas
+try: import fcntl
+except ImportError: fcntl = None
+
+# --- BUZÓN DE SALIDA ---
+# Cada correo se guarda como .eml en disco antes de enviarse; un hilo lo drena
+# reutilizando una sola sesión SMTP y reintenta con espera exponencial (con tope).
+# En campo se pasan días sin señal: solo se rinde con correos encolados hace más
+# de RENDIRSE_TRAS, que pasan a fallidos/ y se pueden volver a encolar.
+RUTA_BUZON = os.environ.get("COTIZADOR_BUZON", "buzon_salida")
+ESPERA_BASE = 5
+ESPERA_MAX = 600
+RENDIRSE_TRAS = 72 * 3600   # segundos desde que se encoló
+INACTIVIDAD = 60   # segundos antes de cerrar la sesión SMTP ociosa
+
+_aviso = threading.Event()
+_candado = threading.Lock()
+_cartero = None
+
+def _carpeta(ruta, nombre):
+    carpeta = os.path.join(ruta or RUTA_BUZON, nombre)
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+def construir_mensaje(remitente, destinatario, asunto, cuerpo, adjuntos=()):
+    """Arma el correo; `adjuntos` es una lista de (nombre_archivo, bytes)."""
+    msg = MIMEMultipart()
+    msg['From'] = remitente
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg.attach(MIMEText(cuerpo, 'plain'))
+    for nombre_archivo, datos in adjuntos:
+        if not datos: continue
+        adjunto = MIMEApplication(datos, Name=nombre_archivo)
+        adjunto['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+        msg.attach(adjunto)
+    return msg
+
+def encolar(mensaje, ruta=None):
+    """Guarda el mensaje en el buzón (escritura atómica) y despierta al cartero."""
+    pendientes = _carpeta(ruta, "pendientes")
+    nombre = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.eml"
+    temporal = os.path.join(pendientes, nombre + ".tmp")
+    with open(temporal, "wb") as f:
+        f.write(mensaje.as_bytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, os.path.join(pendientes, nombre))
+    _aviso.set()
+    return nombre
+
+def pendientes(ruta=None):
+    return sorted(n for n in os.listdir(_carpeta(ruta, "pendientes")) if n.endswith(".eml"))
+
+def fallidos(ruta=None):
+    return sorted(n for n in os.listdir(_carpeta(ruta, "fallidos")) if n.endswith(".eml"))
+
+def _encolado(nombre):
+    """Momento (epoch) en que se encoló, tomado del nombre del archivo."""
+    try: return int(nombre.split("-", 1)[0]) / 1e9
+    except ValueError: return 0.0
+
+def reencolar(ruta=None):
+    """Devuelve los correos de fallidos/ al buzón, como recién encolados; cuántos movió."""
+    carpeta, destino = _carpeta(ruta, "fallidos"), _carpeta(ruta, "pendientes")
+    movidos = 0
+    for nombre in fallidos(ruta):
+        nuevo = f"{time.time_ns()}-{nombre.split('-', 1)[-1]}"
+        os.replace(os.path.join(carpeta, nombre), os.path.join(destino, nuevo))
+        movidos += 1
+    if movidos: _aviso.set()
+    return movidos
+
+# --- RESÚMENES (MODO DIGEST) ---
+# Los PDFs de una orden se acumulan en resumenes/<grupo>/ y salen juntos en uno
+# o varios correos que no rebasan LIMITE_ADJUNTOS (Gmail acepta 25 MB tras base64).
+# Agregar y cerrar toman el candado del grupo: el admin ("Cerrar orden") y el
+# cartero (resúmenes vencidos) pueden cerrar el mismo grupo a la vez, y un
+# adjunto que llega durante el cierre debe caer en el grupo viejo o en uno nuevo.
+LIMITE_ADJUNTOS = 18 * 1024 * 1024
+
+_candados_resumen = {}
+_candado_resumenes = threading.Lock()
+
+def _nombre_grupo(grupo):
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(grupo))
+
+def _carpeta_resumen(grupo, ruta=None):
+    return _carpeta(ruta, os.path.join("resumenes", _nombre_grupo(grupo)))
+
+@contextmanager
+def _candado_resumen(grupo, ruta=None):
+    """Exclusión por grupo entre hilos y procesos (flock en resumenes/.<grupo>.lock).
+
+    El archivo del candado vive fuera de la carpeta del grupo, que se borra al cerrarlo.
+    """
+    ruta_candado = os.path.join(_carpeta(ruta, "resumenes"), f".{_nombre_grupo(grupo)}.lock")
+    with _candado_resumenes:
+        candado = _candados_resumen.setdefault(ruta_candado, threading.Lock())
+    with candado:
+        if fcntl is None:
+            yield
+            return
+        with open(ruta_candado, "w") as archivo:
+            fcntl.flock(archivo, fcntl.LOCK_EX)
+            try: yield
+            finally: fcntl.flock(archivo, fcntl.LOCK_UN)
+
+def agregar_a_resumen(grupo, nombre_archivo, datos, remitente, destinatario, asunto, ruta=None):
+    """Guarda un adjunto para enviarlo después junto con el resto del grupo.
+
+    Si el grupo se acaba de cerrar, abre uno nuevo.
+    """
+    with _candado_resumen(grupo, ruta):
+        carpeta = _carpeta_resumen(grupo, ruta)
+        meta = os.path.join(carpeta, "resumen.json")
+        if not os.path.exists(meta):
+            with open(meta + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"remitente": remitente, "destinatario": destinatario, "asunto": asunto, "inicio": time.time()}, f)
+            os.replace(meta + ".tmp", meta)
+        nombre = f"{time.time_ns()}-{nombre_archivo}"
+        temporal = os.path.join(carpeta, nombre + ".tmp")
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, os.path.join(carpeta, nombre))
+        return nombre
+
+def cerrar_resumen(grupo, cuerpo=None, limite=LIMITE_ADJUNTOS, ruta=None):
+    """Encola los adjuntos acumulados del grupo en correos de hasta `limite` bytes.
+
+    Devuelve cuántos correos encoló; 0 si otro ya lo cerró.
+    """
+    with _candado_resumen(grupo, ruta):
+        return _cerrar_resumen(grupo, cuerpo, limite, ruta)
+
+def _cerrar_resumen(grupo, cuerpo, limite, ruta):
+    carpeta = os.path.join(_carpeta(ruta, "resumenes"), _nombre_grupo(grupo))
+    meta = os.path.join(carpeta, "resumen.json")
+    if not os.path.exists(meta): return 0
+    with open(meta, encoding="utf-8") as f:
+        datos_meta = json.load(f)
+    archivos = sorted(n for n in os.listdir(carpeta) if n != "resumen.json" and not n.endswith(".tmp"))
+
+    lotes, lote, tamano = [], [], 0
+    for nombre in archivos:
+        peso = os.path.getsize(os.path.join(carpeta, nombre))
+        if lote and tamano + peso > limite:
+            lotes.append(lote)
+            lote, tamano = [], 0
+        lote.append(nombre)
+        tamano += peso
+    if lote: lotes.append(lote)
+
+    for i, lote in enumerate(lotes, start=1):
+        adjuntos = []
+        for nombre in lote:
+            with open(os.path.join(carpeta, nombre), "rb") as f:
+                adjuntos.append((nombre.split("-", 1)[1], f.read()))
+        asunto = datos_meta["asunto"] + (f" ({i}/{len(lotes)})" if len(lotes) > 1 else "")
+        texto = cuerpo or "Evidencias incluidas:"
+        texto += "\n" + "\n".join(f"- {n}" for n, _ in adjuntos)
+        encolar(construir_mensaje(datos_meta["remitente"], datos_meta["destinatario"], asunto, texto, adjuntos), ruta)
+        for nombre in lote: os.remove(os.path.join(carpeta, nombre))
+
+    # Con el candado tomado no llegan adjuntos nuevos; solo quedan .tmp de un corte a medias
+    os.remove(meta)
+    for nombre in os.listdir(carpeta):
+        try: os.remove(os.path.join(carpeta, nombre))
+        except OSError: pass
+    try: os.rmdir(carpeta)
+    except OSError: pass
+    return len(lotes)
+
+def resumenes_vencidos(intervalo, ruta=None):
+    """Grupos abiertos hace más de `intervalo` segundos."""
+    raiz = _carpeta(ruta, "resumenes")
+    vencidos = []
+    for grupo in os.listdir(raiz):
+        meta = os.path.join(raiz, grupo, "resumen.json")
+        try:
+            with open(meta, encoding="utf-8") as f:
+                if time.time() - json.load(f)["inicio"] > intervalo: vencidos.append(grupo)
+        except (OSError, ValueError, KeyError): continue
+    return vencidos
+
+# --- CARTERO (HILO DE ENVÍO) ---
+class Cartero(threading.Thread):
+    """Drena el buzón con una sesión SMTP autenticada que se reutiliza entre mensajes.
+
+    `config` usa las llaves de [correo] en secrets.toml: usuario, password y
+    opcionalmente servidor, puerto y starttls (para apuntar a un SMTP local).
+    Con `intervalo_resumen` (segundos) también despacha los resúmenes vencidos.
+    """
+    def __init__(self, config, ruta=None):
+        super().__init__(name="cartero", daemon=True)
+        self.config = dict(config)
+        self.ruta = ruta or RUTA_BUZON
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self._reintentos = {}   # nombre -> (intentos, próximo intento)
+        self._detener = threading.Event()
+        self.enviados = 0
+        self.errores = 0
+        self.ultimo_error = None
+
+    # Sesión SMTP
+    def _conectar(self):
+        servidor = self.config.get("servidor", "smtp.gmail.com")
+        puerto = int(self.config.get("puerto", 587))
+        smtp = smtplib.SMTP(servidor, puerto, timeout=30)
+        if self.config.get("starttls", True): smtp.starttls()
+        if self.config.get("usuario") and self.config.get("password"):
+            smtp.login(self.config["usuario"], self.config["password"])
+        return smtp
+
+    def _sesion(self):
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250: return self._smtp
+            except smtplib.SMTPException: pass
+            except OSError: pass
+            self._cerrar()
+        self._smtp = self._conectar()
+        return self._smtp
+
+    def _cerrar(self):
+        if self._smtp is None: return
+        try: self._smtp.quit()
+        except Exception: pass
+        self._smtp = None
+
+    # Ciclo
+    def _enviar(self, archivo):
+        with metricas.medir("correo_smtp") as m:
+            with open(archivo, "rb") as f:
+                datos = f.read()
+            m.cargar(bytes=len(datos))
+            self._sesion().send_message(email.message_from_bytes(datos))
+        self._ultimo_uso = time.monotonic()
+
+    def drenar(self):
+        """Intenta enviar los pendientes que ya toca; devuelve segundos hasta el próximo."""
+        carpeta = _carpeta(self.ruta, "pendientes")
+        ahora = time.monotonic()
+        espera = None
+        for nombre in pendientes(self.ruta):
+            if self._detener.is_set(): break
+            intentos, proximo = self._reintentos.get(nombre, (0, 0.0))
+            if proximo > ahora:
+                espera = min(espera or ESPERA_MAX, proximo - ahora)
+                continue
+            archivo = os.path.join(carpeta, nombre)
+            try:
+                self._enviar(archivo)
+                os.remove(archivo)
+                self._reintentos.pop(nombre, None)
+                self.enviados += 1
+            except Exception as e:
+                self._cerrar()
+                self.errores += 1
+                self.ultimo_error = str(e)
+                intentos += 1
+                if time.time() - _encolado(nombre) >= RENDIRSE_TRAS:
+                    os.replace(archivo, os.path.join(_carpeta(self.ruta, "fallidos"), nombre))
+                    self._reintentos.pop(nombre, None)
+                    continue
+                retraso = min(ESPERA_BASE * 2 ** (intentos - 1), ESPERA_MAX)
+                self._reintentos[nombre] = (intentos, time.monotonic() + retraso)
+                espera = min(espera or ESPERA_MAX, retraso)
+        return espera
+
+    def despachar_resumenes(self):
+        intervalo = self.config.get("intervalo_resumen")
+        if not intervalo: return
+        for grupo in resumenes_vencidos(float(intervalo), self.ruta):
+            cerrar_resumen(grupo, ruta=self.ruta)
+
+    def run(self):
+        while not self._detener.is_set():
+            _aviso.clear()
+            try:
+                self.despachar_resumenes()
+                espera = self.drenar()
+            except Exception as e:
+                self.ultimo_error = str(e)
+                espera = ESPERA_BASE
+            if self._smtp is not None and time.monotonic() - self._ultimo_uso > INACTIVIDAD:
+                self._cerrar()
+            if self.config.get("intervalo_resumen"): espera = min(espera or INACTIVIDAD, INACTIVIDAD)
+            _aviso.wait(espera if espera is not None else INACTIVIDAD)
+        self._cerrar()
+
+    def detener(self):
+        self._detener.set()
+        _aviso.set()
+
+    def estado(self):
+        return {
+            "pendientes": len(pendientes(self.ruta)),
+            "fallidos": len(fallidos(self.ruta)),
+            "enviados": self.enviados,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+        }
+
+def _tomar_buzon(ruta):
+    """Solo un proceso por buzón lo drena; los demás solo encolan."""
+    if fcntl is None: return True
+    archivo = open(os.path.join(_carpeta(ruta, ""), ".cartero.lock"), "w")
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return False
+    _tomar_buzon.archivo = archivo  # mantener el candado mientras viva el proceso
+    return True
+
+def iniciar(config, ruta=None):
+    """Arranca (una vez por proceso) el hilo que drena el buzón."""
+    global _cartero
+    with _candado:
+        if _cartero is not None and _cartero.is_alive(): return _cartero
+        _cartero = Cartero(config, ruta)
+        if _tomar_buzon(_cartero.ruta): _cartero.start()
+        return _cartero
@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+import fpdf
+from fpdf import FPDF
+import metricas
+import precios
+
+# --- ESTILOS VISUALES ---
+COLOR_PRIMARIO = (18, 52, 89)
+COLOR_SECUNDARIO = (255, 195, 0)
+RUTA_LOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logo.png")
+
+# --- CLASE PDF ---
+class PDF(FPDF):
+    # Con plantilla, encabezado, pie y datos bancarios se copian ya dibujados
+    usar_plantilla = True
+
+    def encabezado(self):
+        self.set_fill_color(*COLOR_PRIMARIO)
+        self.rect(0, 0, 210, 42, 'F')
+        if os.path.exists(RUTA_LOGO): self.image(RUTA_LOGO, 10, 5, 30)
+        self.set_font('Arial', 'B', 20)
+        self.set_text_color(255, 255, 255)
+        self.set_xy(0, 8)
+        self.cell(0, 10, 'COTIZACIÓN', 0, 1, 'R')
+        self.set_font('Arial', '', 9)
+        self.set_xy(0, 16)
+        self.cell(0, 4, 'Soluciones Tecnológicas en Rastreo', 0, 1, 'R')
+        self.set_font('Arial', '', 7)
+        self.set_text_color(230, 230, 230)
+        self.set_xy(0, 23)
+        self.cell(0, 3, 'Benito Juarez 1818, Local 3', 0, 1, 'R')
+        self.set_xy(0, 27)
+        self.cell(0, 3, 'Col. Sin nombre, Guadalupe N.L, CP. 67188', 0, 1, 'R')
+        self.set_xy(0, 31)
+        self.set_font('Arial', 'B', 8)
+        self.cell(0, 3, 'Tel. 811-075-4372', 0, 1, 'R')
+        self.ln(15)
+
+    def terminos(self):
+        self.set_y(-35)
+        self.set_font('Arial', '', 7)
+        self.set_text_color(100, 100, 100)
+        self.set_draw_color(200, 200, 200)
+        self.line(10, 260, 200, 260)
+        terminos = "VIGENCIA: 15 días. GARANTÍA: 1 año. PAGOS: 50% anticipo. INSTALACIÓN: Incluida en zona metropolitana."
+        self.multi_cell(0, 4, terminos, 0, 'C')
+
+    def datos_bancarios(self):
+        self.set_font('Arial', 'B', 9)
+        self.set_text_color(*COLOR_PRIMARIO)
+        self.cell(0, 5, "DATOS BANCARIOS PARA DEPÓSITO / TRANSFERENCIA:", 0, 1)
+        self.set_font('Arial', '', 8)
+        self.set_text_color(50, 50, 50)
+        self.ln(2)
+        self.cell(0, 4, "Banco: BANAMEX", 0, 1)
+        self.cell(0, 4, "Beneficiario: FERNANDO MANUEL ARAIZA NAVA", 0, 1)
+        self.cell(0, 4, "Tarjeta Débito: 5204 1660 0460 5095", 0, 1)
+        self.cell(0, 4, "CLABE Interbancaria: 002580700958459576", 0, 1)
+        self.cell(0, 4, "Concepto de pago: Favor de incluir su NÚMERO DE FOLIO", 0, 1)
+
+    def header(self):
+        if not (self.usar_plantilla and plantilla().reproducir(self, "encabezado")):
+            self.encabezado()
+
+    def footer(self):
+        if not (self.usar_plantilla and plantilla().reproducir(self, "terminos")):
+            self.terminos()
+        self.set_y(-15)
+        self.cell(0, 10, f'Pág {self.page_no()}/{{nb}}', 0, 0, 'C')
+
+    def bloque_bancario(self):
+        if not (self.usar_plantilla and plantilla().reproducir(self, "datos_bancarios", desplazable=True)):
+            self.datos_bancarios()
+
+# --- PLANTILLA (PARTES FIJAS) ---
+# Las partes fijas se dibujan una vez por proceso en un PDF de ensayo y se guardan
+# como operadores PDF ya generados. En cada cotización solo se copian, junto con
+# las fuentes y el logo (leído y decodificado una sola vez) que esos operadores usan.
+# Eso lee y escribe atributos internos de FPDF (pages, fonts, images, ...) tal como
+# los maneja fpdf 1.7.2; con otra versión las partes fijas se dibujan en vivo.
+VERSION_FPDF = "1.7.2"
+ESTADO = ("font_family", "font_style", "font_size_pt", "font_size", "underline", "unifontsubset",
+          "text_color", "fill_color", "draw_color", "color_flag", "line_width", "ws", "x", "y", "lasth")
+
+class Fragmento:
+    def __init__(self, pdf, inicio, estado_previo, y_inicial, relleno_previo):
+        self.ops = pdf.pages[pdf.page][inicio:]
+        self.y_inicial = y_inicial
+        self.relleno_previo = relleno_previo
+        # Solo lo que el fragmento cambió; el resto del estado es el de cada cotización
+        self.estado = {a: getattr(pdf, a, None) for a in ESTADO if getattr(pdf, a, None) != estado_previo[a]}
+        self.fuente_actual = next((k for k, f in pdf.fonts.items() if f is pdf.current_font), None)
+        ids_fuentes = {int(i) for i in re.findall(r"/F(\d+) ", self.ops)}
+        ids_imagenes = {int(i) for i in re.findall(r"/I(\d+) Do", self.ops)}
+        self.fuentes = sorted(((f["i"], k, f) for k, f in pdf.fonts.items() if f["i"] in ids_fuentes), key=lambda t: t[0])
+        self.imagenes = sorted(((im["i"], k, im) for k, im in pdf.images.items() if im["i"] in ids_imagenes), key=lambda t: t[0])
+
+class Plantilla:
+    """Operadores de encabezado, pie y datos bancarios, listos para copiarse."""
+    def __init__(self):
+        pdf = FPDF()   # sin header/footer: se graba cada parte por separado
+        pdf.set_compression(False)
+        pdf.add_page()
+        self.formato = (pdf.w, pdf.h, pdf.k)
+        self.fragmentos = {}
+        for nombre, y_inicial in (("encabezado", None), ("datos_bancarios", 150), ("terminos", None)):
+            if y_inicial is not None: pdf.set_xy(pdf.l_margin, y_inicial)
+            # Así llega el estado en una cotización real (color_flag activo)
+            pdf.set_fill_color(*COLOR_SECUNDARIO)
+            previo = {a: getattr(pdf, a, None) for a in ESTADO}
+            inicio = len(pdf.pages[pdf.page])
+            getattr(PDF, nombre)(pdf)
+            self.fragmentos[nombre] = Fragmento(pdf, inicio, previo, y_inicial, previo["fill_color"])
+        self.altura_bancaria = self.fragmentos["datos_bancarios"].estado["y"] - 150
+
+    def _registrar(self, pdf, fragmento):
+        """Da de alta fuentes e imágenes con los mismos números que en la plantilla."""
+        for registro, usados in ((pdf.fonts, fragmento.fuentes), (pdf.images, fragmento.imagenes)):
+            for i, clave, info in usados:
+                if clave in registro:
+                    if registro[clave]["i"] != i: return False
+                elif len(registro) + 1 == i:
+                    registro[clave] = {k: v for k, v in info.items() if k != "n"}
+                else: return False
+        return True
+
+    def reproducir(self, pdf, nombre, desplazable=False):
+        """Copia un fragmento en la página actual; False si hay que dibujarlo en vivo."""
+        fragmento = self.fragmentos[nombre]
+        if (pdf.w, pdf.h, pdf.k) != self.formato or pdf.page == 0: return False
+        if desplazable:
+            if pdf.fill_color != fragmento.relleno_previo or pdf.x != pdf.l_margin: return False
+            if pdf.y + self.altura_bancaria > pdf.page_break_trigger: return False
+        if not self._registrar(pdf, fragmento): return False
+
+        if desplazable:
+            # Mismos operadores, trasladados a la altura actual; q/Q deja intacto el estado gráfico
+            dy = (pdf.y - fragmento.y_inicial) * pdf.k
+            pdf.pages[pdf.page] += f"q 1 0 0 1 0 {-dy:.2f} cm\n" + fragmento.ops + "Q\n"
+            pdf.x = fragmento.estado.get("x", pdf.x)
+            pdf.y += self.altura_bancaria
+            pdf.lasth = fragmento.estado.get("lasth", pdf.lasth)
+            return True
+
+        pdf.pages[pdf.page] += fragmento.ops
+        for atributo, valor in fragmento.estado.items(): setattr(pdf, atributo, valor)
+        if "font_family" in fragmento.estado or "font_style" in fragmento.estado or "font_size_pt" in fragmento.estado:
+            pdf.current_font = pdf.fonts[fragmento.fuente_actual]
+        return True
+
+class EnVivo:
+    """En lugar de la plantilla cuando fpdf no es VERSION_FPDF: todo se dibuja en vivo."""
+    def reproducir(self, pdf, nombre, desplazable=False):
+        return False
+
+_plantilla = None
+_candado = threading.Lock()
+
+def plantilla():
+    global _plantilla
+    with _candado:
+        if _plantilla is None:
+            _plantilla = Plantilla() if getattr(fpdf, "FPDF_VERSION", None) == VERSION_FPDF else EnVivo()
+        return _plantilla
+
+# --- HUELLA DE COTIZACIÓN ---
+def huella(cliente, folio, carrito, lleva_iva):
+    """Hash canónico de una cotización: mismo contenido, misma huella."""
+    canonico = json.dumps([str(cliente).strip(), folio, carrito, bool(lleva_iva)],
+                          sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonico.encode("utf-8"), digest_size=16).hexdigest()
+
+# --- PDF DE COTIZACIÓN ---
+@metricas.instrumentar("pdf_cotizacion", carga=metricas.bytes_de)
+def generar_pdf(cliente, folio, carrito, lleva_iva):
+    pdf = PDF()
+    pdf.alias_nb_pages()
+    pdf.add_page()
+    hoy = datetime.now()
+    fecha_emision = hoy.strftime("%d/%m/%Y")
+    fecha_vence = (hoy + timedelta(days=15)).strftime("%d/%m/%Y")
+
+    pdf.set_y(50)
+    pdf.set_font('Arial', 'B', 10)
+    pdf.set_text_color(*COLOR_PRIMARIO)
+    pdf.cell(100, 6, "DATOS DEL CLIENTE:", 0, 1)
+    pdf.set_font('Arial', '', 10)
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(100, 6, cliente.upper(), 0, 0)
+    pdf.set_xy(140, 50)
+    pdf.set_font('Arial', 'B', 10)
+    pdf.set_text_color(*COLOR_PRIMARIO)
+    pdf.cell(60, 6, f"FOLIO: #{folio}", 0, 1, 'R')
+    pdf.set_xy(140, 56)
+    pdf.set_text_color(0,0,0)
+    pdf.set_font('Arial', '', 10)
+    pdf.cell(60, 6, f"Fecha: {fecha_emision}", 0, 1, 'R')
+    pdf.set_xy(140, 62)
+    pdf.set_text_color(200, 0, 0)
+    pdf.cell(60, 6, f"Vence: {fecha_vence}", 0, 1, 'R')
+    pdf.set_y(80)
+
+    pdf.set_fill_color(*COLOR_PRIMARIO)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font('Arial', 'B', 9)
+    pdf.cell(15, 8, 'CANT.', 0, 0, 'C', 1)
+    pdf.cell(120, 8, 'DESCRIPCIÓN', 0, 0, 'L', 1)
+    pdf.cell(30, 8, 'P. UNIT.', 0, 0, 'R', 1)
+    pdf.cell(30, 8, 'IMPORTE', 0, 1, 'R', 1)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font('Arial', '', 8)
+
+    fill = False
+    for item in carrito:
+        lineas = item['desc'].count('\n') + 1
+        h = max(lineas * 5, 10)
+        if fill: pdf.set_fill_color(245, 245, 245)
+        else: pdf.set_fill_color(255, 255, 255)
+        pdf.cell(15, h, str(item['cant']), 0, 0, 'C', 1)
+        x, y = pdf.get_x(), pdf.get_y()
+        pdf.multi_cell(120, 5, item['desc'], 0, 'L', 1)
+        pdf.set_xy(x + 120, y)
+        x_precio = pdf.get_x()
+        pdf.rect(x_precio, y, 30, h, 'F')
+
+        # Solo mostramos precio tachado si NO es precio manual y hay descuento real
+        if item.get('original') and item['original'] > item['unitario']:
+            pdf.set_font('Arial', '', 7)
+            pdf.set_text_color(150, 150, 150)
+            pdf.set_xy(x_precio, y+2)
+            pdf.cell(30, 4, f"${item['original']:,.2f}", 0, 0, 'R')
+            ancho = pdf.get_string_width(f"${item['original']:,.2f}")
+            pdf.set_draw_color(150, 50, 50)
+            pdf.line(x_precio+30-1-ancho, y+4, x_precio+29, y+4)
+            pdf.set_xy(x_precio, y+6)
+            pdf.set_font('Arial', 'B', 8)
+            pdf.set_text_color(0,0,0)
+            pdf.cell(30, 4, f"${item['unitario']:,.2f}", 0, 0, 'R')
+            pdf.set_xy(x_precio+30, y)
+        else:
+            pdf.set_text_color(0,0,0)
+            pdf.cell(30, h, f"${item['unitario']:,.2f}", 0, 0, 'R')
+
+        pdf.cell(30, h, f"${item['total']:,.2f}", 0, 1, 'R', 1)
+        fill = not fill
+
+    pdf.set_draw_color(*COLOR_PRIMARIO)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(5)
+    gran_total, iva, total = precios.resumen(carrito, lleva_iva)
+    x_start = 130
+    if lleva_iva:
+        pdf.set_x(x_start)
+        pdf.cell(35, 6, "SUBTOTAL:", 0, 0, 'R')
+        pdf.cell(30, 6, f"${gran_total:,.2f}", 0, 1, 'R')
+        pdf.set_x(x_start)
+        pdf.cell(35, 6, "IVA (16%):", 0, 0, 'R')
+        pdf.cell(30, 6, f"${iva:,.2f}", 0, 1, 'R')
+    pdf.ln(2)
+    pdf.set_x(x_start)
+    pdf.set_fill_color(*COLOR_SECUNDARIO)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(35, 10, "TOTAL NETO:", 1, 0, 'R', 1)
+    pdf.cell(30, 10, f"${total:,.2f}", 1, 1, 'R', 1)
+    if not lleva_iva:
+        pdf.ln(2)
+        pdf.set_x(x_start - 20)
+        pdf.set_font('Arial', 'I', 8)
+        pdf.set_text_color(200, 0, 0)
+        pdf.cell(85, 5, "* Precios más IVA en caso de requerir factura.", 0, 1, 'R')
+
+    pdf.ln(15)
+    pdf.bloque_bancario()
+    return pdf.output(dest='S').encode('latin-1')
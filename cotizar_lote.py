@@ -0,0 +1,173 @@
+"""Genera cotizaciones en lote a partir de un CSV o JSON (licitaciones de flotillas).
+
+    python cotizar_lote.py solicitudes.csv --salida cotizaciones_lote --procesos 4
+
+Cada fila es una cotización: cliente, telefono, cant_gps, plan (Anual/Mensual),
+flotilla, iva, viaticos y opcionalmente precio_gps / precio_plan (modo libre).
+Los adicionales van en una columna por alias del catálogo (DashDual, Sensor, ...)
+con la cantidad, y precio_<alias> para cambiarles el precio. En JSON también se
+acepta "extras": {"alias": cantidad}.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import catalogo
+import cotizacion
+import precios
+import espejo
+import folios
+import hojas
+
+VERDADEROS = {"1", "si", "sí", "s", "x", "true", "yes", "y"}
+
+# --- LECTURA DE SOLICITUDES ---
+def leer_solicitudes(ruta):
+    if ruta.lower().endswith(".json"):
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        return datos["cotizaciones"] if isinstance(datos, dict) else datos
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+def _numero(valor, defecto=0):
+    valor = _texto(valor).replace("$", "").replace(",", "")
+    return float(valor) if valor else defecto
+
+def _si(valor):
+    if isinstance(valor, bool): return valor
+    return _texto(valor).lower() in VERDADEROS
+
+def armar(solicitud):
+    """(cliente, telefono, carrito, lleva_iva) con las mismas reglas que la app."""
+    campos = {_texto(k).lower(): v for k, v in solicitud.items() if k is not None}
+    precio_gps = _numero(campos.get("precio_gps"), None)
+    precio_plan = _numero(campos.get("precio_plan"), None)
+
+    cantidades = dict(campos.get("extras") or {})
+    for producto in catalogo.adicionales().values():
+        alias = producto["alias"].lower()
+        if alias in campos: cantidades[alias] = campos[alias]
+    extras = []
+    for alias, cant in cantidades.items():
+        id_producto = catalogo.por_alias(alias)
+        if id_producto is None: raise ValueError(f"Producto desconocido: {alias}")
+        extras.append((id_producto, int(_numero(cant)), _numero(campos.get(f"precio_{alias.lower()}"), None)))
+
+    carrito, _ = precios.armar_carrito(
+        int(_numero(campos.get("cant_gps"))),
+        _texto(campos.get("plan")) or "Anual",
+        _si(campos.get("flotilla")),
+        precio_gps=precio_gps, precio_plan=precio_plan,
+        extras=extras, costo_envio=_numero(campos.get("viaticos")),
+    )
+    return _texto(campos.get("cliente")), _texto(campos.get("telefono")), carrito, _si(campos.get("iva"))
+
+# --- GENERACIÓN ---
+def nombre_archivo(cliente, folio):
+    nombre_clean = re.sub(r'[^a-zA-Z0-9]', '', cliente.split()[0])
+    return f"Cotizacion-{nombre_clean}-{folio}.pdf"
+
+def _renderizar(tarea):
+    """Corre en un proceso del pool; escribe el PDF ahí mismo para no devolver los bytes."""
+    cliente, folio, carrito, lleva_iva, salida = tarea
+    inicio = time.perf_counter()
+    pdf_bytes = cotizacion.generar_pdf(cliente, folio, carrito, lleva_iva)
+    ruta = os.path.join(salida, nombre_archivo(cliente, folio))
+    with open(ruta, "wb") as f:
+        f.write(pdf_bytes)
+    return ruta, len(pdf_bytes), time.perf_counter() - inicio
+
+def generar_lote(solicitudes, salida, conn=None, procesos=None):
+    """Arma, asigna folios en bloque, renderiza en paralelo y registra en una sola escritura."""
+    inicio = time.perf_counter()
+    validas, errores = [], []
+    for i, solicitud in enumerate(solicitudes, start=1):
+        try: cliente, telefono, carrito, lleva_iva = armar(solicitud)
+        except (ValueError, TypeError) as e:
+            errores.append(f"Fila {i}: {e}")
+            continue
+        if not cliente: errores.append(f"Fila {i}: falta el cliente")
+        elif not carrito: errores.append(f"Fila {i}: carrito vacío")
+        else: validas.append((cliente, telefono, carrito, lleva_iva))
+    if not validas: return {"cotizaciones": 0, "errores": errores}
+
+    # Un solo BEGIN IMMEDIATE para todo el lote
+    folios.inicializar(folios.semilla_de(conn))
+    primero = folios.reservar(len(validas))
+    os.makedirs(salida, exist_ok=True)
+    tareas = [(c, primero + i, carrito, iva, salida) for i, (c, _, carrito, iva) in enumerate(validas)]
+
+    inicio_pdf = time.perf_counter()
+    procesos = procesos or os.cpu_count() or 1
+    # La plantilla (logo decodificado) se arma antes del pool: con fork los procesos
+    # la heredan; con spawn el initializer la arma una vez por proceso
+    cotizacion.plantilla()
+    with ProcessPoolExecutor(max_workers=procesos, initializer=cotizacion.plantilla) as pool:
+        generados = list(pool.map(_renderizar, tareas, chunksize=max(1, len(tareas) // (procesos * 4))))
+    tiempo_pdf = time.perf_counter() - inicio_pdf
+
+    tiempo_hoja = 0.0
+    if conn is not None:
+        hoy = datetime.now().strftime("%d/%m/%Y")
+        filas = [{
+            "Fecha": hoy,
+            "Folio": folio,
+            "Cliente": cliente,
+            "Total": precios.total_venta(carrito, lleva_iva),
+            "Telefono": telefono,
+        } for (cliente, telefono, carrito, lleva_iva), (_, folio, _, _, _) in zip(validas, tareas)]
+        inicio_hoja = time.perf_counter()
+        espejo.agregar(conn, hojas.COTIZACIONES, filas)
+        tiempo_hoja = time.perf_counter() - inicio_hoja
+
+    total = time.perf_counter() - inicio
+    return {
+        "cotizaciones": len(generados),
+        "folios": (primero, primero + len(validas) - 1),
+        "errores": errores,
+        "bytes": sum(n for _, n, _ in generados),
+        "procesos": procesos,
+        "pdf_s": tiempo_pdf,
+        "pdf_promedio_ms": 1000 * sum(t for _, _, t in generados) / len(generados),
+        "hoja_s": tiempo_hoja,
+        "total_s": total,
+        "por_segundo": len(generados) / total if total else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera cotizaciones en lote desde un CSV o JSON.")
+    parser.add_argument("entrada", help="archivo .csv o .json con una cotización por fila")
+    parser.add_argument("--salida", default="cotizaciones_lote", help="carpeta para los PDFs")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos del pool (por defecto, núcleos)")
+    parser.add_argument("--sin-hoja", action="store_true", help="no registrar las cotizaciones en Google Sheets")
+    args = parser.parse_args(argv)
+
+    conn = None if args.sin_hoja else hojas.conexion_gsheets()
+    try: resultado = generar_lote(leer_solicitudes(args.entrada), args.salida, conn=conn, procesos=args.procesos)
+    except folios.SinSecuencia as e:
+        # Con --sin-hoja solo se puede si la secuencia ya existe en la base local
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    for error in resultado["errores"]: print(f"⚠️ {error}", file=sys.stderr)
+    if not resultado["cotizaciones"]:
+        print("No se generó ninguna cotización.")
+        return 1
+    print(f"✅ {resultado['cotizaciones']} cotizaciones, folios {resultado['folios'][0]}-{resultado['folios'][1]} en {args.salida}/")
+    print(f"   PDFs: {resultado['pdf_s']:.2f} s con {resultado['procesos']} procesos "
+          f"({resultado['pdf_promedio_ms']:.1f} ms c/u, {resultado['bytes'] / 1024:.0f} KB)")
+    if conn is not None: print(f"   Hoja: {resultado['hoja_s']:.2f} s (una sola escritura)")
+    print(f"   Total: {resultado['total_s']:.2f} s, {resultado['por_segundo']:.1f} cotizaciones/s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Cola local de lo que captura el técnico: unidades instaladas y cierres de orden.
+
+Cada envío se guarda primero en la base local con una clave de idempotencia y
+el técnico sigue trabajando; un hilo lo sube a las hojas por lotes cuando hay
+conexión. Las evidencias en PDF ya viajan por el buzón de correo
+(correo.encolar), que también se guarda en disco antes de enviarse.
+"""
+import os
+import json
+import threading
+import time
+from datetime import date
+import pandas as pd
+import base_local
+import espejo
+import hojas
+import libro_diario
+try: import fcntl
+except ImportError: fcntl = None
+
+# --- CONFIGURACIÓN ---
+UNIDAD = "unidad"
+CIERRE = "cierre"
+LOTE = 200           # unidades por escritura a la hoja
+ESPERA_BASE = 5      # segundos; se duplica tras cada falla de conexión
+ESPERA_MAX = 300
+
+_aviso = threading.Event()
+_candado = threading.Lock()
+_sincronizador = None
+
+def _preparar(con):
+    con.execute("CREATE TABLE IF NOT EXISTS cola_envios (clave TEXT PRIMARY KEY, tipo TEXT NOT NULL, id_orden TEXT, "
+                "datos TEXT NOT NULL, creado REAL NOT NULL, estado TEXT NOT NULL DEFAULT 'pendiente', "
+                "intentos INTEGER NOT NULL DEFAULT 0, error TEXT, enviado REAL)")
+    con.execute("CREATE INDEX IF NOT EXISTS ix_cola_envios_estado ON cola_envios (estado, tipo, creado)")
+
+def _conectar(ruta=None):
+    con = base_local.conectar(ruta)
+    _preparar(con)
+    return con
+
+def _dia(fecha):
+    return fecha.isoformat() if isinstance(fecha, date) else str(fecha)
+
+# --- CLAVES DE IDEMPOTENCIA ---
+# La misma unidad de la misma orden (o el cierre de una orden) siempre da la
+# misma clave: un doble clic o un reintento no duplica filas en la hoja.
+def clave_unidad(id_orden, unidad):
+    return f"{UNIDAD}:{id_orden}:{str(unidad).strip().upper()}"
+
+def clave_cierre(id_orden):
+    return f"{CIERRE}:{id_orden}"
+
+# --- ENCOLAR ---
+# Un envío "retenido" ya tiene su lugar (y su clave) en la cola pero el
+# sincronizador no lo sube hasta liberarlo; si se descarta, no deja rastro.
+def encolar(tipo, clave, id_orden, datos, ruta=None, retener=False):
+    """Guarda el envío y despierta al sincronizador; False si la clave ya estaba en cola o enviada."""
+    estado = "retenido" if retener else "pendiente"
+    con = _conectar(ruta)
+    try:
+        # Un envío que falló en definitiva (p. ej. conflicto) o que quedó retenido
+        # (la app se cerró antes de liberarlo) se puede volver a intentar
+        cursor = con.execute(
+            "INSERT INTO cola_envios (clave, tipo, id_orden, datos, creado, estado) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(clave) DO UPDATE SET datos = excluded.datos, creado = excluded.creado, "
+            "estado = excluded.estado, intentos = 0, error = NULL WHERE estado IN ('fallido', 'retenido')",
+            (clave, tipo, str(id_orden), json.dumps(datos, ensure_ascii=False, default=str), time.time(), estado))
+        nuevo = cursor.rowcount == 1
+    finally: con.close()
+    if nuevo and not retener: _aviso.set()
+    return nuevo
+
+def encolar_unidad(id_orden, fila, fecha, ruta=None, retener=False):
+    """`fila` es la fila de Instalaciones; `fecha` el día que cuenta en el libro diario."""
+    return encolar(UNIDAD, clave_unidad(id_orden, fila["Unidad"]), id_orden, {"fila": fila, "fecha": _dia(fecha)}, ruta, retener)
+
+def liberar(clave, ruta=None):
+    """El envío retenido ya puede subir; False si no estaba retenido."""
+    con = _conectar(ruta)
+    try: liberado = con.execute("UPDATE cola_envios SET estado = 'pendiente' WHERE clave = ? AND estado = 'retenido'", (clave,)).rowcount == 1
+    finally: con.close()
+    if liberado: _aviso.set()
+    return liberado
+
+def descartar(clave, ruta=None):
+    """Quita un envío retenido (nunca uno pendiente o ya enviado)."""
+    con = _conectar(ruta)
+    try: return con.execute("DELETE FROM cola_envios WHERE clave = ? AND estado = 'retenido'", (clave,)).rowcount == 1
+    finally: con.close()
+
+def encolar_cierre(id_orden, cambios, esperado=None, posicion=None, ruta=None):
+    """Cierre de la orden: `cambios` y `esperado` como en hojas.actualizar_fila."""
+    return encolar(CIERRE, clave_cierre(id_orden), id_orden,
+                   {"cambios": cambios, "esperado": esperado, "posicion": posicion}, ruta)
+
+# --- CONSULTA ---
+def pendientes(tipo=None, id_orden=None, estado="pendiente", limite=None, ruta=None):
+    """Envíos en ese estado, del más antiguo al más nuevo."""
+    condiciones, parametros = ["estado = ?"], [estado]
+    if tipo is not None:
+        condiciones.append("tipo = ?")
+        parametros.append(tipo)
+    if id_orden is not None:
+        condiciones.append("id_orden = ?")
+        parametros.append(str(id_orden))
+    sql = f"SELECT clave, tipo, id_orden, datos, intentos, error FROM cola_envios WHERE {' AND '.join(condiciones)} ORDER BY creado"
+    if limite: sql += f" LIMIT {int(limite)}"
+    con = _conectar(ruta)
+    try: filas = con.execute(sql, parametros).fetchall()
+    finally: con.close()
+    return [{"clave": c, "tipo": t, "id_orden": i, "datos": json.loads(d), "intentos": n, "error": e}
+            for c, t, i, d, n, e in filas]
+
+def ordenes_cerrando(ruta=None):
+    """IDs de órdenes con el cierre en cola (ya no se ofrecen al técnico)."""
+    return {p["id_orden"] for p in pendientes(CIERRE, ruta=ruta)}
+
+def unidades_de_orden(id_orden, ruta=None):
+    """Unidades de la orden: las del espejo más las que siguen en cola sin subir.
+
+    Devuelve (DataFrame con Unidad y Fecha, cuántas están por subir).
+    """
+    en_hoja = espejo.instalaciones_de_orden(id_orden, ruta=ruta)
+    en_hoja = en_hoja[["Unidad", "Fecha"]] if not en_hoja.empty else pd.DataFrame(columns=["Unidad", "Fecha"])
+    ya_estan = {clave_unidad(id_orden, u) for u in en_hoja["Unidad"]}
+    # Una fila que ya subió pero aún no se marca como enviada no se cuenta dos veces
+    en_cola = [p["datos"]["fila"] for p in pendientes(UNIDAD, id_orden, ruta=ruta) if p["clave"] not in ya_estan]
+    if not en_cola: return en_hoja.reset_index(drop=True), 0
+    return pd.concat([en_hoja, pd.DataFrame(en_cola)[["Unidad", "Fecha"]]], ignore_index=True), len(en_cola)
+
+def conteo(ruta=None):
+    con = _conectar(ruta)
+    try: return dict(con.execute("SELECT estado, COUNT(*) FROM cola_envios GROUP BY estado").fetchall())
+    finally: con.close()
+
+def _marcar(claves, estado, error=None, ruta=None):
+    if not claves: return
+    con = _conectar(ruta)
+    try:
+        con.executemany("UPDATE cola_envios SET estado = ?, error = ?, intentos = intentos + 1, enviado = ? WHERE clave = ?",
+                        [(estado, error, time.time() if estado == "enviado" else None, c) for c in claves])
+    finally: con.close()
+
+# --- SINCRONIZACIÓN ---
+def _subir_unidades(conn, lote, ruta):
+    envios = pendientes(UNIDAD, limite=lote, ruta=ruta)
+    if not envios: return 0
+    # Lo que ya está en la hoja no se vuelve a agregar (p. ej. subió pero se cortó antes de marcarlo)
+    espejo.sincronizar(conn, hojas.INSTALACIONES, ruta=ruta)
+    en_hoja = set()
+    for id_orden in {e["id_orden"] for e in envios}:
+        unidades = espejo.instalaciones_de_orden(id_orden, ruta=ruta)
+        en_hoja.update(clave_unidad(id_orden, u) for u in unidades.get("Unidad", []))
+    nuevas = [e for e in envios if e["clave"] not in en_hoja]
+    if nuevas:
+        espejo.agregar(conn, hojas.INSTALACIONES, [e["datos"]["fila"] for e in nuevas], ruta=ruta)
+        for e in nuevas:
+            fila = e["datos"]["fila"]
+            try: libro_diario.registrar_unidad(e["datos"]["fecha"], e["id_orden"], fila["Cliente"], fila["Unidad"], ruta=ruta)
+            except Exception as error:
+                # La fila ya está en la hoja: el día queda marcado hasta reconstruir el libro
+                libro_diario.marcar_desfase([e["datos"]["fecha"]], f"Unidad {fila['Unidad']} de la orden {e['id_orden']}: {error}", ruta)
+    _marcar([e["clave"] for e in envios], "enviado", ruta=ruta)
+    return len(nuevas)
+
+def _subir_cierre(conn, envio, ruta):
+    datos, id_orden = envio["datos"], envio["id_orden"]
+    cambios = datos["cambios"]
+    try:
+        hojas.actualizar_fila(conn, "ID", id_orden, cambios, worksheet=hojas.AGENDA,
+                              esperado=datos.get("esperado"), posicion=datos.get("posicion"))
+    except hojas.Conflicto as e:
+        # Si la hoja ya tiene exactamente este cierre, fue un reintento de algo que sí llegó
+        if not hojas.coincide(e.actual or {}, cambios):
+            _marcar([envio["clave"]], "fallido", str(e), ruta)
+            return False
+    except KeyError as e:
+        _marcar([envio["clave"]], "fallido", f"La orden ya no está en la agenda ({e})", ruta)
+        return False
+    # El cierre ya está en la hoja; si el espejo o el libro no lo reciben, sus días quedan marcados
+    errores = []
+    try: espejo.actualizar(hojas.AGENDA, "ID", id_orden, cambios, ruta=ruta)
+    except Exception as e: errores.append(f"espejo: {e}")
+    try: libro_diario.cerrar_orden(id_orden, cambios.get("Cobro_Final"), cambios.get("Tipo_Pago"), cambios.get("Pago_Tecnico"), ruta=ruta)
+    except Exception as e: errores.append(f"libro: {e}")
+    if errores:
+        try: fechas = libro_diario.dias_de_orden(id_orden, ruta=ruta)
+        except Exception: fechas = []
+        libro_diario.marcar_desfase(fechas or [date.today()], f"Cierre de la orden {id_orden} ({'; '.join(errores)})", ruta)
+    _marcar([envio["clave"]], "enviado", ruta=ruta)
+    return True
+
+def sincronizar(conn, lote=LOTE, ruta=None):
+    """Sube lo pendiente: primero las unidades (en lotes) y luego los cierres.
+
+    Devuelve cuántas filas y cierres llegaron a la hoja. Una falla de conexión
+    se propaga y lo pendiente se queda en cola para el siguiente intento.
+    """
+    resultado = {"unidades": 0, "cierres": 0}
+    while pendientes(UNIDAD, limite=1, ruta=ruta):
+        resultado["unidades"] += _subir_unidades(conn, lote, ruta)
+    for envio in pendientes(CIERRE, ruta=ruta):
+        resultado["cierres"] += _subir_cierre(conn, envio, ruta)
+    return resultado
+
+# --- SINCRONIZADOR (HILO) ---
+class Sincronizador(threading.Thread):
+    """Vacía la cola cuando se encola algo y, si falla la conexión, reintenta con espera exponencial."""
+    def __init__(self, conn, ruta=None):
+        super().__init__(name="sincronizador", daemon=True)
+        self.conn = conn
+        self.ruta = ruta
+        self._detener = threading.Event()
+        self.fallas = 0
+        self.ultimo_error = None
+        self.ultima_sincronizacion = None
+
+    def run(self):
+        while not self._detener.is_set():
+            _aviso.clear()
+            espera = None
+            try:
+                sincronizar(self.conn, ruta=self.ruta)
+                self.fallas = 0
+                self.ultima_sincronizacion = time.time()
+            except Exception as e:
+                self.fallas += 1
+                self.ultimo_error = str(e)
+                espera = min(ESPERA_BASE * 2 ** (self.fallas - 1), ESPERA_MAX)
+            _aviso.wait(espera if espera is not None else ESPERA_MAX)
+
+    def detener(self):
+        self._detener.set()
+        _aviso.set()
+
+    def estado(self):
+        cuentas = conteo(self.ruta)
+        return {
+            "pendientes": cuentas.get("pendiente", 0),
+            "fallidos": cuentas.get("fallido", 0),
+            "fallas": self.fallas,
+            "ultimo_error": self.ultimo_error,
+            "ultima_sincronizacion": self.ultima_sincronizacion,
+        }
+
+def _tomar_cola(ruta):
+    """Solo un proceso por base local sube la cola; los demás solo encolan."""
+    if fcntl is None: return True
+    archivo = open(os.path.abspath(ruta or base_local.RUTA_DB) + ".envios.lock", "w")
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return False
+    _tomar_cola.archivo = archivo  # mantener el candado mientras viva el proceso
+    return True
+
+def despertar():
+    _aviso.set()
+
+def iniciar(conn, ruta=None):
+    """Arranca (una vez por proceso) el hilo que sube la cola."""
+    global _sincronizador
+    with _candado:
+        if _sincronizador is not None and _sincronizador.is_alive(): return _sincronizador
+        _sincronizador = Sincronizador(conn, ruta)
+        if _tomar_cola(ruta): _sincronizador.start()
+        return _sincronizador
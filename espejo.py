@@ -0,0 +1,335 @@
+import time
+import threading
+import pandas as pd
+import base_local
+import hojas
+
+# --- ESPEJO LOCAL DE LAS HOJAS ---
+# Copia en SQLite de Agenda_Servicios, Instalaciones y Cotizaciones. Las vistas
+# consultan aquí con índices en lugar de filtrar la hoja completa en memoria.
+# Columnas internas: _fila (posición en la hoja), _hash (huella de la fila),
+# _fecha (fecha ISO para rangos), _buscar (columna de BUSCAR_POR en mayúsculas,
+# para buscar por prefijo sin distinguir mayúsculas) y _local (escrita por la
+# app, aún sin confirmar).
+TABLAS = {
+    hojas.COTIZACIONES: "cotizaciones",
+    hojas.AGENDA: "agenda_servicios",
+    hojas.INSTALACIONES: "instalaciones",
+}
+INDICES = {
+    hojas.COTIZACIONES: ["Folio", "_fecha"],
+    hojas.AGENDA: ["ID", "Estatus", "_fecha"],
+    hojas.INSTALACIONES: ["ID_Servicio", "_fecha", "_buscar"],
+}
+BUSCAR_POR = {hojas.INSTALACIONES: "Cliente"}
+# Columna de fecha de cada hoja y su formato
+FECHAS = {
+    hojas.COTIZACIONES: ("Fecha", "%d/%m/%Y"),
+    hojas.AGENDA: ("Fecha_Prog", "%Y-%m-%d"),
+    hojas.INSTALACIONES: ("Fecha", "%d/%m/%Y"),
+}
+# Hojas a las que solo se agregan filas: se sincronizan leyendo solo las nuevas
+SOLO_AGREGAR = {hojas.COTIZACIONES, hojas.INSTALACIONES}
+# Columnas numéricas de cada hoja; el resto se guarda como texto. La lectura
+# completa (conn.read) trae números de pandas y la incremental (gspread) el texto
+# de la hoja: las dos se llevan a la misma forma antes de sacar huellas y guardar.
+NUMERICAS = {
+    hojas.COTIZACIONES: {"Folio", "Total"},
+    hojas.AGENDA: {"Cobro_Final", "Pago_Tecnico"},
+    hojas.INSTALACIONES: set(),
+}
+RESINCRONIZAR_CADA = 30 * 60
+INTERNAS = ["_hash", "_fecha", "_buscar", "_local"]
+
+def _q(nombre):
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+def _nativo(valor):
+    if valor is None: return None
+    if hasattr(valor, "item"): valor = valor.item()
+    try:
+        if pd.isna(valor): return None
+    except (TypeError, ValueError): pass
+    if isinstance(valor, (int, float, str, bytes)): return valor
+    return str(valor)
+
+def _numero(valor):
+    """150, "150", 150.0 y "$150.00" -> 150; None si no es un número."""
+    if isinstance(valor, str): valor = valor.replace("$", "").replace(",", "").strip()
+    try: valor = float(valor)
+    except (TypeError, ValueError): return None
+    if valor != valor or valor in (float("inf"), float("-inf")): return None
+    return int(valor) if valor.is_integer() else valor
+
+def _canonico(hoja, columna, valor):
+    """Forma única de un valor del espejo, venga de pandas, de gspread o de la app."""
+    valor = _nativo(valor)
+    if valor is None or valor == "": return None
+    if columna in NUMERICAS.get(hoja, ()):
+        numero = _numero(valor)
+        return valor if numero is None else numero   # texto que no es número se conserva
+    if isinstance(valor, bool): return "TRUE" if valor else "FALSE"   # como lo muestra la hoja
+    if isinstance(valor, float) and valor.is_integer(): return str(int(valor))
+    return str(valor)
+
+def _canonica(df, hoja):
+    canonica = df.astype(object)
+    for i, columna in enumerate(df.columns):
+        valores = df.iloc[:, i].tolist()
+        # Enteros en columnas numéricas y texto en las demás (casi todo) ya están en su forma
+        if columna in NUMERICAS.get(hoja, ()): valores = [v if type(v) is int else _canonico(hoja, columna, v) for v in valores]
+        else: valores = [(v or None) if type(v) is str else _canonico(hoja, columna, v) for v in valores]
+        canonica.isetitem(i, pd.Series(valores, index=df.index, dtype=object))
+    return canonica
+
+# Tablas ya preparadas en este proceso, con sus columnas conocidas
+_preparadas = {}
+
+def _preparar(con, hoja, columnas=()):
+    tabla = TABLAS[hoja]
+    clave = (base_local.ruta_de(con), tabla)
+    conocidas = _preparadas.get(clave)
+    if conocidas is not None and all(c in conocidas for c in columnas): return tabla
+
+    con.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (_fila INTEGER PRIMARY KEY, _hash INTEGER, _fecha TEXT, _buscar TEXT, _local INTEGER DEFAULT 0)")
+    con.execute("CREATE TABLE IF NOT EXISTS sincronizaciones (tabla TEXT PRIMARY KEY, completa REAL)")
+    existentes = {fila[1] for fila in con.execute(f"PRAGMA table_info({tabla})")}
+    if "_buscar" not in existentes:
+        # Espejo de una versión anterior: se llena con lo que ya tiene
+        con.execute(f"ALTER TABLE {tabla} ADD COLUMN _buscar TEXT")
+        existentes.add("_buscar")
+        if hoja in BUSCAR_POR and BUSCAR_POR[hoja] in existentes:
+            con.executemany(f"UPDATE {tabla} SET _buscar = ? WHERE _fila = ?",
+                            [(_mayusculas(v), f) for f, v in con.execute(f"SELECT _fila, {_q(BUSCAR_POR[hoja])} FROM {tabla}")])
+    for columna in list(hojas.ENCABEZADOS[hoja]) + [c for c in columnas if c not in hojas.ENCABEZADOS[hoja]]:
+        if columna not in existentes:
+            con.execute(f"ALTER TABLE {tabla} ADD COLUMN {_q(columna)}")
+            existentes.add(columna)
+    for columna in INDICES[hoja]:
+        con.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + tabla + '_' + columna)} ON {tabla} ({_q(columna)})")
+    _preparadas[clave] = existentes
+    return tabla
+
+def limpiar(df):
+    df = df.loc[:, [c for c in df.columns if not str(c).startswith("Unnamed")]]
+    return df.dropna(how="all")
+
+def _huellas(df):
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy().view("int64")
+
+def _fechas_iso(df, hoja):
+    columna, formato = FECHAS[hoja]
+    if columna not in df.columns: return [None] * len(df)
+    fechas = pd.to_datetime(df[columna].astype(str).str[:10], format=formato, errors="coerce")
+    return [None if pd.isna(f) else f for f in fechas.dt.strftime("%Y-%m-%d")]
+
+def _mayusculas(valor):
+    return None if valor is None else str(valor).upper()
+
+def _buscables(df, hoja):
+    columna = BUSCAR_POR.get(hoja)
+    if columna not in df.columns: return [None] * len(df)
+    return [_mayusculas(v) for v in df[columna]]
+
+def _insertar(con, tabla, hoja, df, local=0):
+    if df.empty: return 0
+    columnas = list(df.columns)
+    huellas, fechas, buscables = _huellas(df), _fechas_iso(df, hoja), _buscables(df, hoja)
+    sql = (f"INSERT OR REPLACE INTO {tabla} (_fila, _hash, _fecha, _buscar, _local, {', '.join(_q(c) for c in columnas)}) "
+           f"VALUES ({', '.join(['?'] * (len(columnas) + 5))})")
+    registros = [
+        (int(fila), int(huella), fecha, buscable, local, *[_nativo(v) for v in valores])
+        for fila, huella, fecha, buscable, valores in zip(df.index, huellas, fechas, buscables, df.itertuples(index=False, name=None))
+    ]
+    con.executemany(sql, registros)
+    return len(registros)
+
+# --- SINCRONIZACIÓN ---
+def _sincronizar_completo(con, tabla, hoja, df):
+    """Compara huellas fila por fila y solo escribe las que cambiaron."""
+    previas = dict(con.execute(f"SELECT _fila, _hash FROM {tabla} WHERE _local = 0"))
+    huellas = _huellas(df)
+    cambiadas = [i for i, (fila, huella) in enumerate(zip(df.index, huellas)) if previas.get(int(fila)) != int(huella)]
+    vigentes = {int(f) for f in df.index}
+    borradas = [(f,) for f in previas if f not in vigentes]
+    con.execute(f"DELETE FROM {tabla} WHERE _local = 1")
+    if borradas: con.executemany(f"DELETE FROM {tabla} WHERE _fila = ?", borradas)
+    con.execute("INSERT OR REPLACE INTO sincronizaciones (tabla, completa) VALUES (?, ?)", (tabla, time.time()))
+    return _insertar(con, tabla, hoja, df.iloc[cambiadas]) + len(borradas)
+
+def sincronizar(conn, hoja, completo=False, ruta=None):
+    """Trae a la base local los cambios de la hoja; devuelve cuántas filas cambiaron.
+
+    Las hojas de solo agregar leen únicamente las filas posteriores a la última
+    sincronizada; la agenda (que se edita) se compara completa por huellas.
+    """
+    con = base_local.conectar(ruta)
+    try:
+        tabla = _preparar(con, hoja)
+        ultima = con.execute("SELECT completa FROM sincronizaciones WHERE tabla = ?", (tabla,)).fetchone()
+        vencida = ultima is None or time.time() - ultima[0] > RESINCRONIZAR_CADA
+
+        if hoja in SOLO_AGREGAR and not completo and not vencida:
+            desde = con.execute(f"SELECT COALESCE(MAX(_fila) + 1, 0) FROM {tabla} WHERE _local = 0").fetchone()[0]
+            df = _canonica(limpiar(hojas.leer_desde(conn, hoja, desde)), hoja)
+            _preparar(con, hoja, df.columns)
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                # Las filas escritas por la app se reemplazan por las confirmadas en la hoja
+                con.execute(f"DELETE FROM {tabla} WHERE _fila >= ?", (desde,))
+                cambios = _insertar(con, tabla, hoja, df)
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            return cambios
+
+        df = _canonica(limpiar(conn.read(worksheet=hoja, ttl=0)), hoja)
+        _preparar(con, hoja, df.columns)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            cambios = _sincronizar_completo(con, tabla, hoja, df)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return cambios
+    finally: con.close()
+
+# Última sincronización correcta de cada hoja en este proceso: (ruta, hoja) -> momento
+_recientes = {}
+_candado_recientes = threading.Lock()
+
+def sincronizar_reciente(conn, hoja, cada, ruta=None):
+    """Como sincronizar, pero a lo más una vez cada `cada` segundos por hoja y proceso.
+
+    Lo que escribe la app ya entra al espejo al escribirse; solo los cambios de
+    otros usuarios tardan hasta `cada` segundos en verse. Devuelve None si no
+    tocaba sincronizar. Una falla no cuenta: el siguiente rerun lo vuelve a intentar.
+    """
+    clave = (ruta or base_local.RUTA_DB, hoja)
+    with _candado_recientes:
+        if time.monotonic() - _recientes.get(clave, float("-inf")) < cada: return None
+    cambios = sincronizar(conn, hoja, ruta=ruta)
+    with _candado_recientes:
+        _recientes[clave] = time.monotonic()
+    return cambios
+
+# --- ESCRITURA (WRITE-THROUGH) ---
+def registrar(hoja, filas, ruta=None):
+    """Agrega a la base local filas que la app acaba de escribir en la hoja."""
+    df = pd.DataFrame([dict(f) for f in filas])
+    if df.empty: return 0
+    df = _canonica(df, hoja)
+    con = base_local.conectar(ruta)
+    try:
+        tabla = _preparar(con, hoja, df.columns)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            siguiente = con.execute(f"SELECT COALESCE(MAX(_fila) + 1, 0) FROM {tabla}").fetchone()[0]
+            df.index = range(siguiente, siguiente + len(df))
+            _insertar(con, tabla, hoja, df, local=1)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return len(df)
+    finally: con.close()
+
+def agregar(conn, hoja, filas, ruta=None):
+    """Escribe en la hoja y en el espejo local."""
+    filas = [dict(f) for f in filas]
+    n = hojas.agregar_filas(conn, filas, worksheet=hoja)
+    try: registrar(hoja, filas, ruta=ruta)
+    except Exception: pass  # el espejo se repone en la siguiente sincronización
+    return n
+
+def actualizar(hoja, columna, valor, cambios, ruta=None):
+    """Aplica en la base local los cambios hechos a las filas donde `columna` == `valor`."""
+    if not cambios: return 0
+    con = base_local.conectar(ruta)
+    try:
+        tabla = _preparar(con, hoja, cambios.keys())
+        # _hash en NULL: la siguiente sincronización completa vuelve a comparar la fila
+        valores = {c: _canonico(hoja, c, v) for c, v in cambios.items()}
+        if BUSCAR_POR.get(hoja) in valores: valores["_buscar"] = _mayusculas(valores[BUSCAR_POR[hoja]])
+        asignaciones = ", ".join([f"{_q(c)} = ?" for c in valores] + ["_hash = NULL"])
+        cursor = con.execute(f"UPDATE {tabla} SET {asignaciones} WHERE {_q(columna)} = ?",
+                             list(valores.values()) + [_canonico(hoja, columna, valor)])
+        return cursor.rowcount
+    finally: con.close()
+
+# --- CONSULTAS ---
+def consultar(hoja, donde="", parametros=(), orden="_fila", limite=None, desplazamiento=0, ruta=None):
+    """Filas del espejo como DataFrame indexado por posición en la hoja."""
+    con = base_local.conectar(ruta)
+    try:
+        tabla = _preparar(con, hoja)
+        sql = f"SELECT * FROM {tabla}"
+        if donde: sql += f" WHERE {donde}"
+        if orden: sql += f" ORDER BY {orden}"
+        if limite is not None: sql += f" LIMIT {int(limite)} OFFSET {int(desplazamiento)}"
+        df = pd.read_sql_query(sql, con, params=list(parametros), index_col="_fila")
+    finally: con.close()
+    df.index.name = None
+    return df.drop(columns=INTERNAS)
+
+def contar(hoja, donde="", parametros=(), ruta=None):
+    con = base_local.conectar(ruta)
+    try:
+        tabla = _preparar(con, hoja)
+        return con.execute(f"SELECT COUNT(*) FROM {tabla}" + (f" WHERE {donde}" if donde else ""), list(parametros)).fetchone()[0]
+    finally: con.close()
+
+def pagina(hoja, donde="", parametros=(), tamano=50, antes_de=None, ruta=None):
+    """Página de filas, de la más reciente a la más antigua, paginando por _fila.
+
+    `antes_de` es el cursor que devolvió la página anterior: el costo no crece con
+    el número de página como con OFFSET. Devuelve (DataFrame, cursor siguiente o None).
+    """
+    condiciones, parametros = ([f"({donde})"] if donde else []), list(parametros)
+    if antes_de is not None:
+        condiciones.append("_fila < ?")
+        parametros.append(int(antes_de))
+    df = consultar(hoja, " AND ".join(condiciones), parametros, orden="_fila DESC", limite=tamano + 1, ruta=ruta)
+    if len(df) <= tamano: return df, None
+    df = df.iloc[:tamano]
+    return df, int(df.index[-1])
+
+def filtro_instalaciones(desde=None, hasta=None, cliente=None, id_servicio=None):
+    """(donde, parametros) para filtrar instalaciones por rango de fechas, cliente u orden."""
+    condiciones, parametros = [], []
+    if desde is not None:
+        condiciones.append("_fecha >= ?")
+        parametros.append(desde.strftime("%Y-%m-%d"))
+    if hasta is not None:
+        condiciones.append("_fecha <= ?")
+        parametros.append(hasta.strftime("%Y-%m-%d"))
+    if cliente:
+        # Rango en lugar de LIKE para que use el índice: nombres que empiezan con
+        # `cliente`, sin distinguir mayúsculas (sobre la columna _buscar)
+        cliente = _mayusculas(cliente)
+        condiciones.append("_buscar >= ? AND _buscar < ?")
+        parametros.extend([cliente, cliente + "\U0010ffff"])
+    if id_servicio:
+        condiciones.append('"ID_Servicio" = ?')
+        parametros.append(_canonico(hojas.INSTALACIONES, "ID_Servicio", id_servicio))
+    return " AND ".join(condiciones), parametros
+
+def ordenes(estatus=None, ids=None, ruta=None):
+    condiciones, parametros = [], []
+    if estatus is not None:
+        condiciones.append('"Estatus" = ?')
+        parametros.append(estatus)
+    if ids is not None:
+        ids = [_canonico(hojas.AGENDA, "ID", i) for i in ids]
+        if not ids: return consultar(hojas.AGENDA, "0", ruta=ruta)
+        condiciones.append(f'"ID" IN ({", ".join(["?"] * len(ids))})')
+        parametros.extend(ids)
+    return consultar(hojas.AGENDA, " AND ".join(condiciones), parametros, ruta=ruta)
+
+def instalaciones_de_orden(id_servicio, ruta=None):
+    return consultar(hojas.INSTALACIONES, '"ID_Servicio" = ?', (_canonico(hojas.INSTALACIONES, "ID_Servicio", id_servicio),), ruta=ruta)
+
+def instalaciones_del_dia(fecha, ruta=None):
+    return consultar(hojas.INSTALACIONES, "_fecha = ?", (fecha.strftime("%Y-%m-%d"),), ruta=ruta)
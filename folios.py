@@ -0,0 +1,95 @@
+import pandas as pd
+import archivo
+import base_local
+
+# --- SECUENCIA DE FOLIOS ---
+# Un contador por secuencia en la base local: asignar un folio es O(1) y
+# atómico entre sesiones (BEGIN IMMEDIATE bloquea a los demás escritores).
+SECUENCIA = "cotizaciones"
+FOLIO_INICIAL = 99
+
+class SinSecuencia(Exception):
+    """La secuencia aún no se crea a partir de la hoja: no se puede sugerir ni asignar un folio."""
+
+def _preparar(con):
+    con.execute("CREATE TABLE IF NOT EXISTS secuencias (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+
+def _valor(con, nombre):
+    fila = con.execute("SELECT valor FROM secuencias WHERE nombre = ?", (nombre,)).fetchone()
+    return fila[0] if fila else None
+
+def inicializar(semilla=FOLIO_INICIAL, nombre=SECUENCIA, ruta=None):
+    """Crea la secuencia si no existe; `semilla` es el último folio usado (o una función que lo calcula).
+
+    Si la semilla falla no se crea nada: el siguiente intento vuelve a leerla.
+    """
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        actual = _valor(con, nombre)
+        if actual is not None: return actual
+        valor = int(semilla() if callable(semilla) else semilla)
+        con.execute("INSERT OR IGNORE INTO secuencias (nombre, valor) VALUES (?, ?)", (nombre, valor))
+        return _valor(con, nombre)
+    finally: con.close()
+
+def ultimo_folio_hoja(conn):
+    """Folio más alto registrado en la hoja de cotizaciones o en su archivo (semilla de la secuencia)."""
+    ultimo_folio = max(FOLIO_INICIAL, archivo.ultimo_folio())
+    df_db = conn.read(ttl=0)
+    if not df_db.empty and "Folio" in df_db.columns:
+        folios_existentes = pd.to_numeric(df_db["Folio"], errors='coerce').fillna(0)
+        if not folios_existentes.empty: ultimo_folio = max(ultimo_folio, int(folios_existentes.max()))
+    return ultimo_folio
+
+def semilla_de(conn):
+    """Semilla para `inicializar`; sin conexión no hay de dónde saber el último folio usado."""
+    def semilla():
+        if conn is None: raise SinSecuencia("Sin conexión con la hoja de cotizaciones: no se puede iniciar la secuencia de folios.")
+        return ultimo_folio_hoja(conn)
+    return semilla
+
+def _actual(con, nombre):
+    actual = _valor(con, nombre)
+    if actual is None: raise SinSecuencia(f"La secuencia de folios '{nombre}' no está inicializada.")
+    return actual
+
+def consultar_siguiente(nombre=SECUENCIA, ruta=None):
+    """Folio sugerido para la siguiente cotización (no lo reserva)."""
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        return _actual(con, nombre) + 1
+    finally: con.close()
+
+def reservar(cantidad=1, propuesto=None, nombre=SECUENCIA, ruta=None):
+    """Reserva `cantidad` folios consecutivos y devuelve el primero.
+
+    Si `propuesto` sigue libre se respeta; si otra sesión ya lo tomó se
+    entrega el siguiente disponible.
+    """
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            inicio = max(_actual(con, nombre) + 1, int(propuesto or 0))
+            con.execute("UPDATE secuencias SET valor = ? WHERE nombre = ?", (inicio + cantidad - 1, nombre))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return inicio
+    finally: con.close()
+
+def asignar(propuesto=None, nombre=SECUENCIA, ruta=None):
+    return reservar(1, propuesto=propuesto, nombre=nombre, ruta=ruta)
+
+def avanzar_a(folio, nombre=SECUENCIA, ruta=None):
+    """Registra un folio capturado a mano para que la secuencia no lo repita."""
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        cursor = con.execute("UPDATE secuencias SET valor = MAX(valor, ?) WHERE nombre = ?", (int(folio), nombre))
+        if cursor.rowcount == 0: raise SinSecuencia(f"La secuencia de folios '{nombre}' no está inicializada.")
+    finally: con.close()
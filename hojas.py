@@ -0,0 +1,512 @@
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+import pandas as pd
+import metricas
+
+# --- HOJAS DEL LIBRO ---
+# La hoja de cotizaciones es la primera pestaña del libro (worksheet=None)
+COTIZACIONES = None
+AGENDA = "Agenda_Servicios"
+INSTALACIONES = "Instalaciones"
+
+ENCABEZADOS = {
+    COTIZACIONES: ["Fecha", "Folio", "Cliente", "Total", "Telefono"],
+    AGENDA: ["ID", "Fecha_Prog", "Hora_Prog", "Cliente", "Telefono", "Ubicacion", "Vehiculos_Desc", "Notas", "Estatus", "Cobro_Final", "Tipo_Pago", "Pago_Tecnico"],
+    INSTALACIONES: ["ID_Servicio", "Fecha", "Cliente", "Unidad", "Evidencia"],
+}
+
+# Fila 1 de cada hoja remota; se consulta una sola vez por proceso
+_encabezados_remotos = {}
+_candado = threading.Lock()
+
+# --- UTILIDADES ---
+def conexion_gsheets():
+    """Conexión de secrets.toml, también fuera de `streamlit run` (scripts de consola)."""
+    import streamlit as st
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+def hoja_vacia(worksheet=None):
+    return pd.DataFrame(columns=ENCABEZADOS.get(worksheet, []))
+
+def _valor_celda(valor):
+    if valor is None: return ""
+    if hasattr(valor, "item"): valor = valor.item()  # numpy -> python
+    try:
+        if pd.isna(valor): return ""
+    except (TypeError, ValueError): pass
+    return valor
+
+def _hoja_remota(conn, worksheet):
+    """Hoja de gspread detrás de la conexión (solo cuentas de servicio)."""
+    seleccionar = getattr(getattr(conn, "client", None), "_select_worksheet", None)
+    if seleccionar is None: return None
+    return seleccionar(worksheet=worksheet)
+
+def _encabezados(hoja, worksheet, filas):
+    with _candado:
+        encabezados = _encabezados_remotos.get(worksheet)
+    if encabezados is None:
+        encabezados = hoja.row_values(1)
+        if not encabezados:
+            encabezados = list(ENCABEZADOS.get(worksheet) or filas[0].keys())
+            hoja.update(range_name="A1", values=[encabezados])
+
+    faltantes = [c for f in filas for c in f if c not in encabezados]
+    faltantes = list(dict.fromkeys(faltantes))
+    if faltantes:
+        total = len(encabezados) + len(faltantes)
+        if hoja.col_count < total: hoja.add_cols(total - hoja.col_count)
+        for i, columna in enumerate(faltantes, start=len(encabezados) + 1):
+            hoja.update_cell(1, i, columna)
+        encabezados = encabezados + faltantes
+
+    with _candado:
+        _encabezados_remotos[worksheet] = encabezados
+    return encabezados
+
+# --- ESCRITURA POR FILAS ---
+def agregar_filas(conn, filas, worksheet=None):
+    """Agrega filas al final de la hoja enviando solo las filas nuevas."""
+    filas = [dict(f) for f in filas]
+    if not filas: return 0
+
+    # Respaldo local (pruebas / desarrollo)
+    if hasattr(conn, "agregar_filas"):
+        return conn.agregar_filas(worksheet=worksheet, filas=filas)
+
+    hoja = _hoja_remota(conn, worksheet)
+    if hoja is None:
+        # Conexiones sin gspread: no queda más que reescribir la hoja
+        try: df = conn.read(worksheet=worksheet, ttl=0)
+        except Exception: df = hoja_vacia(worksheet)
+        nuevo = pd.DataFrame(filas)
+        conn.update(worksheet=worksheet, data=pd.concat([df, nuevo], ignore_index=True) if not df.empty else nuevo)
+        return len(filas)
+
+    encabezados = _encabezados(hoja, worksheet, filas)
+    valores = [[_valor_celda(f.get(c)) for c in encabezados] for f in filas]
+    hoja.append_rows(valores, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS")
+    return len(filas)
+
+def agregar_fila(conn, fila, worksheet=None):
+    return agregar_filas(conn, [fila], worksheet=worksheet)
+
+def _tramos(posiciones):
+    """Posiciones agrupadas en tramos contiguos [(inicio, fin)], de abajo hacia arriba."""
+    tramos = []
+    for p in sorted(set(int(p) for p in posiciones)):
+        if tramos and tramos[-1][1] == p - 1: tramos[-1][1] = p
+        else: tramos.append([p, p])
+    return [tuple(t) for t in reversed(tramos)]
+
+def _revisar_posiciones(filas, esperadas):
+    """`filas` es {posición: fila vigente}; Conflicto si alguna ya no es la esperada."""
+    for posicion, esperado in esperadas.items():
+        actual = filas.get(posicion)
+        if actual is None or not coincide(actual, esperado):
+            raise Conflicto(f"La fila {posicion + 2} ya no es la que se leyó ({esperado}).", actual)
+
+def borrar_filas(conn, posiciones, worksheet=None, esperadas=None):
+    """Quita filas de datos por posición (0 = primera fila bajo los encabezados).
+
+    Con gspread se borran tramos contiguos de abajo hacia arriba, así las filas
+    que otros agreguen al final mientras tanto no se pierden. `esperadas`
+    ({posición: {columna: valor}}, p. ej. las claves) se revisa contra la hoja
+    justo antes de borrar cada tramo: si otra fila ocupa ya esa posición se
+    lanza Conflicto y ese tramo no se borra. Conflicto.borradas trae las
+    posiciones que sí se alcanzaron a borrar.
+    """
+    posiciones = list(posiciones)
+    if not posiciones: return 0
+    esperadas = {int(p): e for p, e in (esperadas or {}).items()}
+
+    # Respaldo local (pruebas / desarrollo)
+    if hasattr(conn, "borrar_filas"):
+        return conn.borrar_filas(worksheet=worksheet, posiciones=posiciones, esperadas=esperadas)
+
+    hoja = _hoja_remota(conn, worksheet)
+    if hoja is None:
+        df = conn.read(worksheet=worksheet, ttl=0)
+        _revisar_posiciones({int(p): df.iloc[p].to_dict() for p in esperadas if p < len(df)}, esperadas)
+        conn.update(worksheet=worksheet, data=df.drop(index=df.index[posiciones]).reset_index(drop=True))
+        return len(posiciones)
+
+    encabezados = _encabezados(hoja, worksheet, []) if esperadas else None
+    borradas = []
+    for inicio, fin in _tramos(posiciones):
+        try:
+            revisar = {p: e for p, e in esperadas.items() if inicio <= p <= fin}
+            if revisar:
+                valores = hoja.get_values(f"A{inicio + 2}:{_letra_columna(len(encabezados))}{fin + 2}")
+                filas = {inicio + i: dict(zip(encabezados, fila + [""] * (len(encabezados) - len(fila))))
+                         for i, fila in enumerate(valores)}
+                _revisar_posiciones(filas, revisar)
+            hoja.delete_rows(inicio + 2, fin + 2)
+        except Exception as e:
+            e.borradas = borradas
+            raise
+        borradas.extend(range(inicio, fin + 1))
+    return len(set(posiciones))
+
+def _letra_columna(n):
+    letras = ""
+    while n:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+# --- ACTUALIZACIÓN POR CLAVE ---
+REINTENTOS = 3
+ESPERA_REINTENTO = 0.5   # segundos; se duplica en cada intento
+
+class Conflicto(Exception):
+    """La fila ya no es la que se leyó; `actual` trae sus valores vigentes (o None)."""
+    def __init__(self, mensaje, actual=None):
+        super().__init__(mensaje)
+        self.actual = actual
+
+def _igual(a, b):
+    a, b = _valor_celda(a), _valor_celda(b)
+    if str(a).strip() == str(b).strip(): return True
+    try: return float(str(a).replace("$", "").replace(",", "")) == float(str(b).replace("$", "").replace(",", ""))
+    except ValueError: return False
+
+def coincide(actual, esperado):
+    """True si la fila `actual` tiene los valores de `esperado` (texto de la hoja o números)."""
+    return all(_igual(actual.get(c), v) for c, v in (esperado or {}).items())
+
+def _revisar(actual, esperado):
+    """Lanza Conflicto si alguna columna de `esperado` ya no tiene ese valor."""
+    distintas = [c for c, v in (esperado or {}).items() if not _igual(actual.get(c), v)]
+    if distintas: raise Conflicto(f"La fila cambió desde que se leyó ({', '.join(distintas)}).", actual)
+
+def _reintentable(error):
+    """Cuota excedida o falla temporal de la API de Sheets."""
+    codigo = getattr(getattr(error, "response", None), "status_code", None)
+    return codigo in (429, 500, 502, 503)
+
+def actualizar_fila(conn, clave, valor, cambios, worksheet=None, esperado=None, posicion=None):
+    """Escribe solo las celdas `cambios` de la fila donde `clave` == `valor`.
+
+    `esperado` ({columna: valor}) se compara con la fila vigente justo antes de
+    escribir; si otro usuario ya la cambió se lanza Conflicto y no se escribe
+    nada. `posicion` (la del espejo) evita buscar la fila; si la fila se movió
+    se vuelve a ubicar leyendo solo la columna clave. Devuelve la posición.
+    """
+    cambios = dict(cambios)
+    if not cambios: return posicion
+
+    # Respaldo local (pruebas / desarrollo)
+    if hasattr(conn, "actualizar_fila"):
+        return conn.actualizar_fila(worksheet=worksheet, clave=clave, valor=valor, cambios=cambios, esperado=esperado, posicion=posicion)
+
+    hoja = _hoja_remota(conn, worksheet)
+    if hoja is None:
+        # Conexiones sin gspread: leer, revisar y reescribir la hoja
+        df = conn.read(worksheet=worksheet, ttl=0)
+        filas = df.index[df[clave].astype(str) == str(valor)]
+        if not len(filas): raise KeyError(f"No existe {clave} = {valor}")
+        _revisar(df.loc[filas[0]].to_dict(), esperado)
+        for columna, nuevo in cambios.items(): df.loc[filas[0], columna] = nuevo
+        conn.update(worksheet=worksheet, data=df)
+        return int(df.index.get_loc(filas[0]))
+
+    encabezados = _encabezados(hoja, worksheet, [cambios])
+    columna_clave = encabezados.index(clave) + 1
+    for intento in range(REINTENTOS):
+        try:
+            if posicion is None:
+                claves = hoja.col_values(columna_clave)[1:]
+                try: posicion = [str(c) for c in claves].index(str(valor))
+                except ValueError: raise KeyError(f"No existe {clave} = {valor}")
+            fila = hoja.row_values(posicion + 2)
+            actual = dict(zip(encabezados, fila + [""] * (len(encabezados) - len(fila))))
+            if str(actual.get(clave)) != str(valor):
+                # Se agregaron o borraron filas arriba: volver a ubicarla
+                posicion = None
+                continue
+            _revisar(actual, esperado)
+            hoja.batch_update([
+                {"range": f"{_letra_columna(encabezados.index(c) + 1)}{posicion + 2}", "values": [[_valor_celda(v)]]}
+                for c, v in cambios.items()
+            ], value_input_option="USER_ENTERED")
+            return posicion
+        except Exception as e:
+            if not _reintentable(e) or intento == REINTENTOS - 1: raise
+            time.sleep(ESPERA_REINTENTO * 2 ** intento)
+    raise Conflicto(f"No se pudo ubicar {clave} = {valor}: la hoja cambió durante la escritura.")
+
+# --- LECTURA INCREMENTAL ---
+
+def leer_desde(conn, worksheet=None, desde=0):
+    """Filas de datos a partir de la posición `desde` (0 = primera fila bajo los encabezados).
+
+    El índice del DataFrame es la posición de cada fila en la hoja.
+    """
+    if hasattr(conn, "leer_desde"):
+        return conn.leer_desde(worksheet=worksheet, desde=desde)
+
+    hoja = _hoja_remota(conn, worksheet)
+    if hoja is None:
+        return conn.read(worksheet=worksheet, ttl=0).iloc[desde:]
+
+    with _candado:
+        encabezados = _encabezados_remotos.get(worksheet)
+    if encabezados is None:
+        encabezados = hoja.row_values(1)
+        with _candado:
+            _encabezados_remotos[worksheet] = encabezados
+    if not encabezados: return hoja_vacia(worksheet)
+
+    n = len(encabezados)
+    valores = hoja.get_values(f"A{desde + 2}:{_letra_columna(n)}")
+    valores = [(fila + [""] * n)[:n] for fila in valores]
+    df = pd.DataFrame(valores, columns=encabezados, index=range(desde, desde + len(valores)))
+    return df.replace("", None)
+
+# --- CACHÉ DE LECTURAS ---
+class ConexionCacheada:
+    """Envuelve la conexión y reutiliza la última lectura de cada hoja.
+
+    Una hoja solo se vuelve a descargar cuando esta app escribe en ella o cuando
+    vence `ttl` (para ver cambios hechos por otros usuarios). El `ttl` que pasan
+    las vistas a `read` se ignora: la política la decide esta capa.
+    """
+    def __init__(self, conn, ttl=None):
+        self._conn = conn
+        self.ttl = ttl
+        self._lecturas = {}   # worksheet -> (momento, desde, DataFrame)
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.descargas = 0
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def _vigente(self, worksheet, desde):
+        with self._candado:
+            entrada = self._lecturas.get(worksheet)
+            if entrada is None: return None
+            momento, inicio, df = entrada
+            if self.ttl is not None and time.monotonic() - momento > self.ttl:
+                del self._lecturas[worksheet]
+                return None
+            if desde < inicio: return None
+            self.aciertos += 1
+            return df.loc[df.index >= desde].copy()
+
+    def _guardar(self, worksheet, desde, df):
+        with self._candado:
+            self.descargas += 1
+            self._lecturas[worksheet] = (time.monotonic(), desde, df)
+
+    def invalidar(self, worksheet=None):
+        with self._candado:
+            if worksheet is None: self._lecturas.clear()
+            else: self._lecturas.pop(worksheet, None)
+
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        if kwargs: return self._conn.read(worksheet=worksheet, ttl=0, **kwargs)
+        df = self._vigente(worksheet, 0)
+        if df is None:
+            df = self._conn.read(worksheet=worksheet, ttl=0)
+            self._guardar(worksheet, 0, df)
+            df = df.copy()
+        return df
+
+    def leer_desde(self, worksheet=None, desde=0):
+        df = self._vigente(worksheet, desde)
+        if df is None:
+            df = leer_desde(self._conn, worksheet, desde)
+            self._guardar(worksheet, desde, df)
+            df = df.copy()
+        return df
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        try: return self._conn.update(worksheet=worksheet, data=data, **kwargs)
+        finally: self.invalidar(worksheet)
+
+    def agregar_filas(self, worksheet=None, filas=()):
+        try: return agregar_filas(self._conn, filas, worksheet=worksheet)
+        finally: self.invalidar(worksheet)
+
+    def borrar_filas(self, worksheet=None, posiciones=(), esperadas=None):
+        try: return borrar_filas(self._conn, posiciones, worksheet=worksheet, esperadas=esperadas)
+        finally: self.invalidar(worksheet)
+
+    def actualizar_fila(self, worksheet=None, clave=None, valor=None, cambios=None, esperado=None, posicion=None):
+        try: return actualizar_fila(self._conn, clave, valor, cambios, worksheet=worksheet, esperado=esperado, posicion=posicion)
+        finally: self.invalidar(worksheet)
+
+def sin_cache(conn):
+    """La conexión debajo de las capas de caché: lecturas siempre frescas de la hoja."""
+    while isinstance(conn, ConexionCacheada): conn = conn._conn
+    return conn
+
+# --- MEDICIÓN ---
+class ConexionMedida:
+    """Envuelve la conexión y registra en `metricas` cada llamada que llega a Sheets.
+
+    Va debajo de ConexionCacheada: las lecturas servidas desde la caché no cuentan.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        with metricas.medir("hojas_read") as m:
+            df = self._conn.read(worksheet=worksheet, ttl=ttl, **kwargs)
+            m.cargar(filas=len(df))
+        return df
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        with metricas.medir("hojas_update") as m:
+            m.cargar(filas=len(data) if data is not None else 0)
+            return self._conn.update(worksheet=worksheet, data=data, **kwargs)
+
+    def leer_desde(self, worksheet=None, desde=0):
+        with metricas.medir("hojas_leer_desde") as m:
+            df = leer_desde(self._conn, worksheet, desde)
+            m.cargar(filas=len(df))
+        return df
+
+    def agregar_filas(self, worksheet=None, filas=()):
+        with metricas.medir("hojas_agregar_filas") as m:
+            m.cargar(filas=len(filas))
+            return agregar_filas(self._conn, filas, worksheet=worksheet)
+
+    def borrar_filas(self, worksheet=None, posiciones=(), esperadas=None):
+        with metricas.medir("hojas_borrar_filas") as m:
+            m.cargar(filas=len(posiciones))
+            return borrar_filas(self._conn, posiciones, worksheet=worksheet, esperadas=esperadas)
+
+    def actualizar_fila(self, worksheet=None, clave=None, valor=None, cambios=None, esperado=None, posicion=None):
+        with metricas.medir("hojas_actualizar_fila") as m:
+            m.cargar(celdas=len(cambios or {}))
+            return actualizar_fila(self._conn, clave, valor, cambios, worksheet=worksheet, esperado=esperado, posicion=posicion)
+
+# --- RESPALDO LOCAL ---
+class ErrorSimulado(Exception):
+    """Como gspread.exceptions.APIError: trae `response.status_code` (429 cuota, 503 falla)."""
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.response = SimpleNamespace(status_code=codigo)
+
+class ConexionLocal:
+    """Sustituto en memoria de GSheetsConnection para pruebas, desarrollo y pruebas de carga.
+
+    Cuenta lecturas, escrituras y filas enviadas para comparar costos. Opcionalmente
+    simula la API: `latencia` por llamada (segundos o (mínimo, máximo)) más
+    `por_fila` por cada fila transferida, `cuota` llamadas por `ventana` segundos
+    (Sheets: 60 por minuto y usuario) y una probabilidad de `fallas` (503).
+    """
+    def __init__(self, hojas=None, latencia=0.0, por_fila=0.0, cuota=None, ventana=60.0, fallas=0.0, semilla=None):
+        self._hojas = {k: pd.DataFrame(v) for k, v in (hojas or {}).items()}
+        self._candado = threading.Lock()
+        self.latencia = latencia
+        self.por_fila = por_fila
+        self.cuota = cuota
+        self.ventana = ventana
+        self.fallas = fallas
+        self._azar = random.Random(semilla)
+        self._llamadas = deque()
+        self.lecturas = 0
+        self.escrituras = 0
+        self.filas_enviadas = 0
+        self.rechazadas = 0   # por cuota
+        self.fallidas = 0     # fallas inyectadas
+
+    def _admitir(self):
+        """Cuota y fallas inyectadas, antes de tocar los datos."""
+        with self._candado:
+            ahora = time.monotonic()
+            while self._llamadas and ahora - self._llamadas[0] > self.ventana: self._llamadas.popleft()
+            if self.cuota is not None and len(self._llamadas) >= self.cuota:
+                self.rechazadas += 1
+                raise ErrorSimulado(429, "Quota exceeded (simulado)")
+            self._llamadas.append(ahora)
+            if self.fallas and self._azar.random() < self.fallas:
+                self.fallidas += 1
+                raise ErrorSimulado(503, "Service unavailable (simulado)")
+
+    def _esperar(self, filas=0):
+        # Fuera del candado: las llamadas concurrentes se traslapan como en la API
+        base = self._azar.uniform(*self.latencia) if isinstance(self.latencia, tuple) else self.latencia
+        if base or self.por_fila: time.sleep(base + self.por_fila * filas)
+
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        self._admitir()
+        with self._candado:
+            self.lecturas += 1
+            if worksheet not in self._hojas: raise KeyError(f"Hoja inexistente: {worksheet}")
+            df = self._hojas[worksheet].copy()
+        self._esperar(len(df))
+        return df
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        data = pd.DataFrame(data)
+        self._admitir()
+        self._esperar(len(data))
+        with self._candado:
+            self.escrituras += 1
+            self.filas_enviadas += len(data)
+            self._hojas[worksheet] = data.reset_index(drop=True)
+        return data
+
+    def leer_desde(self, worksheet=None, desde=0):
+        self._admitir()
+        with self._candado:
+            self.lecturas += 1
+            if worksheet not in self._hojas: raise KeyError(f"Hoja inexistente: {worksheet}")
+            df = self._hojas[worksheet].iloc[desde:].copy()
+        self._esperar(len(df))
+        return df
+
+    def agregar_filas(self, worksheet=None, filas=()):
+        nuevo = pd.DataFrame(list(filas))
+        self._admitir()
+        self._esperar(len(nuevo))
+        with self._candado:
+            self.escrituras += 1
+            self.filas_enviadas += len(nuevo)
+            actual = self._hojas.get(worksheet)
+            if actual is None or actual.empty:
+                columnas = ENCABEZADOS.get(worksheet, []) if actual is None else list(actual.columns)
+                columnas = list(dict.fromkeys(columnas + list(nuevo.columns)))
+                self._hojas[worksheet] = nuevo.reindex(columns=columnas)
+            else:
+                self._hojas[worksheet] = pd.concat([actual, nuevo], ignore_index=True)
+        return len(nuevo)
+
+    def borrar_filas(self, worksheet=None, posiciones=(), esperadas=None):
+        self._admitir()
+        self._esperar()
+        with self._candado:
+            actual = self._hojas[worksheet]
+            if esperadas:
+                _revisar_posiciones({p: actual.iloc[p].to_dict() for p in esperadas if p < len(actual)}, esperadas)
+            self.escrituras += 1
+            self._hojas[worksheet] = actual.drop(index=actual.index[list(posiciones)]).reset_index(drop=True)
+        return len(set(posiciones))
+
+    def actualizar_fila(self, worksheet=None, clave=None, valor=None, cambios=None, esperado=None, posicion=None):
+        self._admitir()
+        self._esperar(1)
+        # Revisar y escribir bajo el mismo candado: equivale a un compare-and-set
+        with self._candado:
+            df = self._hojas[worksheet]
+            filas = df.index[df[clave].astype(str) == str(valor)]
+            if not len(filas): raise KeyError(f"No existe {clave} = {valor}")
+            _revisar(df.loc[filas[0]].to_dict(), esperado)
+            df = df.copy()
+            for columna, nuevo in cambios.items(): df.loc[filas[0], columna] = nuevo
+            self._hojas[worksheet] = df
+            self.escrituras += 1
+            self.filas_enviadas += 1
+        return int(df.index.get_loc(filas[0]))
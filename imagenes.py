@@ -0,0 +1,181 @@
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# --- IMÁGENES DE EVIDENCIA ---
+# Cada foto termina en una caja de 85x60 mm del PDF de evidencia; no tiene caso
+# decodificar ni guardar más pixeles de los que caben ahí a la resolución de impresión.
+CAJA_MM = (85, 60)
+DPI = 150
+CALIDAD = 70
+ORIENTACION = 0x0112  # etiqueta EXIF "Orientation"
+
+TRANSPUESTAS = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# JPEG ya listo para imprimirse: bytes, tamaño en pixeles y peso del archivo subido
+ImagenProcesada = namedtuple("ImagenProcesada", ["datos", "ancho", "alto", "original"], defaults=(0,))
+
+def tamano_objetivo(caja_mm=CAJA_MM, dpi=DPI):
+    return tuple(max(1, round(mm / 25.4 * dpi)) for mm in caja_mm)
+
+def procesar_imagen(origen, caja_mm=CAJA_MM, dpi=DPI, calidad=CALIDAD):
+    """Decodifica a resolución reducida, corrige la orientación EXIF y codifica en memoria."""
+    ancho, alto = tamano_objetivo(caja_mm, dpi)
+    with Image.open(origen) as imagen:
+        orientacion = imagen.getexif().get(ORIENTACION, 1)
+        # Con rotación de 90°, los pixeles guardados vienen de lado
+        tamano_crudo = (alto, ancho) if orientacion in (5, 6, 7, 8) else (ancho, alto)
+        # JPEG: el decodificador escala 1/2, 1/4 u 1/8 sin tocar la resolución completa
+        imagen.draft("RGB", tamano_crudo)
+        imagen = imagen.convert("RGB").resize(tamano_crudo, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if orientacion in TRANSPUESTAS:
+        imagen = imagen.transpose(TRANSPUESTAS[orientacion])
+
+    return ImagenProcesada(_codificar(imagen, calidad), ancho, alto, _peso(origen))
+
+def _codificar(imagen, calidad):
+    buffer = io.BytesIO()
+    imagen.save(buffer, "JPEG", quality=calidad, optimize=True)
+    return buffer.getvalue()
+
+def _peso(origen):
+    if isinstance(origen, (bytes, bytearray)): return len(origen)
+    if hasattr(origen, "getbuffer"): return origen.getbuffer().nbytes
+    if hasattr(origen, "size"): return origen.size  # UploadedFile de Streamlit
+    try: return os.path.getsize(origen)
+    except (TypeError, OSError): return 0
+
+def recomprimir(imagen, calidad, dpi=DPI, caja_mm=CAJA_MM):
+    """Vuelve a codificar una foto ya procesada con otra calidad y, si baja el DPI, a menos pixeles.
+
+    Parte del JPEG de la caja (no del archivo original): es pequeño y la pérdida
+    extra de una segunda codificación no se nota a calidades menores.
+    """
+    ancho, alto = tamano_objetivo(caja_mm, dpi)
+    with Image.open(io.BytesIO(imagen.datos)) as foto:
+        foto = foto.convert("RGB")
+        if (ancho, alto) != foto.size:
+            foto = foto.resize((ancho, alto), Image.Resampling.LANCZOS)
+    return ImagenProcesada(_codificar(foto, calidad), ancho, alto, imagen.original)
+
+# --- CACHÉ POR CONTENIDO ---
+# Reintentos y fotos repetidas (tablero, VIN) traen los mismos bytes: se guarda la
+# versión ya procesada, con llave = huella del archivo + parámetros de salida.
+CACHE_ENTRADAS = 256
+
+class CacheImagenes:
+    """LRU acotado de imágenes procesadas, compartido por todas las sesiones."""
+    def __init__(self, maximo=CACHE_ENTRADAS):
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._candado:
+            imagen = self._entradas.get(clave)
+            if imagen is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return imagen
+
+    def guardar(self, clave, imagen):
+        with self._candado:
+            self._entradas[clave] = imagen
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        with self._candado:
+            total = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "bytes": sum(len(i.datos) for i in self._entradas.values()),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa": self.aciertos / total if total else 0.0,
+            }
+
+cache = CacheImagenes()
+
+def _leer_bytes(origen):
+    if isinstance(origen, (bytes, bytearray)): return bytes(origen)
+    if hasattr(origen, "getvalue"): return origen.getvalue()
+    if hasattr(origen, "read"):
+        if hasattr(origen, "seek"): origen.seek(0)
+        return origen.read()
+    with open(origen, "rb") as f:
+        return f.read()
+
+def procesar_con_cache(origen, caja_mm=CAJA_MM, dpi=DPI, calidad=CALIDAD):
+    """Como procesar_imagen, pero sin repetir el trabajo para bytes ya vistos."""
+    datos = _leer_bytes(origen)
+    clave = (hashlib.blake2b(datos, digest_size=16).hexdigest(), tuple(caja_mm), dpi, calidad)
+    imagen = cache.obtener(clave)
+    if imagen is None:
+        imagen = procesar_imagen(io.BytesIO(datos), caja_mm, dpi, calidad)
+        cache.guardar(clave, imagen)
+    return imagen
+
+# --- PROCESAMIENTO EN PARALELO ---
+# Pillow suelta el GIL al decodificar, escalar y codificar: un pool pequeño,
+# compartido por todas las sesiones del proceso, aprovecha los núcleos del servidor.
+HILOS = max(1, min(4, os.cpu_count() or 1))
+_ejecutor = None
+_candado = threading.Lock()
+
+def ejecutor():
+    global _ejecutor
+    with _candado:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS, thread_name_prefix="imagenes")
+        return _ejecutor
+
+def _cronometrado(procesar, origen):
+    inicio = time.perf_counter()
+    try: imagen = procesar(origen)
+    except Exception: imagen = None
+    return imagen, time.perf_counter() - inicio
+
+def procesar_lote(origenes, procesar=procesar_imagen):
+    """Procesa varias fotos a la vez; `origenes` es {nombre: archivo o None}.
+
+    Devuelve ({nombre: ImagenProcesada o None}, {"fotos": {nombre: s}, "total": s}).
+    Una foto que no se puede leer queda en None sin tumbar a las demás.
+    """
+    inicio = time.perf_counter()
+    futuros = {n: ejecutor().submit(_cronometrado, procesar, o) for n, o in origenes.items() if o}
+    resultados, tiempos = {}, {}
+    for nombre in origenes:
+        if nombre in futuros: resultados[nombre], tiempos[nombre] = futuros[nombre].result()
+        else: resultados[nombre] = None
+    return resultados, {"fotos": tiempos, "total": time.perf_counter() - inicio}
+
+def insertar_en_pdf(pdf, imagen, x, y, w, h):
+    """Coloca una foto en el PDF sin pasar por disco (acepta también una ruta)."""
+    if not isinstance(imagen, ImagenProcesada):
+        return pdf.image(imagen, x=x, y=y, w=w, h=h)
+    # Se registra como lo haría FPDF._parsejpg al leer el archivo
+    clave = f"memoria:{len(pdf.images)}"
+    pdf.images[clave] = {
+        "w": imagen.ancho, "h": imagen.alto, "cs": "DeviceRGB", "bpc": 8,
+        "f": "DCTDecode", "data": imagen.datos, "i": len(pdf.images) + 1,
+    }
+    return pdf.image(clave, x=x, y=y, w=w, h=h)
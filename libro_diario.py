@@ -0,0 +1,228 @@
+"""Libro diario: totales del cierre por día, mantenidos al registrar y al cerrar.
+
+    python libro_diario.py reconstruir [--sin-hoja]
+
+Cada unidad registrada suma a su día y a su cliente; cada orden cerrada fija su
+cobro y comisión en los días donde tuvo unidades. El cierre del día solo lee la
+entrada de ese día. `reconstruir` vuelve a derivar todo desde el historial.
+"""
+import sys
+import json
+import time
+import argparse
+from datetime import date
+import pandas as pd
+import archivo
+import base_local
+import espejo
+import hojas
+
+# --- ESQUEMA ---
+# libro_dias: una fila por día con unidades, efectivo en manos del técnico y comisiones
+# libro_clientes: unidades de cada cliente en el día (orden de aparición y nombres)
+# libro_ordenes: órdenes con unidades en el día y su cobro al cerrarse
+# libro_desfases: días que quedaron sin una unidad o un cierre que sí llegó a la hoja
+# libro_reconstrucciones: cada reconstrucción completa (el libro solo vale desde la primera)
+def _preparar(con):
+    con.execute("CREATE TABLE IF NOT EXISTS libro_dias (fecha TEXT PRIMARY KEY, unidades INTEGER NOT NULL DEFAULT 0, "
+                "efectivo REAL NOT NULL DEFAULT 0, comisiones REAL NOT NULL DEFAULT 0)")
+    con.execute("CREATE TABLE IF NOT EXISTS libro_clientes (fecha TEXT, cliente TEXT, posicion INTEGER, "
+                "unidades INTEGER NOT NULL DEFAULT 0, detalle TEXT NOT NULL DEFAULT '[]', PRIMARY KEY (fecha, cliente))")
+    con.execute("CREATE TABLE IF NOT EXISTS libro_ordenes (fecha TEXT, id_servicio TEXT, finalizada INTEGER NOT NULL DEFAULT 0, "
+                "cobro REAL, tipo_pago TEXT, pago_tecnico REAL, PRIMARY KEY (fecha, id_servicio))")
+    con.execute("CREATE INDEX IF NOT EXISTS ix_libro_ordenes_id ON libro_ordenes (id_servicio)")
+    con.execute("CREATE TABLE IF NOT EXISTS libro_desfases (fecha TEXT PRIMARY KEY, motivo TEXT, momento REAL NOT NULL)")
+    con.execute("CREATE TABLE IF NOT EXISTS libro_reconstrucciones (momento REAL NOT NULL, dias INTEGER NOT NULL)")
+
+def _dia(fecha):
+    return fecha.isoformat() if isinstance(fecha, date) else str(fecha)
+
+def _transaccion(funcion, ruta=None):
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = funcion(con)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return resultado
+    finally: con.close()
+
+def _recalcular(con, fechas):
+    """Efectivo y comisiones de esos días, a partir de sus órdenes cerradas."""
+    for fecha in fechas:
+        efectivo, comisiones = con.execute(
+            "SELECT COALESCE(SUM(CASE WHEN tipo_pago = 'Efectivo' THEN cobro END), 0), COALESCE(SUM(pago_tecnico), 0) "
+            "FROM libro_ordenes WHERE fecha = ? AND finalizada = 1", (fecha,)).fetchone()
+        con.execute("UPDATE libro_dias SET efectivo = ?, comisiones = ? WHERE fecha = ?", (efectivo, comisiones, fecha))
+
+# --- ACTUALIZACIÓN INCREMENTAL ---
+def registrar_unidad(fecha, id_servicio, cliente, unidad, ruta=None):
+    """Suma una unidad instalada al día `fecha`."""
+    fecha, id_servicio, cliente = _dia(fecha), str(id_servicio), str(cliente)
+    def aplicar(con):
+        con.execute("INSERT INTO libro_dias (fecha, unidades) VALUES (?, 1) "
+                    "ON CONFLICT(fecha) DO UPDATE SET unidades = unidades + 1", (fecha,))
+        fila = con.execute("SELECT detalle FROM libro_clientes WHERE fecha = ? AND cliente = ?", (fecha, cliente)).fetchone()
+        if fila is None:
+            posicion = con.execute("SELECT COUNT(*) FROM libro_clientes WHERE fecha = ?", (fecha,)).fetchone()[0]
+            con.execute("INSERT INTO libro_clientes (fecha, cliente, posicion, unidades, detalle) VALUES (?, ?, ?, 1, ?)",
+                        (fecha, cliente, posicion, json.dumps([str(unidad)], ensure_ascii=False)))
+        else:
+            detalle = json.loads(fila[0]) + [str(unidad)]
+            con.execute("UPDATE libro_clientes SET unidades = ?, detalle = ? WHERE fecha = ? AND cliente = ?",
+                        (len(detalle), json.dumps(detalle, ensure_ascii=False), fecha, cliente))
+        # Si la orden ya estaba cerrada, su cobro también cuenta en este día
+        cerrada = con.execute("SELECT cobro, tipo_pago, pago_tecnico FROM libro_ordenes "
+                              "WHERE id_servicio = ? AND finalizada = 1 LIMIT 1", (id_servicio,)).fetchone()
+        con.execute("INSERT OR IGNORE INTO libro_ordenes (fecha, id_servicio, finalizada, cobro, tipo_pago, pago_tecnico) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (fecha, id_servicio, int(cerrada is not None), *(cerrada or (None, None, None))))
+        if cerrada is not None: _recalcular(con, [fecha])
+    _transaccion(aplicar, ruta)
+
+def cerrar_orden(id_servicio, cobro, tipo_pago, pago_tecnico, ruta=None):
+    """Fija el cobro de la orden en los días donde tuvo unidades; devuelve esos días."""
+    def aplicar(con):
+        fechas = [f for (f,) in con.execute("SELECT fecha FROM libro_ordenes WHERE id_servicio = ?", (str(id_servicio),))]
+        con.execute("UPDATE libro_ordenes SET finalizada = 1, cobro = ?, tipo_pago = ?, pago_tecnico = ? WHERE id_servicio = ?",
+                    (float(cobro or 0), tipo_pago, float(pago_tecnico or 0), str(id_servicio)))
+        _recalcular(con, fechas)
+        return fechas
+    return _transaccion(aplicar, ruta)
+
+# --- DESFASES ---
+# Si la hoja recibió una unidad o un cierre pero el libro no se pudo actualizar,
+# el día se marca aquí hasta la siguiente reconstrucción: su cierre no es confiable.
+def marcar_desfase(fechas, motivo, ruta=None):
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        con.executemany("INSERT INTO libro_desfases (fecha, motivo, momento) VALUES (?, ?, ?) "
+                        "ON CONFLICT(fecha) DO UPDATE SET motivo = excluded.motivo, momento = excluded.momento",
+                        [(_dia(f), str(motivo), time.time()) for f in fechas])
+    finally: con.close()
+
+def desfases(ruta=None):
+    """Días marcados, del más antiguo al más nuevo: [{"fecha", "motivo", "momento"}]."""
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        return [{"fecha": f, "motivo": m, "momento": t}
+                for f, m, t in con.execute("SELECT fecha, motivo, momento FROM libro_desfases ORDER BY fecha")]
+    finally: con.close()
+
+def dias_de_orden(id_servicio, ruta=None):
+    """Días donde la orden tiene unidades en el libro."""
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        return [f for (f,) in con.execute("SELECT fecha FROM libro_ordenes WHERE id_servicio = ?", (str(id_servicio),))]
+    finally: con.close()
+
+# --- CONSULTA ---
+def dia(fecha, ruta=None):
+    """Entrada del libro para `fecha`: unidades, efectivo, comisiones y clientes [(cliente, [unidades])]."""
+    fecha = _dia(fecha)
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        fila = con.execute("SELECT unidades, efectivo, comisiones FROM libro_dias WHERE fecha = ?", (fecha,)).fetchone()
+        if fila is None: return None
+        clientes = [(c, json.loads(d)) for c, d in con.execute(
+            "SELECT cliente, detalle FROM libro_clientes WHERE fecha = ? ORDER BY posicion", (fecha,))]
+    finally: con.close()
+    return {"fecha": fecha, "unidades": fila[0], "efectivo": fila[1], "comisiones": fila[2], "clientes": clientes}
+
+def reconstruido(ruta=None):
+    """True si el libro ya se derivó alguna vez del historial completo.
+
+    No basta con que tenga filas: el sincronizador pudo sumarle unidades antes.
+    """
+    con = base_local.conectar(ruta)
+    try:
+        _preparar(con)
+        return con.execute("SELECT 1 FROM libro_reconstrucciones LIMIT 1").fetchone() is not None
+    finally: con.close()
+
+# --- RECONSTRUCCIÓN ---
+def _valor(v):
+    if v is None or pd.isna(v): return None
+    return v.item() if hasattr(v, "item") else v
+
+def _numerico(df, columna):
+    if columna not in df.columns: return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[columna], errors='coerce').fillna(0).astype(float)
+
+def reconstruir(df_instalaciones, df_agenda, ruta=None, leido=None):
+    """Rehace el libro completo desde el historial; devuelve cuántos días quedaron.
+
+    Quita las marcas de desfase anteriores a `leido` (cuando se leyó el
+    historial; por omisión, ahora).
+    """
+    leido = time.time() if leido is None else leido
+    inst = df_instalaciones.loc[:, ["ID_Servicio", "Fecha", "Cliente", "Unidad"]].copy()
+    columna, formato = espejo.FECHAS[hojas.INSTALACIONES]
+    inst["fecha"] = pd.to_datetime(inst[columna].astype(str).str[:10], format=formato, errors="coerce").dt.strftime("%Y-%m-%d")
+    inst = inst.dropna(subset=["fecha"])
+    inst["ID_Servicio"] = inst["ID_Servicio"].astype(str)
+    inst["Cliente"] = inst["Cliente"].astype(str)
+    inst["Unidad"] = inst["Unidad"].astype(str)
+
+    clientes = inst.groupby(["fecha", "Cliente"], sort=False).agg(detalle=("Unidad", list)).reset_index()
+    clientes["posicion"] = clientes.groupby("fecha").cumcount()
+    clientes["unidades"] = clientes["detalle"].str.len()
+
+    ordenes = inst[["fecha", "ID_Servicio"]].drop_duplicates()
+    agenda = pd.DataFrame({
+        "ID_Servicio": df_agenda["ID"].astype(str) if "ID" in df_agenda.columns else pd.Series(dtype=str),
+        "finalizada": df_agenda["Estatus"].eq("FINALIZADO").astype(int) if "Estatus" in df_agenda.columns else 0,
+        "cobro": _numerico(df_agenda, "Cobro_Final"),
+        "tipo_pago": df_agenda["Tipo_Pago"] if "Tipo_Pago" in df_agenda.columns else None,
+        "pago_tecnico": _numerico(df_agenda, "Pago_Tecnico"),
+    }).drop_duplicates("ID_Servicio")
+    ordenes = ordenes.merge(agenda, on="ID_Servicio", how="left")
+    ordenes["finalizada"] = ordenes["finalizada"].fillna(0).astype(int)
+
+    cerradas = ordenes[ordenes["finalizada"] == 1]
+    dias = pd.DataFrame({"unidades": inst.groupby("fecha").size()})
+    dias["efectivo"] = cerradas["cobro"].where(cerradas["tipo_pago"].eq("Efectivo"), 0).groupby(cerradas["fecha"]).sum()
+    dias["comisiones"] = cerradas.groupby("fecha")["pago_tecnico"].sum()
+    dias = dias.fillna(0).reset_index()
+
+    def aplicar(con):
+        for tabla in ("libro_dias", "libro_clientes", "libro_ordenes"): con.execute(f"DELETE FROM {tabla}")
+        con.execute("DELETE FROM libro_desfases WHERE momento <= ?", (leido,))
+        con.execute("INSERT INTO libro_reconstrucciones (momento, dias) VALUES (?, ?)", (time.time(), len(dias)))
+        con.executemany("INSERT INTO libro_dias (fecha, unidades, efectivo, comisiones) VALUES (?, ?, ?, ?)",
+                        [(f, int(u), float(e), float(c)) for f, u, e, c in dias.itertuples(index=False)])
+        con.executemany("INSERT INTO libro_clientes (fecha, cliente, posicion, unidades, detalle) VALUES (?, ?, ?, ?, ?)",
+                        [(f, c, int(p), int(u), json.dumps(d, ensure_ascii=False))
+                         for f, c, d, p, u in clientes[["fecha", "Cliente", "detalle", "posicion", "unidades"]].itertuples(index=False)])
+        con.executemany("INSERT INTO libro_ordenes (fecha, id_servicio, finalizada, cobro, tipo_pago, pago_tecnico) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(f, i, int(fin), _valor(c), _valor(t), _valor(p))
+                         for f, i, fin, c, t, p in ordenes[["fecha", "ID_Servicio", "finalizada", "cobro", "tipo_pago", "pago_tecnico"]].itertuples(index=False)])
+        return len(dias)
+    return _transaccion(aplicar, ruta)
+
+def reconstruir_desde_espejo(conn=None, ruta=None):
+    """Sincroniza las hojas (si hay conexión) y rehace el libro desde el espejo local y el archivo."""
+    leido = time.time()
+    if conn is not None:
+        espejo.sincronizar(conn, hojas.INSTALACIONES, completo=True, ruta=ruta)
+        espejo.sincronizar(conn, hojas.AGENDA, completo=True, ruta=ruta)
+    return reconstruir(archivo.consultar(hojas.INSTALACIONES, ruta_db=ruta), archivo.consultar(hojas.AGENDA, ruta_db=ruta), ruta=ruta, leido=leido)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Libro diario del cierre.")
+    parser.add_argument("accion", choices=["reconstruir"])
+    parser.add_argument("--sin-hoja", action="store_true", help="usar solo el espejo local, sin descargar las hojas")
+    args = parser.parse_args(argv)
+    dias = reconstruir_desde_espejo(None if args.sin_hoja else hojas.conexion_gsheets())
+    print(f"✅ Libro diario reconstruido: {dias} días.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
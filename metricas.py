@@ -0,0 +1,206 @@
+"""Tiempos, tamaños y errores de las operaciones lentas (hojas, PDFs, fotos, correo).
+
+Cada operación lleva un histograma de duración, la suma y cuenta de su carga
+(filas, bytes o pixeles) y sus errores. Se exporta en formato de texto de
+Prometheus: a un archivo (para el textfile collector de node_exporter) y,
+si se pide un puerto, en http://localhost:<puerto>/metrics.
+"""
+import os
+import threading
+import time
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURACIÓN ---
+RUTA_METRICAS = os.environ.get("COTIZADOR_METRICAS", "metricas")
+PUERTO = os.environ.get("COTIZADOR_METRICAS_PUERTO")
+CADA = 15   # segundos entre exportaciones al archivo
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PREFIJO = "cotizador"
+
+class _Operacion:
+    def __init__(self):
+        self.cubetas = [0] * len(CUBETAS)
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        self.errores = 0
+        self.carga = {}   # unidad -> [suma, cuenta]
+
+    def percentil(self, p):
+        """Estimación a partir de las cubetas (límite superior de la cubeta que lo contiene)."""
+        if not self.llamadas: return 0.0
+        objetivo, acumulado = p * self.llamadas, 0
+        for limite, n in zip(CUBETAS, self.cubetas):
+            acumulado += n
+            if acumulado >= objetivo: return min(limite, self.maximo)
+        return self.maximo
+
+class Registro:
+    """Métricas del proceso; seguro entre hilos."""
+    def __init__(self):
+        self._operaciones = {}
+        self._candado = threading.Lock()
+        self.inicio = time.time()
+
+    def observar(self, operacion, segundos, error=False, carga=None):
+        """`carga` es {unidad: cantidad}, p. ej. {"filas": 120} o {"bytes": 48000}."""
+        with self._candado:
+            o = self._operaciones.setdefault(operacion, _Operacion())
+            o.llamadas += 1
+            o.segundos += segundos
+            o.maximo = max(o.maximo, segundos)
+            for i, limite in enumerate(CUBETAS):
+                if segundos <= limite:
+                    o.cubetas[i] += 1
+                    break
+            if error: o.errores += 1
+            for unidad, cantidad in (carga or {}).items():
+                if cantidad is None: continue
+                suma = o.carga.setdefault(unidad, [0, 0])
+                suma[0] += cantidad
+                suma[1] += 1
+
+    def limpiar(self):
+        with self._candado:
+            self._operaciones.clear()
+            self.inicio = time.time()
+
+    def resumen(self):
+        """Una fila por operación (para el panel de depuración)."""
+        with self._candado:
+            filas = []
+            for nombre, o in sorted(self._operaciones.items()):
+                fila = {
+                    "operacion": nombre, "llamadas": o.llamadas, "errores": o.errores,
+                    "promedio_ms": 1000 * o.segundos / o.llamadas if o.llamadas else 0.0,
+                    "p50_ms": 1000 * o.percentil(0.5), "p95_ms": 1000 * o.percentil(0.95),
+                    "max_ms": 1000 * o.maximo,
+                }
+                for unidad, (suma, cuenta) in o.carga.items():
+                    fila[f"{unidad}_promedio"] = suma / cuenta if cuenta else 0
+                filas.append(fila)
+            return filas
+
+    def texto(self):
+        """Exposición en formato de texto de Prometheus (0.0.4)."""
+        p = PREFIJO
+        lineas = [
+            f"# HELP {p}_duracion_segundos Duración de cada operación.",
+            f"# TYPE {p}_duracion_segundos histogram",
+        ]
+        with self._candado:
+            operaciones = sorted(self._operaciones.items())
+            for nombre, o in operaciones:
+                acumulado = 0
+                for limite, n in zip(CUBETAS, o.cubetas):
+                    acumulado += n
+                    lineas.append(f'{p}_duracion_segundos_bucket{{operacion="{nombre}",le="{limite}"}} {acumulado}')
+                lineas.append(f'{p}_duracion_segundos_bucket{{operacion="{nombre}",le="+Inf"}} {o.llamadas}')
+                lineas.append(f'{p}_duracion_segundos_sum{{operacion="{nombre}"}} {o.segundos:.6f}')
+                lineas.append(f'{p}_duracion_segundos_count{{operacion="{nombre}"}} {o.llamadas}')
+            lineas += [f"# HELP {p}_errores_total Llamadas que terminaron en error.", f"# TYPE {p}_errores_total counter"]
+            lineas += [f'{p}_errores_total{{operacion="{nombre}"}} {o.errores}' for nombre, o in operaciones]
+            lineas += [f"# HELP {p}_carga Tamaño de lo procesado (filas, bytes, pixeles).", f"# TYPE {p}_carga summary"]
+            for nombre, o in operaciones:
+                for unidad, (suma, cuenta) in sorted(o.carga.items()):
+                    lineas.append(f'{p}_carga_sum{{operacion="{nombre}",unidad="{unidad}"}} {suma}')
+                    lineas.append(f'{p}_carga_count{{operacion="{nombre}",unidad="{unidad}"}} {cuenta}')
+            lineas += [f"# TYPE {p}_inicio_segundos gauge", f"{p}_inicio_segundos {self.inicio:.0f}"]
+        return "\n".join(lineas) + "\n"
+
+registro = Registro()
+
+# --- MEDICIÓN ---
+class _Medicion:
+    def __init__(self):
+        self.carga = {}
+        self.error = False
+
+    def cargar(self, **carga):
+        self.carga.update(carga)
+
+@contextmanager
+def medir(operacion):
+    """`with medir("correo") as m: ...; m.cargar(bytes=n)`; una excepción cuenta como error."""
+    m = _Medicion()
+    inicio = time.perf_counter()
+    try:
+        yield m
+    except Exception:
+        m.error = True
+        raise
+    finally:
+        registro.observar(operacion, time.perf_counter() - inicio, m.error, m.carga)
+
+def instrumentar(operacion, carga=None):
+    """Decorador; `carga(resultado)` devuelve {unidad: cantidad} del resultado."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(operacion) as m:
+                resultado = funcion(*args, **kwargs)
+                if carga is not None and resultado is not None:
+                    try: m.cargar(**carga(resultado))
+                    except Exception: pass
+                return resultado
+        return envoltura
+    return decorador
+
+def bytes_de(resultado):
+    return {"bytes": len(resultado)}
+
+def filas_de(resultado):
+    return {"filas": len(resultado)}
+
+# --- EXPORTACIÓN ---
+def exportar(nombre, ruta=None):
+    """Escribe <ruta>/<nombre>.prom de forma atómica."""
+    carpeta = ruta or RUTA_METRICAS
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, f"{nombre}.prom")
+    with open(destino + ".tmp", "w", encoding="utf-8") as f:
+        f.write(registro.texto())
+    os.replace(destino + ".tmp", destino)
+    return destino
+
+class _Pagina(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = registro.texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+_iniciado = {}
+_candado = threading.Lock()
+
+def iniciar(nombre, puerto=None, cada=CADA, ruta=None):
+    """Exporta al archivo cada `cada` segundos y, con `puerto`, sirve /metrics (una vez por proceso)."""
+    with _candado:
+        if nombre in _iniciado: return _iniciado[nombre]
+
+        def exportar_siempre():
+            while True:
+                try: exportar(nombre, ruta)
+                except OSError: pass
+                time.sleep(cada)
+        threading.Thread(target=exportar_siempre, name=f"metricas-{nombre}", daemon=True).start()
+
+        servidor = None
+        puerto = puerto or PUERTO
+        if puerto:
+            try:
+                servidor = ThreadingHTTPServer(("127.0.0.1", int(puerto)), _Pagina)
+                threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+            except OSError: servidor = None  # puerto ocupado (otra app ya lo sirve)
+        _iniciado[nombre] = servidor
+        return servidor
@@ -3,257 +3,144 @@ import pandas as pd
 from datetime import datetime, timedelta
 from streamlit_gsheets import GSheetsConnection
 import uuid
-from fpdf import FPDF
-from PIL import Image, ExifTags
-import tempfile
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 import os
+import hojas
+import espejo
+import correo
+import imagenes
+import reportes
+import libro_diario
+import archivo
+import envios
+import metricas
+import recursos
+from tuberia import Tuberia
 
 # --- CONFIGURACIÓN ---
 st.set_page_config(page_title="Sistema GPS LEDAC", layout="wide", page_icon="🛰️")
 
 # --- CONEXIÓN ---
+# Lecturas compartidas por todas las sesiones; cada hoja se vuelve a descargar
+# cuando la app escribe en ella o tras TTL_LECTURAS segundos (cambios de otros).
+TTL_LECTURAS = 20
+
+@st.cache_resource
+def conexion_compartida():
+    # Las métricas van bajo la caché: solo cuentan las llamadas que llegan a Sheets
+    metricas.iniciar("operaciones")
+    return hojas.ConexionCacheada(hojas.ConexionMedida(st.connection("gsheets", type=GSheetsConnection)), ttl=TTL_LECTURAS)
+
 try:
-    conn = st.connection("gsheets", type=GSheetsConnection)
+    conn = conexion_compartida()
 except Exception as e:
     st.error(f"🚨 Error secrets.toml: {e}")
     st.stop()
 
+@st.cache_resource
+def preparar_libro_diario(_conn):
+    # Primera vez en este servidor (o base local nueva): el libro se deriva del historial completo
+    if not libro_diario.reconstruido(): libro_diario.reconstruir_desde_espejo(_conn)
+    return True
+
+@st.cache_resource
+def sincronizador(_conn):
+    # El libro se reconstruye antes de que este hilo le sume unidades; si falla (sin
+    # conexión) queda sin marca y se reintenta al generar el cierre del día
+    try: preparar_libro_diario(_conn)
+    except Exception: pass
+    # Unidades y cierres se guardan primero en la cola local; este hilo los sube
+    return envios.iniciar(_conn)
+
+@st.cache_resource
+def recursos_operaciones():
+    # Una copia de [correo] por proceso (cambiar secrets.toml pide reiniciar la app)
+    try: secretos = st.secrets["correo"]
+    except Exception: secretos = None
+    return recursos.cargar(secretos)
+
+def config_correo():
+    config = recursos_operaciones().correo
+    if not config: raise KeyError("correo")  # falta [correo] en secrets.toml
+    return config
+
 # --- ESTADO ---
 if 'pdf_ultimo' not in st.session_state:
     st.session_state.pdf_ultimo = None
 if 'nombre_pdf_ultimo' not in st.session_state:
     st.session_state.nombre_pdf_ultimo = None
+if 'historial_cursores' not in st.session_state:
+    st.session_state.historial_cursores = [None]  # cursor de cada página visitada
 
 # --- HORA MÉXICO ---
 def hora_mexico():
     return datetime.utcnow() - timedelta(hours=6)
 
 # --- EMAIL ---
+@st.cache_resource
+def cartero():
+    return correo.iniciar(config_correo())
+
 def enviar_reporte_email(pdf_bytes, nombre_archivo, asunto, cuerpo):
+    """Deja el correo en el buzón de salida; el cartero lo envía en segundo plano."""
+    with metricas.medir("correo_encolar") as m:
+        m.cargar(bytes=len(pdf_bytes or b""))
+        try:
+            cartero()
+            config = config_correo()
+            msg = correo.construir_mensaje(
+                config["usuario"], config["destinatario"],
+                asunto, cuerpo, [(nombre_archivo, pdf_bytes)]
+            )
+            correo.encolar(msg)
+            return True, "En cola"
+        except Exception as e:
+            m.error = True
+            return False, str(e)
+
+# Modo resumen (opcional, `modo_resumen = true` en [correo]): las evidencias de una
+# orden se juntan y salen en uno o pocos correos al cerrarla o al vencer
+# `intervalo_resumen`, en lugar de un correo por vehículo.
+def modo_resumen():
+    try: return bool(config_correo().get("modo_resumen", False))
+    except Exception: return False
+
+def agregar_evidencia_a_resumen(id_orden, cliente, pdf_bytes, nombre_archivo):
     try:
-        remitente = st.secrets["correo"]["usuario"]
-        password = st.secrets["correo"]["password"]
-        destinatario = st.secrets["correo"]["destinatario"]
-
-        msg = MIMEMultipart()
-        msg['From'] = remitente
-        msg['To'] = destinatario
-        msg['Subject'] = asunto
-        msg.attach(MIMEText(cuerpo, 'plain'))
-
-        if pdf_bytes:
-            adjunto = MIMEApplication(pdf_bytes, Name=nombre_archivo)
-            adjunto['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
-            msg.attach(adjunto)
-
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(remitente, password)
-        server.send_message(msg)
-        server.quit()
-        return True, "Enviado"
+        cartero()
+        config = config_correo()
+        correo.agregar_a_resumen(
+            id_orden, nombre_archivo, pdf_bytes,
+            config["usuario"], config["destinatario"],
+            f"Evidencias: {cliente} (Orden {id_orden})"
+        )
+        return True, "En resumen"
     except Exception as e:
         return False, str(e)
 
-# --- IMÁGENES ---
-def corregir_orientacion(image):
-    try:
-        for orientation in ExifTags.TAGS.keys():
-            if ExifTags.TAGS[orientation] == 'Orientation':
-                break
-        exif = image._getexif()
-        if exif is not None:
-            orientation = exif.get(orientation)
-            if orientation == 3: image = image.rotate(180, expand=True)
-            elif orientation == 6: image = image.rotate(270, expand=True)
-            elif orientation == 8: image = image.rotate(90, expand=True)
-    except: pass 
-    return image
+def cerrar_resumen_evidencias(id_orden, cuerpo=None):
+    try: return True, correo.cerrar_resumen(id_orden, cuerpo)
+    except Exception as e: return False, str(e)
 
+# --- IMÁGENES ---
 def procesar_imagen_subida(uploaded_file):
+    """Foto lista para el PDF (en memoria, al tamaño de su caja) o None."""
     if uploaded_file:
-        try:
-            image = Image.open(uploaded_file)
-            image = corregir_orientacion(image)
-            image = image.convert('RGB')
-            temp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            image.save(temp.name, quality=70) 
-            return temp.name
-        except: return None
+        with metricas.medir("procesar_imagen") as m:
+            m.cargar(bytes_entrada=getattr(uploaded_file, "size", None))
+            try: imagen = imagenes.procesar_con_cache(uploaded_file)
+            except:
+                m.error = True
+                return None
+            m.cargar(pixeles=imagen.ancho * imagen.alto)
+            return imagen
     return None
 
-# --- PDFS ---
-class PDFReporte(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 14)
-        self.cell(0, 10, 'REPORTE DE EVIDENCIA', 0, 1, 'C')
-        self.ln(5)
-
-def generar_pdf_evidencia(datos, fotos):
-    pdf = PDFReporte()
-    pdf.add_page()
-    pdf.set_font('Arial', '', 11)
-    for key, value in datos.items():
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(50, 8, f"{key}:", 0, 0)
-        pdf.set_font('Arial', '', 11)
-        texto_limpio = str(value).encode('latin-1', 'ignore').decode('latin-1')
-        pdf.cell(0, 8, texto_limpio, 0, 1)
-    pdf.ln(5)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, "EVIDENCIA FOTOGRÁFICA:", 0, 1)
-    x_start, y_start = 10, pdf.get_y()
-    x, y = x_start, y_start
-    for nombre_foto, ruta in fotos.items():
-        if ruta:
-            pdf.set_font('Arial', 'B', 10) 
-            pdf.set_xy(x, y)
-            pdf.cell(90, 5, nombre_foto, 0, 1)
-            try: pdf.image(ruta, x=x, y=y+6, w=85, h=60)
-            except: pass
-            if x == x_start: x = 110 
-            else:
-                x = x_start
-                y += 75 
-            if y > 240:
-                pdf.add_page()
-                y, x = 20, x_start
-    return pdf.output(dest='S').encode('latin-1')
-
-def generar_pdf_resumen_final(cliente, fecha, unidades_df, metodo_pago, efectivo_recibido, comision_tecnico):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'RESUMEN FINAL DE ORDEN', 0, 1, 'C')
-    pdf.ln(10)
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 8, f"Cliente: {str(cliente).encode('latin-1', 'ignore').decode('latin-1')}", 0, 1)
-    pdf.cell(0, 8, f"Fecha: {fecha}", 0, 1)
-    pdf.ln(10)
-    
-    # Tabla Unidades
-    pdf.set_font('Arial', 'B', 12)
-    pdf.set_fill_color(200, 220, 255)
-    pdf.cell(10, 10, "#", 1, 0, 'C', 1)
-    pdf.cell(100, 10, "UNIDAD", 1, 0, 'L', 1)
-    pdf.cell(80, 10, "FECHA", 1, 1, 'C', 1)
-    pdf.set_font('Arial', '', 11)
-    count = 1
-    for index, row in unidades_df.iterrows():
-        unidad_limpia = str(row['Unidad']).encode('latin-1', 'ignore').decode('latin-1')
-        pdf.cell(10, 10, str(count), 1, 0, 'C')
-        pdf.cell(100, 10, f" {unidad_limpia}", 1, 0, 'L')
-        pdf.cell(80, 10, str(row['Fecha']), 1, 1, 'C')
-        count += 1
-    pdf.ln(15)
-    
-    # Finanzas
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 10, "DETALLE FINANCIERO:", 0, 1)
-    pdf.set_font('Arial', '', 12)
-    
-    pdf.cell(0, 8, f"Forma de Pago del Cliente: {metodo_pago}", 0, 1)
-    
-    if metodo_pago == "Efectivo":
-        pdf.set_font('Arial', 'B', 12)
-        pdf.set_text_color(0, 100, 0)
-        pdf.cell(0, 8, f"Efectivo Recibido por Técnico: ${efectivo_recibido:,.2f}", 0, 1)
-    else:
-        pdf.set_font('Arial', 'I', 11)
-        pdf.set_text_color(100, 100, 100)
-        pdf.cell(0, 8, "El técnico NO recibió dinero (Transferencia Directa).", 0, 1)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(5)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 8, f"Comision Tecnico Reportada: ${comision_tecnico:,.2f}", 0, 1)
-
-    return pdf.output(dest='S').encode('latin-1')
-
-def generar_pdf_cierre_dia(fecha_hoy, df_instalaciones, df_agenda_hoy):
-    """Genera el reporte diario SIN calcular balance"""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font('Arial', 'B', 18)
-    pdf.cell(0, 10, f'REPORTE DIARIO - {fecha_hoy}', 0, 1, 'C')
-    pdf.ln(5)
-
-    # 1. RESUMEN DE ACTIVIDAD
-    clientes = df_instalaciones['Cliente'].unique()
-    total_unidades_dia = 0
-
-    for cliente in clientes:
-        pdf.set_font('Arial', 'B', 14)
-        pdf.set_fill_color(230, 230, 230)
-        cli_str = str(cliente).encode('latin-1', 'ignore').decode('latin-1')
-        pdf.cell(0, 10, f"Cliente: {cli_str}", 1, 1, 'L', 1)
-        
-        unidades = df_instalaciones[df_instalaciones['Cliente'] == cliente]
-        pdf.set_font('Arial', '', 11)
-        for _, row in unidades.iterrows():
-            uni_str = str(row['Unidad']).encode('latin-1', 'ignore').decode('latin-1')
-            pdf.cell(10, 8, "-", 0, 0)
-            pdf.cell(0, 8, f"{uni_str}", 0, 1)
-            total_unidades_dia += 1
-        pdf.ln(3)
-
-    pdf.ln(10)
-    
-    # 2. CÁLCULOS
-    efectivo_mano = 0.0
-    total_comision_tecnico = 0.0
-    
-    if not df_agenda_hoy.empty:
-        df_agenda_hoy['Cobro_Final'] = pd.to_numeric(df_agenda_hoy['Cobro_Final'], errors='coerce').fillna(0)
-        if 'Pago_Tecnico' in df_agenda_hoy.columns:
-             df_agenda_hoy['Pago_Tecnico'] = pd.to_numeric(df_agenda_hoy['Pago_Tecnico'], errors='coerce').fillna(0)
-             total_comision_tecnico = df_agenda_hoy['Pago_Tecnico'].sum()
-
-        pagos_efectivo = df_agenda_hoy[df_agenda_hoy['Tipo_Pago'] == 'Efectivo']
-        efectivo_mano = pagos_efectivo['Cobro_Final'].sum()
-
-    # 3. TABLA DE TOTALES
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, "RESUMEN FINANCIERO DEL DÍA", 0, 1, 'C')
-    pdf.ln(5)
-
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(100, 10, "Total Servicios Realizados:", 1, 0)
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, f"{total_unidades_dia}", 1, 1, 'C')
-    
-    pdf.ln(10)
-    
-    # CUADROS FINANCIEROS
-    pdf.set_fill_color(220, 255, 220) 
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(120, 10, "EFECTIVO EN MANOS DEL TÉCNICO:", 1, 0, 'L', 1)
-    pdf.set_font('Arial', 'B', 14)
-    pdf.set_text_color(0, 100, 0) 
-    pdf.cell(0, 10, f"${efectivo_mano:,.2f}", 1, 1, 'R', 1)
-    
-    pdf.ln(5)
-    pdf.set_text_color(0, 0, 0) 
-
-    pdf.set_fill_color(220, 230, 255) 
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(120, 10, "NÓMINA / COMISIONES DEL DÍA:", 1, 0, 'L', 1)
-    pdf.set_font('Arial', 'B', 14)
-    pdf.set_text_color(0, 0, 150) 
-    pdf.cell(0, 10, f"${total_comision_tecnico:,.2f}", 1, 1, 'R', 1)
-
-    return pdf.output(dest='S').encode('latin-1')
-
 # --- VISTAS ---
 
 def vista_admin():
     st.title("👨‍💼 Panel Admin")
     
-    tab1, tab2, tab3 = st.tabs(["📅 Agendar", "🌙 Cierre del Día", "📊 Historial"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📅 Agendar", "🌙 Cierre del Día", "📊 Historial", "🩺 Métricas"])
     
     with tab1:
         with st.form("form_alta"):
@@ -269,41 +156,43 @@ def vista_admin():
             
             if st.form_submit_button("💾 Guardar Orden"):
                 try:
-                    try: df = conn.read(worksheet="Agenda_Servicios", ttl=0)
-                    except: df = pd.DataFrame(columns=["ID", "Fecha_Prog", "Hora_Prog", "Cliente", "Telefono", "Ubicacion", "Vehiculos_Desc", "Notas", "Estatus", "Cobro_Final", "Tipo_Pago", "Pago_Tecnico"])
-                    
                     id_serv = str(uuid.uuid4())[:6].upper()
-                    nuevo = pd.DataFrame([{
+                    espejo.agregar(conn, hojas.AGENDA, [{
                         "ID": id_serv, "Fecha_Prog": str(fecha_prog), "Hora_Prog": str(hora_prog),
                         "Cliente": cliente, "Telefono": tel, "Ubicacion": ubi,
                         "Vehiculos_Desc": vehiculos, "Notas": notas, "Estatus": "PENDIENTE", 
                         "Cobro_Final": 0, "Tipo_Pago": "", "Pago_Tecnico": 0
                     }])
-                    conn.update(worksheet="Agenda_Servicios", data=pd.concat([df, nuevo], ignore_index=True) if not df.empty else nuevo)
                     st.success(f"Servicio {id_serv} agendado.")
                 except Exception as e: st.error(f"Error: {e}")
 
     with tab2:
         st.subheader("🌙 Generar Reporte Diario (Cierre)")
+        # Unidades o cierres que llegaron a la hoja pero no al libro diario
+        try: desfases = libro_diario.desfases()
+        except Exception as e:
+            st.error(f"Error libro diario: {e}")
+            desfases = []
+        if desfases:
+            st.warning(f"⚠️ El libro diario no está al día ({', '.join(d['fecha'] for d in desfases)}); "
+                       "se reconstruirá al generar el cierre.\n\n" + "\n".join(f"- {d['motivo']}" for d in desfases[-5:]))
         if st.button("📩 GENERAR Y ENVIAR CIERRE", type="primary", use_container_width=True):
             hoy_str = hora_mexico().strftime("%d/%m/%Y")
+            # Solo la entrada de hoy del libro diario, sin descargar el historial
             try:
-                df_inst = conn.read(worksheet="Instalaciones", ttl=0)
-                df_inst['Fecha_DT'] = pd.to_datetime(df_inst['Fecha'], format="%d/%m/%Y", errors='coerce')
-                inst_hoy = df_inst[df_inst['Fecha_DT'].dt.date == hora_mexico().date()]
-            except: inst_hoy = pd.DataFrame()
-
-            try:
-                df_ag = conn.read(worksheet="Agenda_Servicios", ttl=0)
-                ids_hoy = inst_hoy['ID_Servicio'].unique()
-                ag_hoy = df_ag[df_ag['ID'].isin(ids_hoy)]
-                ag_hoy = ag_hoy[ag_hoy['Estatus'] == "FINALIZADO"]
-            except: ag_hoy = pd.DataFrame()
-
-            if inst_hoy.empty:
+                preparar_libro_diario(conn)
+                if desfases:
+                    with st.spinner("Reconstruyendo libro diario..."):
+                        libro_diario.reconstruir_desde_espejo(conn)
+                entrada = libro_diario.dia(hora_mexico().date())
+            except Exception as e:
+                st.error(f"Error libro diario: {e}")
+                entrada = None
+
+            if not entrada or not entrada["unidades"]:
                 st.warning("No se registraron instalaciones hoy.")
             else:
-                pdf_cierre = generar_pdf_cierre_dia(hoy_str, inst_hoy, ag_hoy)
+                pdf_cierre = reportes.generar_pdf_cierre_libro(hoy_str, entrada)
                 nombre_rep = f"REPORTE_DIARIO_{hoy_str.replace('/','-')}.pdf"
                 cuerpo = f"Adjunto encontrarás el reporte del día {hoy_str}."
                 
@@ -312,32 +201,150 @@ def vista_admin():
                 
                 if ok:
                     st.balloons()
-                    st.success("✅ Reporte enviado.")
+                    st.success("✅ Reporte en cola de envío.")
                 else: st.error(f"Error enviando correo: {msg}")
 
+        # Si la hoja se editó a mano, el libro se vuelve a derivar del historial
+        if st.button("🔄 Reconstruir libro diario"):
+            try:
+                with st.spinner("Reconstruyendo..."):
+                    dias = libro_diario.reconstruir_desde_espejo(conn)
+                st.success(f"Libro diario reconstruido ({dias} días).")
+            except Exception as e: st.error(f"Error: {e}")
+
     with tab3:
-        try: st.dataframe(conn.read(worksheet="Instalaciones", ttl=0))
-        except: st.write("Sin datos.")
+        historial()
+        if archivo.disponible():
+            with st.expander("📦 Archivo histórico"):
+                archivo_historico()
+        else: st.caption("📦 Instala pyarrow para usar el archivo histórico.")
+
+    with tab4:
+        panel_metricas()
+
+def panel_metricas():
+    """Depuración: de dónde sale el tiempo de cada clic (Sheets, fpdf, Pillow, correo)."""
+    filas = metricas.registro.resumen()
+    if filas: st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+    else: st.caption("Aún no hay mediciones en este proceso.")
+
+    cola = sincronizador(conn).estado()
+    fotos = imagenes.cache.estadisticas()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Caché de hojas", f"{conn.aciertos} aciertos", f"{conn.descargas} descargas", delta_color="off")
+    c2.metric("Caché de fotos", f"{fotos['tasa']:.0%}", f"{fotos['entradas']} guardadas", delta_color="off")
+    c3.metric("Envíos en cola", cola["pendientes"], f"{cola['fallidos']} fallidos", delta_color="off")
+    try:
+        buzon = cartero().estado()
+        c3.caption(f"Correo: {buzon['pendientes']} por enviar · {buzon['fallidos']} fallidos")
+        # Correos que se quedaron días sin poder salir: se devuelven al buzón a mano
+        if buzon["fallidos"] and c3.button("📨 Reintentar correos fallidos"):
+            st.success(f"{correo.reencolar()} correos de vuelta en el buzón.")
+    except Exception: pass
+
+    # Lo que exportó cada app (también lo lee el textfile collector de node_exporter)
+    try: exportados = sorted(n for n in os.listdir(metricas.RUTA_METRICAS) if n.endswith(".prom"))
+    except OSError: exportados = []
+    if exportados:
+        elegido = st.selectbox("Exportado", exportados)
+        with open(os.path.join(metricas.RUTA_METRICAS, elegido), encoding="utf-8") as f:
+            st.code(f.read(), language="text")
+    if st.button("🧹 Reiniciar métricas"):
+        metricas.registro.limpiar()
+        st.rerun()
+
+FILAS_POR_PAGINA = 50
+
+def historial():
+    """Instalaciones filtradas y paginadas en la base local: solo viaja una página."""
+    try: espejo.sincronizar_reciente(conn, hojas.INSTALACIONES, TTL_LECTURAS)
+    except: st.caption("⚠️ Sin conexión con la hoja: se muestra la copia local.")
+
+    f1, f2, f3 = st.columns(3)
+    rango = f1.date_input("Fechas", value=(), key="hist_rango")
+    cliente_filtro = f2.text_input("Cliente (inicio del nombre)", key="hist_cliente").strip()
+    orden_filtro = f3.text_input("ID de orden", key="hist_orden").strip().upper()
+    desde = rango[0] if len(rango) > 0 else None
+    hasta = rango[1] if len(rango) > 1 else desde
+
+    # Con otros filtros se vuelve a la primera página
+    filtros = (desde, hasta, cliente_filtro, orden_filtro)
+    if st.session_state.get("historial_filtros") != filtros:
+        st.session_state.historial_filtros = filtros
+        st.session_state.historial_cursores = [None]
+    cursores = st.session_state.historial_cursores
+
+    try:
+        donde, parametros = espejo.filtro_instalaciones(desde, hasta, cliente_filtro, orden_filtro)
+        total = espejo.contar(hojas.INSTALACIONES, donde, parametros)
+        df, siguiente = espejo.pagina(hojas.INSTALACIONES, donde, parametros, FILAS_POR_PAGINA, antes_de=cursores[-1])
+    except:
+        st.write("Sin datos.")
+        return
+
+    paginas = max(1, -(-total // FILAS_POR_PAGINA))
+    st.caption(f"{total} instalaciones · página {len(cursores)} de {paginas}")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+
+    n1, n2 = st.columns(2)
+    if n1.button("⬅️ Anterior", disabled=len(cursores) == 1, use_container_width=True):
+        cursores.pop()
+        st.rerun()
+    if n2.button("Siguiente ➡️", disabled=siguiente is None, use_container_width=True):
+        cursores.append(siguiente)
+        st.rerun()
+
+def archivo_historico():
+    """Meses ya archivados en Parquet y el botón para archivar lo terminado (requiere pyarrow)."""
+    limite = archivo.corte(hora_mexico().date())
+    st.caption(f"Las hojas guardan desde el {limite.strftime('%d/%m/%Y')}; lo finalizado antes se archiva por mes.")
+
+    meses = archivo.meses(hojas.INSTALACIONES)
+    if meses:
+        mes = st.selectbox("Mes archivado", meses[::-1])
+        inicio = datetime.strptime(mes, "%Y-%m").date()
+        fin = (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        st.dataframe(archivo.consultar(hojas.INSTALACIONES, inicio, fin), use_container_width=True, hide_index=True)
+    else:
+        st.caption("Aún no hay meses archivados.")
+
+    if st.button("📦 Archivar meses cerrados"):
+        try:
+            with st.spinner("Archivando..."):
+                movidas = archivo.archivar(conn, hoy=hora_mexico().date())
+            st.success(" · ".join(f"{espejo.TABLAS[h]}: {n}" for h, n in movidas.items()) + " filas archivadas.")
+        except Exception as e: st.error(f"Error archivando: {e}")
 
 def vista_tecnico():
     st.title("🔧 Técnico")
+    cola = sincronizador(conn).estado()
+    if cola["pendientes"]:
+        st.caption(f"📡 {cola['pendientes']} envíos guardados en el equipo, se subirán al recuperar la conexión.")
+    for fallido in envios.pendientes(estado="fallido"):
+        st.warning(f"⚠️ No se pudo subir {fallido['clave']}: {fallido['error']}")
     try:
-        df_agenda = conn.read(worksheet="Agenda_Servicios", ttl=0)
-        mis_servicios = df_agenda[df_agenda["Estatus"] == "PENDIENTE"]
+        espejo.sincronizar_reciente(conn, hojas.AGENDA, TTL_LECTURAS)
+        mis_servicios = espejo.ordenes(estatus="PENDIENTE")
     except:
-        st.error("Error conexión.")
-        return
+        # Sin conexión se trabaja con la última copia del espejo
+        st.caption("📴 Sin conexión: mostrando la última agenda descargada.")
+        try: mis_servicios = espejo.ordenes(estatus="PENDIENTE")
+        except:
+            st.error("Error conexión.")
+            return
+    mis_servicios = mis_servicios[~mis_servicios['ID'].astype(str).isin(envios.ordenes_cerrando())]
 
     if mis_servicios.empty:
         st.success("No hay pendientes.")
         return
 
-    lista = mis_servicios.apply(lambda x: f"{x['Cliente']} ({x['Vehiculos_Desc']})", axis=1)
+    # Celdas vacías llegan del espejo como None
+    lista = mis_servicios['Cliente'].fillna("").astype(str) + " (" + mis_servicios['Vehiculos_Desc'].fillna("").astype(str) + ")"
     sel = st.selectbox("Orden:", lista)
     orden = mis_servicios.loc[lista[lista == sel].index[0]]
     id_orden = orden['ID']
 
-    st.info(f"Cliente: {orden['Cliente']} | Notas: {orden['Notas']}")
+    st.info(f"Cliente: {orden['Cliente']} | Notas: {orden['Notas'] or ''}")
 
     # --- UNIDAD INDIVIDUAL ---
     with st.form("form_tec", clear_on_submit=True):
@@ -353,43 +360,70 @@ def vista_tecnico():
         if st.form_submit_button("💾 Guardar y Enviar Evidencia", type="primary"):
             if not unidad: st.warning("Falta nombre unidad.")
             else:
-                fotos = {
-                    "CHIP": procesar_imagen_subida(f_chip),
-                    "GPS": procesar_imagen_subida(f_gps),
-                    "EXTERIOR": procesar_imagen_subida(f_ext),
-                    "PLACAS": procesar_imagen_subida(f_vin),
-                    "TABLERO": procesar_imagen_subida(f_tab)
-                }
-                
                 fecha_mx = hora_mexico().strftime("%d/%m/%Y %H:%M")
                 fecha_corta_mx = hora_mexico().strftime("%d/%m/%Y")
-
-                pdf_bytes = generar_pdf_evidencia({
-                    "Orden": id_orden, "Fecha": fecha_mx,
-                    "Cliente": orden['Cliente'], "Unidad": unidad
-                }, fotos)
-                
                 nombre_archivo = f"Evidencia_{unidad.replace(' ', '_')}_{id_orden}.pdf"
-                
-                with st.spinner("📧 Enviando..."):
-                    cuerpo_mail = f"Unidad: {unidad}\nCliente: {orden['Cliente']}\nFecha: {fecha_mx}"
-                    exito, msg = enviar_reporte_email(pdf_bytes, nombre_archivo, f"Evidencia: {unidad}", cuerpo_mail)
-                
+                cuerpo_mail = f"Unidad: {unidad}\nCliente: {orden['Cliente']}\nFecha: {fecha_mx}"
+                en_resumen = modo_resumen()
+                cartero()  # se arranca aquí: los hilos de la tubería no tienen contexto de Streamlit
+
+                def encolar_correo(pdf):
+                    if en_resumen: return agregar_evidencia_a_resumen(id_orden, orden['Cliente'], pdf, nombre_archivo)
+                    return enviar_reporte_email(pdf, nombre_archivo, f"Evidencia: {unidad}", cuerpo_mail)
+
+                with st.status("Procesando evidencia...", expanded=True) as progreso:
+                    tuberia = Tuberia(al_avanzar=lambda etapa, seg, error: progreso.write(f"{'❌' if error else '✅'} {etapa}: {seg:.2f}s"))
+                    fotos, t_fotos = tuberia.etapa("Fotos", imagenes.procesar_lote, {
+                        "CHIP": f_chip, "GPS": f_gps, "EXTERIOR": f_ext,
+                        "PLACAS": f_vin, "TABLERO": f_tab
+                    }, procesar=procesar_imagen_subida)
+                    evidencia = tuberia.etapa("PDF", reportes.generar_pdf_evidencia_ajustado, {
+                        "Orden": id_orden, "Fecha": fecha_mx,
+                        "Cliente": orden['Cliente'], "Unidad": unidad
+                    }, fotos)
+                    pdf_bytes = evidencia.datos
+                    # Con el PDF listo, el correo y el registro de la unidad van al mismo tiempo.
+                    # La unidad entra retenida a la cola local: se libera como ENVIADO solo si la
+                    # evidencia quedó en el buzón (o en el resumen) y se descarta si no. Ya liberada
+                    # sube aunque no haya conexión; el libro diario se actualiza cuando llega a la hoja
+                    clave_unidad = envios.clave_unidad(id_orden, unidad)
+                    resultados = tuberia.en_paralelo({
+                        "Correo": (encolar_correo, pdf_bytes),
+                        "Registro": (envios.encolar_unidad, id_orden, {
+                            "ID_Servicio": id_orden, "Fecha": fecha_corta_mx,
+                            "Cliente": orden['Cliente'], "Unidad": unidad, "Evidencia": "ENVIADO"
+                        }, hora_mexico().date(), None, True),
+                    })
+                    exito, msg = resultados["Correo"] or (False, str(tuberia.errores.get("Correo")))
+                    registrada = resultados["Registro"]
+                    if registrada:
+                        try:
+                            if exito: envios.liberar(clave_unidad)
+                            else: envios.descartar(clave_unidad)
+                        except Exception as e: tuberia.errores["Registro"] = e
+                    progreso.update(label=f"Evidencia procesada en {tuberia.total:.2f}s",
+                                    state="error" if tuberia.errores or not exito else "complete", expanded=False)
+
                 if exito:
-                    st.toast("✅ ¡Evidencia enviada!", icon="📧")
+                    st.toast("✅ ¡Evidencia en cola de envío!", icon="📧")
                     st.session_state.pdf_ultimo = pdf_bytes
                     st.session_state.nombre_pdf_ultimo = nombre_archivo
-                    try:
-                        try: df_h = conn.read(worksheet="Instalaciones", ttl=0)
-                        except: df_h = pd.DataFrame(columns=["ID_Servicio", "Fecha", "Cliente", "Unidad", "Evidencia"])
-                        nuevo = pd.DataFrame([{
-                            "ID_Servicio": id_orden, "Fecha": fecha_corta_mx,
-                            "Cliente": orden['Cliente'], "Unidad": unidad, "Evidencia": "ENVIADO"
-                        }])
-                        conn.update(worksheet="Instalaciones", data=pd.concat([df_h, nuevo], ignore_index=True) if not df_h.empty else nuevo)
-                        st.success(f"Unidad {unidad} registrada.")
-                    except: st.error("Error Excel.")
-                else: st.error(f"❌ Error mail: {msg}")
+
+                if not exito: st.error(f"❌ Error mail: {msg}. La unidad no se registró; vuelve a enviarla.")
+                elif "Registro" in tuberia.errores: st.error(f"Error guardando la unidad: {tuberia.errores['Registro']}")
+                elif registrada: st.success(f"Unidad {unidad} registrada.")
+                else: st.info(f"La unidad {unidad} ya estaba registrada en esta orden.")
+
+                # Punta a punta contra la suma de etapas; "fotos en serie" es lo que habrían tardado una tras otra
+                st.caption(f"⏱️ Total: {tuberia.total:.2f}s (etapas en serie: {tuberia.en_serie:.2f}s) · "
+                           f"fotos en serie: {sum(t_fotos['fotos'].values()):.2f}s, {imagenes.HILOS} hilos")
+                st.caption(f"📄 PDF: {evidencia.tamano / 1024:,.0f} KB de {reportes.PRESUPUESTO_EVIDENCIA / 1024:,.0f} KB "
+                           f"(fotos a calidad {evidencia.calidad}, {evidencia.dpi} DPI) · "
+                           f"compresión {reportes.razon_compresion(evidencia):.1f}:1 frente a las fotos subidas"
+                           + ("" if evidencia.cabe else " · ⚠️ no cupo en el tope"))
+                cache_fotos = imagenes.cache.estadisticas()
+                st.caption(f"🗂️ Caché de fotos: {cache_fotos['aciertos']} aciertos / {cache_fotos['fallos']} fallos "
+                           f"({cache_fotos['tasa']:.0%}), {cache_fotos['entradas']} guardadas")
 
     if st.session_state.pdf_ultimo:
         st.download_button("📥 Descargar Copia Local", st.session_state.pdf_ultimo, st.session_state.nombre_pdf_ultimo, "application/pdf")
@@ -398,13 +432,15 @@ def vista_tecnico():
 
     # --- VISUALIZACIÓN DE PROGRESO (NUEVO) ---
     st.markdown("#### 📋 Avance de la Orden Actual")
+    try: espejo.sincronizar_reciente(conn, hojas.INSTALACIONES, TTL_LECTURAS)
+    except: pass  # sin conexión se muestra lo que hay en el espejo y en la cola
     try:
-        df_inst = conn.read(worksheet="Instalaciones", ttl=0)
-        unidades_listas = df_inst[df_inst['ID_Servicio'] == id_orden]
+        unidades_listas, en_cola = envios.unidades_de_orden(id_orden)
         
         if not unidades_listas.empty:
-            st.info(f"Llevas **{len(unidades_listas)}** vehículos registrados en esta visita.")
-            st.table(unidades_listas[['Unidad', 'Fecha']])
+            st.info(f"Llevas **{len(unidades_listas)}** vehículos registrados en esta visita"
+                    + (f" ({en_cola} por subir)." if en_cola else "."))
+            st.table(unidades_listas)
         else:
             st.caption("Aún no has registrado vehículos en esta visita.")
     except: pass
@@ -433,14 +469,13 @@ def vista_tecnico():
         
         if st.button("🔒 CERRAR ORDEN Y ENVIAR RESUMEN"):
             with st.spinner("Generando reporte final..."):
-                try:
-                    df_inst = conn.read(worksheet="Instalaciones", ttl=0)
-                    unidades_orden = df_inst[df_inst['ID_Servicio'] == id_orden]
+                # También las unidades que siguen en la cola sin conexión
+                try: unidades_orden, _ = envios.unidades_de_orden(id_orden)
                 except: unidades_orden = pd.DataFrame()
 
                 fecha_cierre = hora_mexico().strftime("%d/%m/%Y %H:%M")
                 
-                pdf_resumen = generar_pdf_resumen_final(orden['Cliente'], fecha_cierre, unidades_orden, tipo_pago, efectivo_recibido, comision_tecnico)
+                pdf_resumen = reportes.generar_pdf_resumen_final(orden['Cliente'], fecha_cierre, unidades_orden, tipo_pago, efectivo_recibido, comision_tecnico)
                 
                 cuerpo_resumen = f"""
                 SERVICIO FINALIZADO
@@ -454,21 +489,19 @@ def vista_tecnico():
                 --- NOMINA ---
                 Comisión Técnico: ${comision_tecnico:,.2f}
                 """
-                enviar_reporte_email(pdf_resumen, f"RESUMEN_{orden['Cliente']}.pdf", f"🏁 FIN DE ORDEN: {orden['Cliente']}", cuerpo_resumen)
-
+                ok_mail, msg_mail = enviar_reporte_email(pdf_resumen, f"RESUMEN_{orden['Cliente']}.pdf", f"🏁 FIN DE ORDEN: {orden['Cliente']}", cuerpo_resumen)
+                if not ok_mail: st.warning(f"⚠️ El resumen no se pudo encolar: {msg_mail}")
+                ok_res, msg_res = cerrar_resumen_evidencias(id_orden, f"Evidencias de la orden {id_orden} ({orden['Cliente']}):")
+                if not ok_res: st.warning(f"⚠️ Las evidencias pendientes no se pudieron encolar: {msg_res}")
+
+                cierre = {
+                    "Estatus": "FINALIZADO", "Cobro_Final": efectivo_recibido,
+                    "Tipo_Pago": tipo_pago, "Pago_Tecnico": comision_tecnico
+                }
                 try:
-                    df_agenda_fresh = conn.read(worksheet="Agenda_Servicios", ttl=0)
-                    if "Tipo_Pago" not in df_agenda_fresh.columns: df_agenda_fresh["Tipo_Pago"] = ""
-                    if "Pago_Tecnico" not in df_agenda_fresh.columns: df_agenda_fresh["Pago_Tecnico"] = 0.0
-                    
-                    idx_final = df_agenda_fresh[df_agenda_fresh['ID'] == id_orden].index[0]
-                    
-                    df_agenda_fresh.at[idx_final, "Estatus"] = "FINALIZADO"
-                    df_agenda_fresh.at[idx_final, "Cobro_Final"] = efectivo_recibido 
-                    df_agenda_fresh.at[idx_final, "Tipo_Pago"] = tipo_pago
-                    df_agenda_fresh.at[idx_final, "Pago_Tecnico"] = comision_tecnico
-                    
-                    conn.update(worksheet="Agenda_Servicios", data=df_agenda_fresh)
+                    # Solo las cuatro celdas de la orden, y solo si sigue pendiente; el
+                    # sincronizador la escribe (o la marca en conflicto) en segundo plano
+                    envios.encolar_cierre(id_orden, cierre, esperado={"Estatus": orden['Estatus']}, posicion=int(orden.name))
                     st.balloons()
                     st.success("✅ Orden Cerrada.")
                     st.session_state.pdf_ultimo = None 
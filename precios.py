@@ -0,0 +1,101 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import catalogo
+
+# --- MOTOR DE PRECIOS ---
+# Todas las partidas de una cotización se calculan juntas como columnas: precio de
+# lista, escalas por volumen, precio de flotilla, precio tachado, importes e IVA.
+# Una partida es {"id": producto del catálogo o None, "cant", "precio" (manual,
+# opcional) y "desc" (obligatoria si no es del catálogo)}.
+COLUMNAS = ["id", "cant", "precio", "desc"]
+
+Cotizacion = namedtuple("Cotizacion", ["lineas", "subtotal", "iva", "total"])
+
+_productos = pd.DataFrame.from_dict(catalogo.CATALOGO, orient="index")
+
+def _escalas(precio_lista, ids, cant, libres, escalas):
+    """Precio por volumen de cada partida (inf donde no aplica ninguna escala)."""
+    precio = np.full(len(ids), np.inf)
+    for id_producto, tramos in escalas.items():
+        filas = np.flatnonzero((ids == id_producto) & libres)
+        if not len(filas) or not tramos: continue
+        minimos, precios = (np.asarray(v, dtype=float) for v in zip(*sorted(tramos)))
+        pos = np.searchsorted(minimos, cant[filas], side="right") - 1
+        precio[filas] = np.where(pos >= 0, precios[pos.clip(0)], np.inf)
+    return precio
+
+def cotizar(partidas, lleva_iva=False, flotilla=False, escalas=None):
+    """Calcula todas las partidas de una vez; devuelve una Cotizacion."""
+    escalas = catalogo.ESCALAS if escalas is None else escalas
+    lineas = pd.DataFrame(list(partidas), columns=COLUMNAS)
+    ids = pd.to_numeric(lineas["id"], errors="coerce").to_numpy()
+    cant = lineas["cant"].fillna(0).astype(int).to_numpy()
+    manual = pd.to_numeric(lineas["precio"], errors="coerce").to_numpy(dtype=float)
+
+    del_catalogo = _productos.reindex(ids)
+    precio_lista = np.where(np.isnan(manual), del_catalogo["precio"].to_numpy(dtype=float), manual)
+    # Los precios capturados a mano no reciben descuentos
+    libres = np.isnan(manual) & ~np.isnan(ids)
+
+    unitario = np.minimum(precio_lista, _escalas(precio_lista, ids, cant, libres, escalas))
+    de_flotilla = np.zeros(len(ids), dtype=bool)
+    if flotilla:
+        precio_flotilla = pd.Series(catalogo.PRECIOS_FLOTILLA, dtype=float).reindex(ids).to_numpy()
+        de_flotilla = libres & (precio_flotilla < unitario)
+        unitario = np.where(de_flotilla, precio_flotilla, unitario)
+
+    descripcion = lineas["desc"].where(lineas["desc"].notna(), del_catalogo["nombre"].to_numpy()).fillna("")
+    lineas = pd.DataFrame({
+        "id": lineas["id"],
+        "cant": cant,
+        "desc": np.where(de_flotilla, descripcion + catalogo.LEYENDA_FLOTILLA, descripcion),
+        "unitario": unitario,
+        "total": unitario * cant,
+        "original": np.where(unitario < precio_lista, precio_lista, np.nan),
+    })
+    subtotal = float(lineas["total"].sum())
+    iva = subtotal * catalogo.TASA_IVA if lleva_iva else 0.0
+    return Cotizacion(lineas, subtotal, iva, subtotal + iva)
+
+def a_carrito(lineas):
+    """Partidas calculadas en el formato de carrito que usa generar_pdf."""
+    return [
+        {"cant": int(c), "desc": d, "unitario": float(u), "total": float(t), "original": None if np.isnan(o) else float(o)}
+        for c, d, u, t, o in zip(lineas["cant"], lineas["desc"], lineas["unitario"], lineas["total"], lineas["original"])
+    ]
+
+# --- CARRITO DEL CONFIGURADOR ---
+def partida(cant, desc, unitario, original=None):
+    """Partida ya calculada (conceptos libres)."""
+    return {"cant": cant, "desc": desc, "unitario": unitario, "total": unitario * cant, "original": original}
+
+def armar_carrito(cant_gps=0, tipo_plan="Anual", desc_flotilla=False, precio_gps=None, precio_plan=None,
+                  extras=(), conceptos=(), costo_envio=0, lleva_iva=False):
+    """Carrito con las reglas del configurador; devuelve (carrito, Cotizacion).
+
+    `precio_gps` / `precio_plan` (modo libre) sustituyen los precios de catálogo
+    y no reciben descuentos. `extras` son tuplas (id, cantidad, precio o None) y
+    `conceptos` partidas ya armadas (tabla de conceptos personalizados).
+    """
+    partidas = []
+    if cant_gps > 0:
+        id_plan = catalogo.ID_ANUAL if "Anual" in tipo_plan else catalogo.ID_MENSUAL
+        partidas.append({"id": catalogo.ID_GPS, "cant": cant_gps, "precio": precio_gps})
+        partidas.append({"id": id_plan, "cant": cant_gps, "precio": precio_plan})
+    partidas.extend({"id": k, "cant": c, "precio": p} for k, c, p in extras if c > 0)
+    partidas.extend({"id": None, "cant": c["cant"], "precio": c["unitario"], "desc": c["desc"]} for c in conceptos)
+    if costo_envio > 0:
+        partidas.append({"id": None, "cant": 1, "precio": costo_envio, "desc": catalogo.DESC_VIATICOS})
+
+    resultado = cotizar(partidas, lleva_iva=lleva_iva, flotilla=desc_flotilla)
+    return a_carrito(resultado.lineas), resultado
+
+def resumen(carrito, lleva_iva):
+    """(subtotal, iva, total) de un carrito ya armado."""
+    subtotal = sum(item['total'] for item in carrito)
+    iva = subtotal * catalogo.TASA_IVA if lleva_iva else 0
+    return subtotal, iva, subtotal + iva
+
+def total_venta(carrito, lleva_iva):
+    return resumen(carrito, lleva_iva)[2]
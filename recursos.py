@@ -0,0 +1,51 @@
+"""Estado fijo de las apps, armado una vez por proceso y no en cada rerun.
+
+Streamlit vuelve a correr el script completo con cada clic. Lo que no depende
+de lo que captura el usuario (logo ya escalado, catálogo listo para mostrarse,
+plantilla del PDF, configuración del correo) se prepara aquí; las apps lo
+guardan con st.cache_resource.
+"""
+import io
+import os
+import threading
+from collections import namedtuple
+from PIL import Image
+import catalogo
+import cotizacion
+
+# --- CONFIGURACIÓN ---
+ANCHO_LOGO = 150   # pixeles con los que se muestra el logo en la app
+
+# Producto del catálogo con el título de una línea que se muestra en los widgets
+Producto = namedtuple("Producto", ["id", "titulo", "precio", "alias"])
+Recursos = namedtuple("Recursos", ["logo", "adicionales", "correo"])
+
+# --- CARGA ---
+def logo(ancho=ANCHO_LOGO, ruta=cotizacion.RUTA_LOGO):
+    """PNG del logo ya escalado a `ancho` (None si no hay logo).
+
+    st.image decodifica y escala el archivo original en cada rerun; con los
+    bytes a su tamaño final solo lee la cabecera.
+    """
+    if not os.path.exists(ruta): return None
+    with Image.open(ruta) as imagen:
+        alto = max(1, round(imagen.height * ancho / imagen.width))
+        imagen = imagen.resize((ancho, alto), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    imagen.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+def adicionales():
+    """Productos que no arma el configurador de GPS, en el orden del catálogo."""
+    return tuple(Producto(k, v["nombre"].split("\n")[0], v["precio"], v["alias"])
+                 for k, v in catalogo.adicionales().items())
+
+def cargar(correo=None, plantilla=False):
+    """Todo lo fijo de una app; `correo` es la sección [correo] de secrets.toml (o None).
+
+    Con `plantilla`, la del PDF de cotización se compila en un hilo aparte: tarda
+    un par de segundos y así no retrasa la primera pantalla (el primer PDF la
+    espera si aún no termina).
+    """
+    if plantilla: threading.Thread(target=cotizacion.plantilla, name="plantilla-pdf", daemon=True).start()
+    return Recursos(logo=logo(), adicionales=adicionales(), correo=dict(correo or {}))
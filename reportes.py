@@ -0,0 +1,235 @@
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+import imagenes
+import metricas
+
+# --- REPORTES DE OPERACIÓN ---
+def _latin1(serie):
+    """Texto imprimible por las fuentes base de FPDF (lo demás se descarta)."""
+    return serie.astype(str).str.encode('latin-1', 'ignore').str.decode('latin-1')
+
+def _latin1_texto(texto):
+    return str(texto).encode('latin-1', 'ignore').decode('latin-1')
+
+def _numerico(df, columna):
+    if columna not in df.columns: return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[columna], errors='coerce').fillna(0).astype(float)
+
+def agrupar_instalaciones(df_instalaciones):
+    """[(cliente, [unidades...]), ...] en orden de aparición, con una sola pasada.
+
+    Los clientes conservan el orden en que aparecen por primera vez y las
+    unidades de cada uno su orden en la hoja.
+    """
+    if df_instalaciones.empty: return []
+    codigos, clientes = pd.factorize(df_instalaciones['Cliente'], use_na_sentinel=False)
+    orden = np.argsort(codigos, kind="stable")
+    unidades = _latin1(df_instalaciones['Unidad']).to_numpy()[orden]
+    cortes = np.cumsum(np.bincount(codigos, minlength=len(clientes)))[:-1]
+    nombres = _latin1(pd.Series(clientes)).tolist()
+    return list(zip(nombres, (u.tolist() for u in np.split(unidades, cortes))))
+
+def totales_dia(df_agenda_hoy):
+    """(efectivo en manos del técnico, comisiones) sin modificar el DataFrame recibido."""
+    if df_agenda_hoy.empty: return 0.0, 0.0
+    cobro = _numerico(df_agenda_hoy, 'Cobro_Final')
+    efectivo = df_agenda_hoy['Tipo_Pago'].eq('Efectivo') if 'Tipo_Pago' in df_agenda_hoy.columns else False
+    return float(cobro[efectivo].sum()), float(_numerico(df_agenda_hoy, 'Pago_Tecnico').sum())
+
+def generar_pdf_cierre_dia(fecha_hoy, df_instalaciones, df_agenda_hoy):
+    """Genera el reporte diario SIN calcular balance"""
+    efectivo_mano, total_comision_tecnico = totales_dia(df_agenda_hoy)
+    return pdf_cierre(fecha_hoy, agrupar_instalaciones(df_instalaciones), efectivo_mano, total_comision_tecnico)
+
+def generar_pdf_cierre_libro(fecha_hoy, entrada):
+    """Reporte diario a partir de la entrada del libro diario (libro_diario.dia)."""
+    grupos = [(_latin1_texto(c), [_latin1_texto(u) for u in unidades]) for c, unidades in entrada["clientes"]]
+    return pdf_cierre(fecha_hoy, grupos, entrada["efectivo"], entrada["comisiones"])
+
+@metricas.instrumentar("pdf_cierre_dia", carga=metricas.bytes_de)
+def pdf_cierre(fecha_hoy, grupos, efectivo_mano, total_comision_tecnico):
+    """Dibuja el cierre: `grupos` es [(cliente, [unidades])] ya en latin-1."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 18)
+    pdf.cell(0, 10, f'REPORTE DIARIO - {fecha_hoy}', 0, 1, 'C')
+    pdf.ln(5)
+
+    # 1. RESUMEN DE ACTIVIDAD
+    total_unidades_dia = sum(len(unidades) for _, unidades in grupos)
+
+    for cli_str, unidades in grupos:
+        pdf.set_font('Arial', 'B', 14)
+        pdf.set_fill_color(230, 230, 230)
+        pdf.cell(0, 10, f"Cliente: {cli_str}", 1, 1, 'L', 1)
+        pdf.set_font('Arial', '', 11)
+        for uni_str in unidades:
+            pdf.cell(10, 8, "-", 0, 0)
+            pdf.cell(0, 8, uni_str, 0, 1)
+        pdf.ln(3)
+
+    pdf.ln(10)
+
+    # 2. TABLA DE TOTALES
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, "RESUMEN FINANCIERO DEL DÍA", 0, 1, 'C')
+    pdf.ln(5)
+
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(100, 10, "Total Servicios Realizados:", 1, 0)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, f"{total_unidades_dia}", 1, 1, 'C')
+
+    pdf.ln(10)
+
+    # CUADROS FINANCIEROS
+    pdf.set_fill_color(220, 255, 220)
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(120, 10, "EFECTIVO EN MANOS DEL TÉCNICO:", 1, 0, 'L', 1)
+    pdf.set_font('Arial', 'B', 14)
+    pdf.set_text_color(0, 100, 0)
+    pdf.cell(0, 10, f"${efectivo_mano:,.2f}", 1, 1, 'R', 1)
+
+    pdf.ln(5)
+    pdf.set_text_color(0, 0, 0)
+
+    pdf.set_fill_color(220, 230, 255)
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(120, 10, "NÓMINA / COMISIONES DEL DÍA:", 1, 0, 'L', 1)
+    pdf.set_font('Arial', 'B', 14)
+    pdf.set_text_color(0, 0, 150)
+    pdf.cell(0, 10, f"${total_comision_tecnico:,.2f}", 1, 1, 'R', 1)
+
+    return pdf.output(dest='S').encode('latin-1')
+
+# --- EVIDENCIAS Y RESUMEN DE ORDEN ---
+class PDFReporte(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 14)
+        self.cell(0, 10, 'REPORTE DE EVIDENCIA', 0, 1, 'C')
+        self.ln(5)
+
+@metricas.instrumentar("pdf_evidencia", carga=metricas.bytes_de)
+def generar_pdf_evidencia(datos, fotos):
+    pdf = PDFReporte()
+    pdf.add_page()
+    pdf.set_font('Arial', '', 11)
+    for key, value in datos.items():
+        pdf.set_font('Arial', 'B', 11)
+        pdf.cell(50, 8, f"{key}:", 0, 0)
+        pdf.set_font('Arial', '', 11)
+        texto_limpio = str(value).encode('latin-1', 'ignore').decode('latin-1')
+        pdf.cell(0, 8, texto_limpio, 0, 1)
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, "EVIDENCIA FOTOGRÁFICA:", 0, 1)
+    x_start, y_start = 10, pdf.get_y()
+    x, y = x_start, y_start
+    for nombre_foto, foto in fotos.items():
+        if foto:
+            pdf.set_font('Arial', 'B', 10) 
+            pdf.set_xy(x, y)
+            pdf.cell(90, 5, nombre_foto, 0, 1)
+            try: imagenes.insertar_en_pdf(pdf, foto, x=x, y=y+6, w=imagenes.CAJA_MM[0], h=imagenes.CAJA_MM[1])
+            except: pass
+            if x == x_start: x = 110 
+            else:
+                x = x_start
+                y += 75 
+            if y > 240:
+                pdf.add_page()
+                y, x = 20, x_start
+    return pdf.output(dest='S').encode('latin-1')
+
+# Tope de tamaño por PDF de evidencia (COTIZADOR_EVIDENCIA_KB). Si no cabe, las fotos
+# se recomprimen por escalones: primero baja la calidad y luego el DPI de la caja.
+PRESUPUESTO_EVIDENCIA = int(float(os.environ.get("COTIZADOR_EVIDENCIA_KB", 300)) * 1024)
+ESCALONES = ((imagenes.CALIDAD, imagenes.DPI), (60, 150), (50, 150), (50, 120), (40, 120), (40, 100), (30, 100), (30, 72))
+
+# El PDF más los datos para informarlo: tamaño final, peso de las fotos subidas y escalón usado
+PDFEvidencia = namedtuple("PDFEvidencia", ["datos", "tamano", "original", "calidad", "dpi", "cabe"])
+
+def _fotos_en_escalon(fotos, calidad, dpi):
+    if (calidad, dpi) == ESCALONES[0]: return fotos
+    return {n: imagenes.recomprimir(f, calidad, dpi) if isinstance(f, imagenes.ImagenProcesada) else f
+            for n, f in fotos.items()}
+
+def _peso_fotos(fotos):
+    return sum(len(f.datos) for f in fotos.values() if isinstance(f, imagenes.ImagenProcesada))
+
+@metricas.instrumentar("pdf_evidencia_ajustado", carga=lambda r: {"bytes": r.tamano, "bytes_fotos": r.original})
+def generar_pdf_evidencia_ajustado(datos, fotos, presupuesto=PRESUPUESTO_EVIDENCIA):
+    """Como generar_pdf_evidencia, pero sin rebasar `presupuesto` bytes (None = sin tope).
+
+    El PDF se arma una vez para medir lo que no son fotos; cada escalón solo
+    recodifica las fotos y se arma de nuevo cuando ya caben. Si ni el último
+    escalón cabe, se entrega ese con `cabe=False`.
+    """
+    pdf = generar_pdf_evidencia(datos, fotos)
+    calidad, dpi = ESCALONES[0]
+    if presupuesto is not None and len(pdf) > presupuesto:
+        resto = len(pdf) - _peso_fotos(fotos)
+        for calidad, dpi in ESCALONES[1:]:
+            ajustadas = _fotos_en_escalon(fotos, calidad, dpi)
+            if resto + _peso_fotos(ajustadas) <= presupuesto: break
+        pdf = generar_pdf_evidencia(datos, ajustadas)
+    original = sum(f.original for f in fotos.values() if isinstance(f, imagenes.ImagenProcesada))
+    return PDFEvidencia(pdf, len(pdf), original, calidad, dpi, presupuesto is None or len(pdf) <= presupuesto)
+
+def razon_compresion(evidencia):
+    """Cuántas veces más pesaban las fotos subidas que el PDF final (0 si no se conoce)."""
+    return evidencia.original / evidencia.tamano if evidencia.original and evidencia.tamano else 0.0
+
+@metricas.instrumentar("pdf_resumen_final", carga=metricas.bytes_de)
+def generar_pdf_resumen_final(cliente, fecha, unidades_df, metodo_pago, efectivo_recibido, comision_tecnico):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 16)
+    pdf.cell(0, 10, 'RESUMEN FINAL DE ORDEN', 0, 1, 'C')
+    pdf.ln(10)
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(0, 8, f"Cliente: {str(cliente).encode('latin-1', 'ignore').decode('latin-1')}", 0, 1)
+    pdf.cell(0, 8, f"Fecha: {fecha}", 0, 1)
+    pdf.ln(10)
+    
+    # Tabla Unidades
+    pdf.set_font('Arial', 'B', 12)
+    pdf.set_fill_color(200, 220, 255)
+    pdf.cell(10, 10, "#", 1, 0, 'C', 1)
+    pdf.cell(100, 10, "UNIDAD", 1, 0, 'L', 1)
+    pdf.cell(80, 10, "FECHA", 1, 1, 'C', 1)
+    pdf.set_font('Arial', '', 11)
+    count = 1
+    for index, row in unidades_df.iterrows():
+        unidad_limpia = str(row['Unidad']).encode('latin-1', 'ignore').decode('latin-1')
+        pdf.cell(10, 10, str(count), 1, 0, 'C')
+        pdf.cell(100, 10, f" {unidad_limpia}", 1, 0, 'L')
+        pdf.cell(80, 10, str(row['Fecha']), 1, 1, 'C')
+        count += 1
+    pdf.ln(15)
+    
+    # Finanzas
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, "DETALLE FINANCIERO:", 0, 1)
+    pdf.set_font('Arial', '', 12)
+    
+    pdf.cell(0, 8, f"Forma de Pago del Cliente: {metodo_pago}", 0, 1)
+    
+    if metodo_pago == "Efectivo":
+        pdf.set_font('Arial', 'B', 12)
+        pdf.set_text_color(0, 100, 0)
+        pdf.cell(0, 8, f"Efectivo Recibido por Técnico: ${efectivo_recibido:,.2f}", 0, 1)
+    else:
+        pdf.set_font('Arial', 'I', 11)
+        pdf.set_text_color(100, 100, 100)
+        pdf.cell(0, 8, "El técnico NO recibió dinero (Transferencia Directa).", 0, 1)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(5)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 8, f"Comision Tecnico Reportada: ${comision_tecnico:,.2f}", 0, 1)
+
+    return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,156 @@
+"""Cartero: drena el buzón hacia un SMTP falso en el mismo proceso."""
+import os
+import smtplib
+import time
+import pytest
+import correo
+
+class SMTPFalso:
+    """Doble de smtplib.SMTP: guarda lo enviado y puede fallar los primeros `fallas` envíos."""
+    sesiones = []
+    enviados = []
+    fallas = 0
+    noop_codigo = 250
+
+    def __init__(self, servidor, puerto, timeout=None):
+        self.servidor, self.puerto = servidor, puerto
+        self.cerrada = False
+        SMTPFalso.sesiones.append(self)
+
+    def starttls(self): pass
+    def login(self, usuario, password): pass
+
+    def noop(self):
+        return (SMTPFalso.noop_codigo, b"OK")
+
+    def send_message(self, mensaje):
+        if SMTPFalso.fallas > 0:
+            SMTPFalso.fallas -= 1
+            raise smtplib.SMTPServerDisconnected("desconectado (simulado)")
+        SMTPFalso.enviados.append(mensaje)
+
+    def quit(self):
+        self.cerrada = True
+
+@pytest.fixture
+def smtp(monkeypatch):
+    SMTPFalso.sesiones, SMTPFalso.enviados, SMTPFalso.fallas, SMTPFalso.noop_codigo = [], [], 0, 250
+    monkeypatch.setattr(correo.smtplib, "SMTP", SMTPFalso)
+    return SMTPFalso
+
+@pytest.fixture
+def cartero(tmp_path):
+    return correo.Cartero({"servidor": "localhost", "puerto": 2525, "starttls": False}, ruta=str(tmp_path))
+
+def encolar(cartero, asunto):
+    return correo.encolar(correo.construir_mensaje("a@example.com", "b@example.com", asunto, "cuerpo",
+                                                   [("evidencia.pdf", b"%PDF-1.4")]), cartero.ruta)
+
+def test_drena_todo_con_una_sola_sesion(smtp, cartero):
+    for i in range(3): encolar(cartero, f"Correo {i}")
+    assert cartero.drenar() is None
+    assert [m["Subject"] for m in smtp.enviados] == ["Correo 0", "Correo 1", "Correo 2"]
+    assert len(smtp.sesiones) == 1
+    assert correo.pendientes(cartero.ruta) == []
+    assert cartero.estado()["enviados"] == 3
+
+def test_reutiliza_la_sesion_entre_ciclos(smtp, cartero):
+    encolar(cartero, "Primero")
+    cartero.drenar()
+    encolar(cartero, "Segundo")
+    cartero.drenar()
+    assert len(smtp.sesiones) == 1 and len(smtp.enviados) == 2
+
+def test_reconecta_si_la_sesion_murio(smtp, cartero):
+    encolar(cartero, "Primero")
+    cartero.drenar()
+    smtp.noop_codigo = 421
+    encolar(cartero, "Segundo")
+    cartero.drenar()
+    assert len(smtp.sesiones) == 2 and smtp.sesiones[0].cerrada
+
+def test_reintenta_con_espera(smtp, cartero):
+    smtp.fallas = 1
+    nombre = encolar(cartero, "Con falla")
+    assert cartero.drenar() == correo.ESPERA_BASE
+    assert correo.pendientes(cartero.ruta) == [nombre]
+    assert cartero.estado()["errores"] == 1 and "simulado" in cartero.ultimo_error
+    # Antes de la espera no se vuelve a intentar
+    cartero.drenar()
+    assert smtp.enviados == []
+    # Ya vencida la espera sale con una sesión nueva (la fallida se cerró)
+    cartero._reintentos[nombre] = (1, 0.0)
+    assert cartero.drenar() is None
+    assert len(smtp.enviados) == 1 and len(smtp.sesiones) == 2
+    assert correo.pendientes(cartero.ruta) == []
+
+def test_cuenta_los_intentos_de_cada_correo(smtp, cartero, monkeypatch):
+    monkeypatch.setattr(correo, "ESPERA_BASE", 0)
+    smtp.fallas = 2
+    encolar(cartero, "Dos fallas")
+    cartero.drenar()
+    cartero.drenar()
+    assert cartero._reintentos and list(cartero._reintentos.values())[0][0] == 2
+    cartero.drenar()
+    assert len(smtp.enviados) == 1 and not cartero._reintentos
+
+def envejecer(cartero, nombre, segundos):
+    """Renombra el correo como si se hubiera encolado hace `segundos`."""
+    carpeta = os.path.join(cartero.ruta, "pendientes")
+    viejo = f"{time.time_ns() - int(segundos * 1e9)}-{nombre.split('-', 1)[1]}"
+    os.replace(os.path.join(carpeta, nombre), os.path.join(carpeta, viejo))
+    return viejo
+
+def test_sin_conexion_sigue_reintentando(smtp, cartero, monkeypatch):
+    monkeypatch.setattr(correo, "ESPERA_BASE", 0)
+    smtp.fallas = 50
+    nombre = encolar(cartero, "Sin señal")
+    for _ in range(50): cartero.drenar()
+    assert correo.pendientes(cartero.ruta) == [nombre] and correo.fallidos(cartero.ruta) == []
+    cartero.drenar()
+    assert len(smtp.enviados) == 1 and cartero.errores == 50
+
+def test_la_espera_tiene_tope(smtp, cartero):
+    smtp.fallas = 1
+    nombre = encolar(cartero, "Muchas fallas")
+    cartero._reintentos[nombre] = (30, 0.0)
+    assert cartero.drenar() == correo.ESPERA_MAX
+
+def test_se_rinde_con_los_viejos_y_se_pueden_reencolar(smtp, cartero):
+    smtp.fallas = 1
+    nombre = envejecer(cartero, encolar(cartero, "Muy viejo"), correo.RENDIRSE_TRAS + 60)
+    cartero.drenar()
+    assert correo.pendientes(cartero.ruta) == [] and correo.fallidos(cartero.ruta) == [nombre]
+    assert cartero.estado()["fallidos"] == 1 and smtp.enviados == []
+
+    assert correo.reencolar(cartero.ruta) == 1
+    assert correo.fallidos(cartero.ruta) == []
+    (nuevo,) = correo.pendientes(cartero.ruta)
+    assert nuevo != nombre and nuevo.split("-", 1)[1] == nombre.split("-", 1)[1]
+    # Vuelve como recién encolado: una falla más no lo regresa a fallidos
+    smtp.fallas = 1
+    cartero.drenar()
+    assert correo.pendientes(cartero.ruta) == [nuevo]
+    cartero._reintentos[nuevo] = (1, 0.0)
+    cartero.drenar()
+    assert [m["Subject"] for m in smtp.enviados] == ["Muy viejo"] and cartero.estado()["fallidos"] == 0
+
+def test_un_fallido_no_detiene_a_los_demas(smtp, cartero):
+    smtp.fallas = 1
+    encolar(cartero, "Falla")
+    encolar(cartero, "Pasa")
+    cartero.drenar()
+    assert [m["Subject"] for m in smtp.enviados] == ["Pasa"]
+    assert len(correo.pendientes(cartero.ruta)) == 1
+
+def test_el_hilo_drena_lo_que_se_encola(smtp, cartero):
+    cartero.start()
+    try:
+        encolar(cartero, "En segundo plano")
+        limite = time.monotonic() + 5
+        while not smtp.enviados and time.monotonic() < limite: time.sleep(0.01)
+    finally:
+        cartero.detener()
+        cartero.join(5)
+    assert [m["Subject"] for m in smtp.enviados] == ["En segundo plano"]
+    assert not cartero.is_alive() and smtp.sesiones[0].cerrada
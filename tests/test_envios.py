@@ -0,0 +1,52 @@
+"""Cola local de unidades y cierres."""
+import pytest
+import envios
+import espejo
+import hojas
+import reportes
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "cola.db")
+
+def fila(unidad, id_orden="S1"):
+    return {"ID_Servicio": id_orden, "Fecha": "18/10/2026", "Cliente": "Cliente", "Unidad": unidad, "Evidencia": "ENVIADO"}
+
+def test_la_misma_unidad_no_se_encola_dos_veces(ruta):
+    assert envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta)
+    assert not envios.encolar_unidad("S1", fila(" u1 "), "2026-10-18", ruta)
+    assert [p["clave"] for p in envios.pendientes(envios.UNIDAD, "S1", ruta=ruta)] == [envios.clave_unidad("S1", "U1")]
+
+def test_retenida_no_sube_hasta_liberarla(ruta):
+    clave = envios.clave_unidad("S1", "U1")
+    assert envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta, retener=True)
+    assert envios.pendientes(envios.UNIDAD, ruta=ruta) == []
+    assert envios.liberar(clave, ruta)
+    assert [p["clave"] for p in envios.pendientes(envios.UNIDAD, ruta=ruta)] == [clave]
+    assert not envios.liberar(clave, ruta)
+    # Ya pendiente no se puede descartar
+    assert not envios.descartar(clave, ruta)
+
+def test_retenida_descartada_se_puede_volver_a_encolar(ruta):
+    clave = envios.clave_unidad("S1", "U1")
+    envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta, retener=True)
+    assert envios.descartar(clave, ruta)
+    assert envios.conteo(ruta) == {}
+    # Una retenida que nunca se liberó (la app se cerró) tampoco bloquea el reintento
+    envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta, retener=True)
+    assert envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta, retener=True)
+    assert envios.liberar(clave, ruta)
+
+def test_cierre_cuenta_las_unidades_aun_en_cola(ruta):
+    espejo.registrar(hojas.INSTALACIONES, [fila("U1")], ruta=ruta)
+    envios.encolar_unidad("S1", fila("U1"), "2026-10-18", ruta)   # ya subió, aún sin marcar
+    envios.encolar_unidad("S1", fila("U2"), "2026-10-18", ruta)   # sin conexión
+    envios.encolar_unidad("S2", fila("X9", "S2"), "2026-10-18", ruta)
+    unidades, por_subir = envios.unidades_de_orden("S1", ruta)
+    assert list(unidades["Unidad"]) == ["U1", "U2"] and por_subir == 1
+    pdf = reportes.generar_pdf_resumen_final("Cliente", "18/10/2026 18:00", unidades, "Efectivo", 500, 100)
+    assert pdf[:4] == b"%PDF"
+
+def test_orden_sin_unidades(ruta):
+    unidades, por_subir = envios.unidades_de_orden("S1", ruta)
+    assert unidades.empty and list(unidades.columns) == ["Unidad", "Fecha"] and por_subir == 0
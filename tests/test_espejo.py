@@ -0,0 +1,81 @@
+"""Espejo local: la misma fila da los mismos valores y la misma huella por cualquier lectura."""
+import pandas as pd
+import pytest
+import base_local
+import espejo
+import hojas
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "espejo.db")
+
+def cotizaciones_tipadas():
+    # Como llegan de conn.read: números de pandas
+    return pd.DataFrame({"Fecha": ["01/10/2026", "02/10/2026"], "Folio": [150, 151], "Cliente": ["A", "B"],
+                         "Total": [100.0, 2550.5], "Telefono": [5551234567.0, float("nan")]})
+
+def cotizaciones_texto():
+    # Como llegan de gspread (get_values): el texto de la hoja
+    return pd.DataFrame({"Fecha": ["01/10/2026", "02/10/2026"], "Folio": ["150", "151"], "Cliente": ["A", "B"],
+                         "Total": ["$100.00", "2,550.50"], "Telefono": ["5551234567", ""]})
+
+def test_canonica_iguala_tipos_y_texto():
+    tipadas = espejo._canonica(cotizaciones_tipadas(), hojas.COTIZACIONES)
+    texto = espejo._canonica(cotizaciones_texto(), hojas.COTIZACIONES)
+    assert tipadas.values.tolist() == texto.values.tolist() == [
+        ["01/10/2026", 150, "A", 100, "5551234567"], ["02/10/2026", 151, "B", 2550.5, None]]
+    assert (espejo._huellas(tipadas) == espejo._huellas(texto)).all()
+
+def test_sincronizar_por_cualquier_lectura_no_reescribe(ruta):
+    espejo.sincronizar(hojas.ConexionLocal({hojas.COTIZACIONES: cotizaciones_texto()}), hojas.COTIZACIONES, ruta=ruta)
+    assert espejo.sincronizar(hojas.ConexionLocal({hojas.COTIZACIONES: cotizaciones_tipadas()}), hojas.COTIZACIONES,
+                              completo=True, ruta=ruta) == 0
+    df = espejo.consultar(hojas.COTIZACIONES, '"Folio" = ?', (150,), ruta=ruta)
+    assert df.iloc[0]["Total"] == 100 and df.iloc[0]["Telefono"] == "5551234567"
+
+def test_filas_de_la_app_quedan_en_la_misma_forma(ruta):
+    espejo.registrar(hojas.INSTALACIONES, [{"ID_Servicio": 7, "Fecha": "01/10/2026", "Cliente": "A", "Unidad": 12}], ruta=ruta)
+    assert list(espejo.instalaciones_de_orden("7", ruta=ruta)["Unidad"]) == ["12"]
+    assert list(espejo.instalaciones_de_orden(7, ruta=ruta)["Unidad"]) == ["12"]
+
+def test_texto_que_no_es_numero_se_conserva():
+    assert espejo._canonico(hojas.COTIZACIONES, "Total", "pendiente") == "pendiente"
+    assert espejo._canonico(hojas.AGENDA, "Estatus", True) == "TRUE"
+
+def instalaciones(*clientes):
+    return [{"ID_Servicio": f"S{i}", "Fecha": "18/10/2026", "Cliente": c, "Unidad": f"U{i}"} for i, c in enumerate(clientes)]
+
+def clientes_con(prefijo, ruta):
+    donde, parametros = espejo.filtro_instalaciones(cliente=prefijo)
+    return sorted(espejo.consultar(hojas.INSTALACIONES, donde, parametros, ruta=ruta)["Cliente"])
+
+def test_filtro_de_cliente_sin_distinguir_mayusculas(ruta):
+    espejo.registrar(hojas.INSTALACIONES, instalaciones("ACME Logística", "Acme del Norte", "acmé", "Bimbo"), ruta=ruta)
+    assert clientes_con("acme", ruta) == ["ACME Logística", "Acme del Norte"]
+    assert clientes_con("ACME L", ruta) == ["ACME Logística"]
+    assert clientes_con("Acmé", ruta) == ["acmé"]
+    assert clientes_con("bim", ruta) == ["Bimbo"]
+
+def test_filtro_de_cliente_sigue_los_cambios(ruta):
+    espejo.registrar(hojas.INSTALACIONES, instalaciones("Acme"), ruta=ruta)
+    espejo.actualizar(hojas.INSTALACIONES, "ID_Servicio", "S0", {"Cliente": "Bimbo"}, ruta=ruta)
+    assert clientes_con("acme", ruta) == [] and clientes_con("BIMBO", ruta) == ["Bimbo"]
+
+def test_filtro_de_cliente_usa_indice(ruta):
+    espejo.registrar(hojas.INSTALACIONES, instalaciones("Acme"), ruta=ruta)
+    donde, parametros = espejo.filtro_instalaciones(cliente="acme")
+    con = base_local.conectar(ruta)
+    try: plan = " ".join(str(f[-1]) for f in con.execute(f"EXPLAIN QUERY PLAN SELECT * FROM instalaciones WHERE {donde}", parametros))
+    finally: con.close()
+    assert "ix_instalaciones__buscar" in plan
+
+def test_espejo_anterior_se_completa(ruta):
+    con = base_local.conectar(ruta)
+    try:
+        con.execute('CREATE TABLE instalaciones (_fila INTEGER PRIMARY KEY, _hash INTEGER, _fecha TEXT, _local INTEGER DEFAULT 0, '
+                    '"ID_Servicio", "Fecha", "Cliente", "Unidad", "Evidencia")')
+        con.execute("INSERT INTO instalaciones (_fila, ID_Servicio, Cliente, Unidad) VALUES (0, 'S1', 'Acme', 'U1')")
+        con.commit()
+    finally: con.close()
+    espejo._preparadas.clear()
+    assert clientes_con("ACME", ruta) == ["Acme"]
@@ -0,0 +1,116 @@
+"""Escritura por filas (agregar, borrar, actualizar) contra hojas.ConexionLocal."""
+import pandas as pd
+import pytest
+import hojas
+
+def agenda(*ids, estatus="Pendiente"):
+    return pd.DataFrame([{"ID": i, "Cliente": f"Cliente {i}", "Estatus": estatus} for i in ids])
+
+class SoloLeerEscribir:
+    """Conexión sin escritura por filas ni gspread: solo read/update (como st-gsheets con URL pública)."""
+    def __init__(self, conn):
+        self._conn = conn
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        return self._conn.read(worksheet=worksheet, ttl=ttl)
+    def update(self, worksheet=None, data=None, **kwargs):
+        return self._conn.update(worksheet=worksheet, data=data)
+
+# --- AGREGAR ---
+def test_agregar_filas_envia_solo_las_nuevas():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B")})
+    assert hojas.agregar_filas(conn, [{"ID": "C", "Cliente": "Cliente C", "Estatus": "Pendiente"}], hojas.AGENDA) == 1
+    df = conn.read(hojas.AGENDA)
+    assert list(df["ID"]) == ["A", "B", "C"]
+    assert conn.escrituras == 1 and conn.filas_enviadas == 1 and conn.lecturas == 1
+
+def test_agregar_filas_en_hoja_nueva_usa_encabezados():
+    conn = hojas.ConexionLocal()
+    hojas.agregar_fila(conn, {"ID_Servicio": "A", "Unidad": "U1"}, hojas.INSTALACIONES)
+    df = conn.read(hojas.INSTALACIONES)
+    assert list(df.columns) == hojas.ENCABEZADOS[hojas.INSTALACIONES]
+    assert df.iloc[0]["Unidad"] == "U1"
+
+def test_agregar_sin_filas_no_escribe():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A")})
+    assert hojas.agregar_filas(conn, [], hojas.AGENDA) == 0
+    assert conn.escrituras == 0
+
+def test_agregar_filas_sin_escritura_por_filas_reescribe():
+    local = hojas.ConexionLocal({hojas.AGENDA: agenda("A")})
+    hojas.agregar_filas(SoloLeerEscribir(local), [{"ID": "B"}], hojas.AGENDA)
+    assert list(local.read(hojas.AGENDA)["ID"]) == ["A", "B"]
+    assert local.filas_enviadas == 2
+
+# --- BORRAR ---
+def test_borrar_filas_por_posicion():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B", "C", "D")})
+    assert hojas.borrar_filas(conn, [0, 2], hojas.AGENDA) == 2
+    assert list(conn.read(hojas.AGENDA)["ID"]) == ["B", "D"]
+
+def test_borrar_filas_revisa_las_esperadas():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B", "C")})
+    hojas.borrar_filas(conn, [1], hojas.AGENDA, esperadas={1: {"ID": "B"}})
+    assert list(conn.read(hojas.AGENDA)["ID"]) == ["A", "C"]
+
+def test_borrar_filas_movidas_lanza_conflicto_y_no_borra():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B", "C")})
+    # Otro usuario borró "A": la posición 1 ya es "C"
+    hojas.borrar_filas(conn, [0], hojas.AGENDA)
+    with pytest.raises(hojas.Conflicto) as error:
+        hojas.borrar_filas(conn, [1], hojas.AGENDA, esperadas={1: {"ID": "B"}})
+    assert error.value.actual["ID"] == "C"
+    assert list(conn.read(hojas.AGENDA)["ID"]) == ["B", "C"]
+
+def test_borrar_filas_fuera_de_la_hoja_lanza_conflicto():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A")})
+    with pytest.raises(hojas.Conflicto):
+        hojas.borrar_filas(conn, [3], hojas.AGENDA, esperadas={3: {"ID": "Z"}})
+
+def test_borrar_filas_sin_escritura_por_filas_revisa_y_reescribe():
+    local = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B")})
+    with pytest.raises(hojas.Conflicto):
+        hojas.borrar_filas(SoloLeerEscribir(local), [0], hojas.AGENDA, esperadas={0: {"ID": "B"}})
+    hojas.borrar_filas(SoloLeerEscribir(local), [0], hojas.AGENDA, esperadas={0: {"ID": "A"}})
+    assert list(local.read(hojas.AGENDA)["ID"]) == ["B"]
+
+def test_tramos_de_abajo_hacia_arriba():
+    assert hojas._tramos([0, 1, 2, 5, 7, 8]) == [(7, 8), (5, 5), (0, 2)]
+
+# --- ACTUALIZAR ---
+def test_actualizar_fila_escribe_solo_los_cambios():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B")})
+    assert hojas.actualizar_fila(conn, "ID", "B", {"Estatus": "Realizado"}, hojas.AGENDA) == 1
+    df = conn.read(hojas.AGENDA)
+    assert list(df["Estatus"]) == ["Pendiente", "Realizado"]
+    assert df.iloc[1]["Cliente"] == "Cliente B"
+    assert conn.filas_enviadas == 1
+
+def test_actualizar_fila_con_esperado_vigente():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A")})
+    hojas.actualizar_fila(conn, "ID", "A", {"Estatus": "Realizado"}, hojas.AGENDA, esperado={"Estatus": "Pendiente"})
+    assert conn.read(hojas.AGENDA).iloc[0]["Estatus"] == "Realizado"
+
+def test_actualizar_fila_cambiada_lanza_conflicto_y_no_escribe():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A", estatus="Cancelado")})
+    with pytest.raises(hojas.Conflicto) as error:
+        hojas.actualizar_fila(conn, "ID", "A", {"Estatus": "Realizado"}, hojas.AGENDA, esperado={"Estatus": "Pendiente"})
+    assert error.value.actual["Estatus"] == "Cancelado"
+    assert conn.read(hojas.AGENDA).iloc[0]["Estatus"] == "Cancelado"
+    assert conn.escrituras == 0
+
+def test_actualizar_fila_inexistente():
+    conn = hojas.ConexionLocal({hojas.AGENDA: agenda("A")})
+    with pytest.raises(KeyError):
+        hojas.actualizar_fila(conn, "ID", "Z", {"Estatus": "Realizado"}, hojas.AGENDA)
+
+def test_actualizar_fila_sin_escritura_por_filas():
+    local = hojas.ConexionLocal({hojas.AGENDA: agenda("A", "B")})
+    conn = SoloLeerEscribir(local)
+    with pytest.raises(hojas.Conflicto):
+        hojas.actualizar_fila(conn, "ID", "B", {"Estatus": "Realizado"}, hojas.AGENDA, esperado={"Estatus": "Cancelado"})
+    assert hojas.actualizar_fila(conn, "ID", "B", {"Estatus": "Realizado"}, hojas.AGENDA) == 1
+    assert list(local.read(hojas.AGENDA)["Estatus"]) == ["Pendiente", "Realizado"]
+
+def test_coincide_compara_texto_de_la_hoja_con_numeros():
+    assert hojas.coincide({"Total": "$1,500.00", "Folio": "120"}, {"Total": 1500, "Folio": 120})
+    assert not hojas.coincide({"Total": "1500"}, {"Total": 1600})
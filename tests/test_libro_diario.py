@@ -0,0 +1,32 @@
+"""Libro diario: marca de reconstrucción y desfases."""
+import pandas as pd
+import pytest
+import hojas
+import libro_diario
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "libro.db")
+
+def instalaciones(*unidades):
+    return pd.DataFrame([{"ID_Servicio": "S1", "Fecha": "18/10/2026", "Cliente": "C", "Unidad": u} for u in unidades],
+                        columns=hojas.ENCABEZADOS[hojas.INSTALACIONES])
+
+def agenda():
+    return pd.DataFrame([{"ID": "S1", "Estatus": "FINALIZADO", "Cobro_Final": 500, "Tipo_Pago": "Efectivo", "Pago_Tecnico": 100}])
+
+def test_unidades_del_sincronizador_no_cuentan_como_reconstruido(ruta):
+    # Base nueva: el sincronizador sube una unidad antes de la primera reconstrucción
+    libro_diario.registrar_unidad("2026-10-18", "S1", "C", "U3", ruta=ruta)
+    assert not libro_diario.reconstruido(ruta)
+    libro_diario.reconstruir(instalaciones("U1", "U2", "U3"), agenda(), ruta=ruta)
+    assert libro_diario.reconstruido(ruta)
+    entrada = libro_diario.dia("2026-10-18", ruta=ruta)
+    assert entrada["unidades"] == 3 and entrada["efectivo"] == 500 and entrada["comisiones"] == 100
+
+def test_reconstruir_quita_solo_desfases_anteriores_a_la_lectura(ruta):
+    libro_diario.marcar_desfase(["2026-10-17"], "antes", ruta)
+    leido = libro_diario.desfases(ruta)[0]["momento"]
+    libro_diario.marcar_desfase(["2026-10-18"], "durante", ruta)
+    libro_diario.reconstruir(instalaciones("U1"), agenda(), ruta=ruta, leido=leido)
+    assert [d["fecha"] for d in libro_diario.desfases(ruta)] == ["2026-10-18"]
@@ -0,0 +1,86 @@
+"""Motor de precios: catálogo, flotilla, escalas, precios manuales e IVA."""
+import pytest
+import catalogo
+import precios
+
+GPS, ANUAL, MENSUAL = catalogo.ID_GPS, catalogo.ID_ANUAL, catalogo.ID_MENSUAL
+
+def test_cotizar_con_precio_de_catalogo():
+    r = precios.cotizar([{"id": GPS, "cant": 2}, {"id": ANUAL, "cant": 2}])
+    assert list(r.lineas["unitario"]) == [2200, 1800]
+    assert r.subtotal == 8000 and r.iva == 0 and r.total == 8000
+    assert r.lineas["original"].isna().all()
+
+def test_cotizar_con_iva():
+    r = precios.cotizar([{"id": GPS, "cant": 1}], lleva_iva=True)
+    assert r.iva == pytest.approx(2200 * catalogo.TASA_IVA)
+    assert r.total == pytest.approx(2200 * (1 + catalogo.TASA_IVA))
+
+def test_precio_de_flotilla_solo_donde_aplica():
+    r = precios.cotizar([{"id": GPS, "cant": 3}, {"id": ANUAL, "cant": 3}], flotilla=True)
+    gps, plan = r.lineas.iloc[0], r.lineas.iloc[1]
+    assert gps["unitario"] == catalogo.PRECIOS_FLOTILLA[GPS] and gps["original"] == 2200
+    assert gps["desc"].endswith(catalogo.LEYENDA_FLOTILLA)
+    assert plan["unitario"] == 1800 and catalogo.LEYENDA_FLOTILLA not in plan["desc"]
+    assert r.subtotal == 3 * 1700 + 3 * 1800
+
+def test_precio_manual_no_recibe_descuentos():
+    r = precios.cotizar([{"id": GPS, "cant": 2, "precio": 2000}], flotilla=True, escalas={GPS: [(1, 1500)]})
+    linea = r.lineas.iloc[0]
+    assert linea["unitario"] == 2000 and linea["total"] == 4000
+    assert catalogo.LEYENDA_FLOTILLA not in linea["desc"]
+
+def test_concepto_libre_usa_su_descripcion():
+    r = precios.cotizar([{"id": None, "cant": 1, "precio": 350, "desc": "Viáticos"}])
+    assert r.lineas.iloc[0]["desc"] == "Viáticos" and r.total == 350
+
+def test_escalas_por_volumen():
+    escalas = {GPS: [(10, 2000), (50, 1900)]}
+    r = precios.cotizar([{"id": GPS, "cant": c} for c in (5, 10, 60)], escalas=escalas)
+    assert list(r.lineas["unitario"]) == [2200, 2000, 1900]
+
+def test_la_escala_nunca_sube_el_precio():
+    r = precios.cotizar([{"id": GPS, "cant": 10}], escalas={GPS: [(1, 2500)]})
+    assert r.lineas.iloc[0]["unitario"] == 2200
+
+def test_flotilla_contra_escala_gana_el_menor():
+    r = precios.cotizar([{"id": GPS, "cant": 100}], flotilla=True, escalas={GPS: [(100, 1600)]})
+    assert r.lineas.iloc[0]["unitario"] == 1600
+    assert catalogo.LEYENDA_FLOTILLA not in r.lineas.iloc[0]["desc"]
+
+def test_cotizacion_vacia():
+    r = precios.cotizar([])
+    assert r.lineas.empty and (r.subtotal, r.iva, r.total) == (0, 0, 0)
+
+# --- CARRITO DEL CONFIGURADOR ---
+def test_armar_carrito_con_plan_anual_extras_y_envio():
+    carrito, r = precios.armar_carrito(cant_gps=2, tipo_plan="Anual (Promoción)", extras=[(7, 1, None), (9, 0, None)],
+                                       costo_envio=500, lleva_iva=True)
+    assert [c["desc"].split("\n")[0] for c in carrito] == [
+        catalogo.CATALOGO[GPS]["nombre"].split("\n")[0], catalogo.CATALOGO[ANUAL]["nombre"].split("\n")[0],
+        catalogo.CATALOGO[7]["nombre"], catalogo.DESC_VIATICOS]
+    assert [c["total"] for c in carrito] == [4400, 3600, 1800, 500]
+    assert r.subtotal == 10300 and r.total == pytest.approx(10300 * (1 + catalogo.TASA_IVA))
+    assert all(isinstance(c["cant"], int) and c["original"] is None for c in carrito)
+
+def test_armar_carrito_plan_mensual_con_flotilla():
+    carrito, _ = precios.armar_carrito(cant_gps=1, tipo_plan="Mensual", desc_flotilla=True)
+    assert carrito[0]["unitario"] == 1700 and carrito[0]["original"] == 2200
+    assert carrito[1]["desc"] == catalogo.CATALOGO[MENSUAL]["nombre"]
+
+def test_armar_carrito_con_precios_libres_y_conceptos():
+    conceptos = [precios.partida(2, "Arnés especial", 250)]
+    carrito, r = precios.armar_carrito(cant_gps=1, desc_flotilla=True, precio_gps=1000, precio_plan=900, conceptos=conceptos)
+    assert [c["unitario"] for c in carrito] == [1000, 900, 250]
+    assert carrito[2]["desc"] == "Arnés especial" and r.subtotal == 2400
+
+def test_carrito_vacio():
+    carrito, r = precios.armar_carrito()
+    assert carrito == [] and r.total == 0
+    assert precios.resumen(carrito, lleva_iva=True) == (0, 0, 0)
+
+def test_resumen_coincide_con_cotizar():
+    carrito, r = precios.armar_carrito(cant_gps=3, extras=[(4, 1, None)], lleva_iva=True)
+    subtotal, iva, total = precios.resumen(carrito, lleva_iva=True)
+    assert (subtotal, iva, total) == pytest.approx((r.subtotal, r.iva, r.total))
+    assert precios.total_venta(carrito, lleva_iva=False) == subtotal
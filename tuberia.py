@@ -0,0 +1,62 @@
+"""Etapas de un envío con tiempos por etapa.
+
+Las etapas en serie dependen de la anterior (fotos -> PDF); las que solo
+necesitan el PDF (correo, registro) corren juntas en hilos. El avance se
+informa desde el hilo que llama, así la vista puede pintarlo (Streamlit no
+acepta llamadas desde otros hilos).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class Tuberia:
+    """`al_avanzar(nombre, segundos, error)` se llama al terminar cada etapa."""
+    def __init__(self, al_avanzar=None):
+        self.al_avanzar = al_avanzar
+        self.tiempos = {}
+        self.errores = {}
+        self._inicio = time.perf_counter()
+
+    def _avisar(self, nombre, segundos, error=None):
+        self.tiempos[nombre] = segundos
+        if error is not None: self.errores[nombre] = error
+        if self.al_avanzar: self.al_avanzar(nombre, segundos, error)
+
+    def etapa(self, nombre, funcion, *args, **kwargs):
+        """Corre una etapa en serie; sus errores se propagan."""
+        inicio = time.perf_counter()
+        try: resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            self._avisar(nombre, time.perf_counter() - inicio, e)
+            raise
+        self._avisar(nombre, time.perf_counter() - inicio)
+        return resultado
+
+    def en_paralelo(self, etapas):
+        """{nombre: (funcion, *args)} a la vez; devuelve {nombre: resultado} (None si falló, ver `errores`)."""
+        resultados = {}
+        with ThreadPoolExecutor(max_workers=len(etapas) or 1) as pool:
+            futuros = {}
+            for nombre, (funcion, *args) in etapas.items():
+                futuros[pool.submit(self._cronometrar, funcion, *args)] = nombre
+            for futuro in as_completed(futuros):
+                nombre = futuros[futuro]
+                resultado, segundos, error = futuro.result()
+                resultados[nombre] = resultado
+                self._avisar(nombre, segundos, error)
+        return resultados
+
+    @staticmethod
+    def _cronometrar(funcion, *args):
+        inicio = time.perf_counter()
+        try: return funcion(*args), time.perf_counter() - inicio, None
+        except Exception as e: return None, time.perf_counter() - inicio, e
+
+    @property
+    def total(self):
+        """Tiempo de punta a punta desde que se creó la tubería."""
+        return time.perf_counter() - self._inicio
+
+    @property
+    def en_serie(self):
+        """Lo que habría tardado con todas las etapas una tras otra."""
+        return sum(self.tiempos.values())